@@ -1,6 +1,9 @@
 import streamlit as st
 from dotenv import load_dotenv
-from src.llm_query import build_pipeline
+import os
+from src.llm_query import get_pipeline
+from src.server import ServiceClient
+from src.streaming import stream_answer
 from src.config import logger
 load_dotenv()
 
@@ -74,7 +77,12 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 if "assistant" not in st.session_state:
-    st.session_state.assistant =  build_pipeline()
+    if os.environ.get("GRAPHRAG_SERVICE_URL"):
+        # Sessions share the service's pipeline instead of each building their own.
+        st.session_state.assistant = ServiceClient(os.environ["GRAPHRAG_SERVICE_URL"])
+    else:
+        # One pipeline, LLM client and Neo4j pool for the whole process; sessions only keep their messages.
+        st.session_state.assistant = get_pipeline()
     
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -94,12 +102,30 @@ if prompt := st.chat_input("Ask your microstructure query question..."):
         print(f"MESSAGES {m}")
 
     try:
-        with st.spinner("Analyzing your query..."):
-            logger.info(f"User Request: {prompt}")
-            langgraph_response = st.session_state.assistant.invoke({"question": f"{prompt}"})
-            logger.info(f"Langgraph Response: {langgraph_response}")
-            assistant_answer= langgraph_response["answer"]
-            st.markdown(f"<div class='chat-message assistant'>{assistant_answer}</div>", unsafe_allow_html=True)
+        logger.info(f"User Request: {prompt}")
+        if isinstance(st.session_state.assistant, ServiceClient):
+            events = st.session_state.assistant.stream(prompt)
+        else:
+            events = stream_answer(st.session_state.assistant, prompt)
+        # Steps are listed as they happen and the answer is rendered token by token.
+        status = st.status("Analyzing your query...")
+        placeholder = st.empty()
+        assistant_answer = ""
+        for event in events:
+            if event.kind == "cypher":
+                status.code(event.cypher, language="cypher")
+            elif event.kind == "rows":
+                status.write(f"{event.rows} records retrieved")
+            elif event.kind == "token":
+                assistant_answer += event.text
+                placeholder.markdown(f"<div class='chat-message assistant'>{assistant_answer}</div>", unsafe_allow_html=True)
+            elif event.kind == "answer":
+                assistant_answer = event.text
+                placeholder.markdown(f"<div class='chat-message assistant'>{assistant_answer}</div>", unsafe_allow_html=True)
+            elif event.kind == "error":
+                raise RuntimeError(event.text)
+        status.update(label="Done", state="complete", expanded=False)
+        logger.info(f"Langgraph Response: {assistant_answer}")
 
         st.session_state.messages.append({"role": "assistant", "content": assistant_answer})
     except Exception as ex:
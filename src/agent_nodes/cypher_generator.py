@@ -1,29 +1,32 @@
 
+import os
+import asyncio
 import logging
+from functools import lru_cache
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.example_selectors import SemanticSimilarityExampleSelector
-from langchain_neo4j import Neo4jVector
-from langchain_openai import OpenAIEmbeddings
 
-def get_example_selector():
-    examples = [
-        {
-            "question": "What are the microstructures which has total number of dislocations less than 10 ?",
-            "query": "MATCH (m:Microstructure)-[:HAS_PILEUP]->(:Pileup)-[:CONTAINS]->(d:Dislocation) WITH m, count(d) AS totalDislocations WHERE totalDislocations < 10 RETURN m",
-        },
-        {
-            "question": "For micostructure with ms_200, find pileup with direction greater than 0.1 radians ? ",
-            "query": "MATCH (m:Microstructure {id: 'ms_200'})-[:HAS_PILEUP]->(p:Pileup) WHERE p.direction > 0.1 RETURN p",
-        },
-        {
-            "question": "How many microstructures have no associated pileups?", 
-            "query": "MATCH (m:Microstructure) WHERE NOT (m)-[:HAS_PILEUP]->(:Pileup) RETURN m"
-        },
-        {
-            "question": "Are there microstructures whose pileups' directions change significantly (for example, having high variance in direction)?", 
-            "query": """
+from src.config import CACHE_DIR, get_embeddings
+from src.example_store import ExampleStore, load_examples_file
+from src.schema_snapshot import SchemaService
+
+EXAMPLES = [
+    {
+        "question": "What are the microstructures which has total number of dislocations less than 10 ?",
+        "query": "MATCH (m:Microstructure)-[:HAS_PILEUP]->(:Pileup)-[:CONTAINS]->(d:Dislocation) WITH m, count(d) AS totalDislocations WHERE totalDislocations < 10 RETURN m",
+    },
+    {
+        "question": "For micostructure with ms_200, find pileup with direction greater than 0.1 radians ? ",
+        "query": "MATCH (m:Microstructure {id: 'ms_200'})-[:HAS_PILEUP]->(p:Pileup) WHERE p.direction > 0.1 RETURN p",
+    },
+    {
+        "question": "How many microstructures have no associated pileups?", 
+        "query": "MATCH (m:Microstructure) WHERE NOT (m)-[:HAS_PILEUP]->(:Pileup) RETURN m"
+    },
+    {
+        "question": "Are there microstructures whose pileups' directions change significantly (for example, having high variance in direction)?", 
+        "query": """
 MATCH (ms:Microstructure)-[:HAS_PILEUP]->(p:Pileup)
 WITH ms, collect(p.direction) AS directions
 WHERE size(directions) > 1
@@ -34,32 +37,33 @@ WHERE stDev > 10.0
 RETURN ms, stDev
 ORDER BY stDev DESC
 """
-        }
-    ]
-    return SemanticSimilarityExampleSelector.from_examples(
-        examples, OpenAIEmbeddings(), Neo4jVector, k=5, input_keys=["question"]
-    )
+    },
+    {
+        "question": "Which pileup has the most tightly spaced dislocations and what is its longest dislocation?",
+        "query": "MATCH (m:Microstructure)-[:HAS_PILEUP]->(p:Pileup)-[:CONTAINS]->(d:Dislocation) WHERE p.min_spacing IS NOT NULL WITH m, p, d ORDER BY p.min_spacing ASC, d.arc_length DESC RETURN m.id, p.id, p.min_spacing, d.id, d.arc_length LIMIT 1"
+    }
+]
 
-def generate_cypher(state: dict, llm: ChatOpenAI, graph) -> dict:
-    from operator import add  # if you need it
-    NL = "\n"
-    example_selector = get_example_selector()
-    fewshot_examples = (NL * 2).join(
-        [
-            f"Question: {el['question']}{NL}Cypher:{el['query']}"
-            for el in example_selector.select_examples({"question": state.get("question")})
-        ]
+@lru_cache(maxsize=None)
+def get_example_selector() -> ExampleStore:
+    # Built once per process; the embeddings and the index are cached on disk across runs.
+    examples = list(EXAMPLES)
+    if os.environ.get("FEWSHOT_EXAMPLES_FILE"):
+        examples.extend(load_examples_file(os.environ["FEWSHOT_EXAMPLES_FILE"]))
+    return ExampleStore(
+        examples, get_embeddings(), os.path.join(CACHE_DIR, "fewshot_index.npz"), k=5, input_key="question"
     )
-    text2cypher_prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                ("Given an input question, convert it to a Cypher query. No pre-amble."
-                 "Do not wrap the response in any backticks or anything else. Respond with a Cypher statement only!")
-            ),
-            (
-                "human",
-                ("""You are a Neo4j expert. Given an input question, create a syntactically correct Cypher query to run.
+
+text2cypher_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            ("Given an input question, convert it to a Cypher query. No pre-amble."
+             "Do not wrap the response in any backticks or anything else. Respond with a Cypher statement only!")
+        ),
+        (
+            "human",
+            ("""You are a Neo4j expert. Given an input question, create a syntactically correct Cypher query to run.
 Do not wrap the response in any backticks or anything else. Respond with a Cypher statement only!
 Here is the schema information
 {schema}
@@ -70,23 +74,39 @@ Below are a number of examples of questions and their corresponding Cypher queri
 
 User input: {question}
 Cypher query:""")
-            ),
+        ),
+    ]
+)
+
+def _generation_inputs(state, schema):
+    NL = "\n"
+    example_selector = get_example_selector()
+    fewshot_examples = (NL * 2).join(
+        [
+            f"Question: {el['question']}{NL}Cypher:{el['query']}"
+            for el in example_selector.select_examples({"question": state.get("question")})
         ]
     )
-    from langchain_core.output_parsers import StrOutputParser
-    text2cypher_chain = text2cypher_prompt | llm | StrOutputParser()
+    return {
+        "question": state.get("question"),
+        "fewshot_examples": fewshot_examples,
+        "schema": schema.text_for(state.get("question")),
+    }
 
-    logging.info("Generating cypher: ...")
-    generated_cypher = text2cypher_chain.invoke(
-        {
-            "question": state.get("question"),
-            "fewshot_examples": fewshot_examples,
-            "schema": graph.schema,
-        }
-    )
+def _generation_result(state, generated_cypher):
     logging.info(f"Generated cypher: {generated_cypher}")
-
     state["cypher_statement"] = generated_cypher
     state["steps"].append("generate_cypher")
     return {"cypher_statement": generated_cypher, "steps": ["generate_cypher"]}
 
+def generate_cypher(state: dict, llm: ChatOpenAI, schema: SchemaService) -> dict:
+    text2cypher_chain = text2cypher_prompt | llm | StrOutputParser()
+    logging.info("Generating cypher: ...")
+    return _generation_result(state, text2cypher_chain.invoke(_generation_inputs(state, schema)))
+
+async def agenerate_cypher(state: dict, llm: ChatOpenAI, schema: SchemaService) -> dict:
+    text2cypher_chain = text2cypher_prompt | llm | StrOutputParser()
+    # Example selection embeds the question, so it runs off the event loop.
+    inputs = await asyncio.to_thread(_generation_inputs, state, schema)
+    logging.info("Generating cypher: ...")
+    return _generation_result(state, await text2cypher_chain.ainvoke(inputs))
@@ -1,4 +1,6 @@
 
+import time
+import asyncio
 import logging
 from neo4j.exceptions import CypherSyntaxError
 from langchain_core.prompts import ChatPromptTemplate
@@ -6,7 +8,18 @@ from langchain_core.output_parsers import StrOutputParser
 from pydantic.v1 import BaseModel, Field
 from typing import List, Optional
 from langchain_openai import ChatOpenAI
-from langchain_neo4j.chains.graph_qa.cypher_utils import CypherQueryCorrector, Schema
+
+from src.schema_snapshot import SchemaService
+from src.cypher_analysis import analyse_cypher
+from src.cost_guard import CostGuard, explain_plan
+from src.correction_cache import CorrectionCache, correction_key
+from src.tracing import record_query, record_cache_hit
+
+# local: the static analyser decides, the LLM only reviews what it cannot check.
+# llm: always ask the LLM. both: run both and log where they disagree.
+VALIDATION_MODES = ("local", "llm", "both")
+DEFAULT_MAX_CORRECTIONS = 3
+gave_up = "I could not write a valid database query for this question"
 
 # Define a model for properties if needed
 class Property(BaseModel):
@@ -51,43 +64,86 @@ validate_cypher_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-def validate_cypher(state: dict, llm: ChatOpenAI, graph) -> dict:
-    errors = []
-    mapping_errors = []
+def _cost_errors(state, cypher, plan, guard):
+    if guard is None or plan is None:
+        return []
+    reasons = guard.check(cypher, plan)
+    if not reasons:
+        return []
+    guard.record_blocked(state.get("question"), cypher, reasons)
+    # Sent back for correction like any other error.
+    return [f"The query is too expensive to run: {'; '.join(reasons)}. Bound it or add a LIMIT."]
+
+def _explain_errors(state, graph, cypher, guard=None):
+    start = time.perf_counter()
     try:
-        # Check the statement with an EXPLAIN call
-        graph.query(f"EXPLAIN {state.get('cypher_statement')}")
+        # Check the statement with an EXPLAIN call; its plan feeds the cost guard.
+        plan = explain_plan(graph, cypher)
     except CypherSyntaxError as e:
         logging.info(f"Query error {e.message}")
-        errors.append(e.message)
-    
+        return [e.message]
+    finally:
+        record_query(time.perf_counter() - start)
+    return _cost_errors(state, cypher, plan, guard)
 
-    # Cypher query corrector is experimental
-    corrector_schema = [
-        Schema(el["start"], el["type"], el["end"])
-        for el in graph.structured_schema.get("relationships")
-    ]
-    cypher_query_corrector = CypherQueryCorrector(corrector_schema)
+async def _aexplain_errors(state, graph, cypher, guard=None):
+    start = time.perf_counter()
+    try:
+        plan = await graph.aexplain(cypher)
+    except CypherSyntaxError as e:
+        logging.info(f"Query error {e.message}")
+        return [e.message]
+    finally:
+        record_query(time.perf_counter() - start)
+    return _cost_errors(state, cypher, plan, guard)
 
-    corrected_cypher = cypher_query_corrector(state.get("cypher_statement"))
+def _local_review(state, schema, errors):
+    # Cypher query corrector is experimental; it is built once per schema version.
+    snapshot = schema.current()
+    corrected_cypher = snapshot.corrector(state.get("cypher_statement"))
     if not corrected_cypher:
         errors.append("The generated Cypher statement doesn't fit the graph schema")
     if not corrected_cypher == state.get("cypher_statement"):
-        print("Relationship direction was corrected")
-    # Validate with the LLM chain
-    validate_cypher_chain = validate_cypher_prompt | llm.with_structured_output(ValidateCypherOutput)
-    llm_output = validate_cypher_chain.invoke(
-        {
-            "question": state.get("question"),
-            "schema": graph.schema,
-            "cypher": state.get("cypher_statement"),
-        }
-    )
+        logging.info("Relationship direction was corrected")
+
+    analysis = analyse_cypher(corrected_cypher or state.get("cypher_statement"), snapshot.structured)
+    logging.info(f"Local analysis errors {analysis.errors} undecided {analysis.undecided}")
+    return corrected_cypher, analysis, snapshot.version
+
+def _needs_llm_review(mode, analysis, errors):
+    return mode == "llm" or mode == "both" or (mode == "local" and analysis.undecided and not errors + analysis.errors)
+
+def _review_inputs(state, schema):
+    return {
+        "question": state.get("question"),
+        "schema": schema.text_for(state.get("question"), state.get("cypher_statement")),
+        "cypher": state.get("cypher_statement"),
+    }
+
+def _give_up_reason(state, key, max_corrections, deadline, started):
+    attempts = state.get("correction_attempts") or 0
+    if key in (state.get("correction_keys") or []):
+        return "the same errors came back for a statement that was already corrected"
+    if attempts >= max_corrections:
+        return f"the budget of {max_corrections} corrections is spent"
+    if deadline and time.monotonic() - started > deadline:
+        return f"the request ran for more than {deadline:g}s"
+    return None
+
+def _validation_result(state, errors, corrected_cypher, analysis, mode, llm_output=None, schema_version=None,
+                       max_corrections=DEFAULT_MAX_CORRECTIONS, deadline=None, corrections=None):
+    mapping_errors = []
+    local_errors = errors + analysis.errors
+    if llm_output is not None:
+        logging.info(f"validate_cypher llm_output {llm_output}")
+        if mode == "both" and not analysis.undecided and bool(local_errors) != bool(llm_output.errors):
+            logging.info(f"Validators disagree: local {local_errors} llm {llm_output.errors}")
+        if llm_output.errors:
+            errors.extend(llm_output.errors)
+    if mode != "llm":
+        errors.extend(analysis.errors)
     logging.info(f"ERRORS so far {errors}")
     logging.info(f"cypher_statement {state.get('cypher_statement')}")
-    logging.info(f"validate_cypher llm_output {llm_output}")
-    if llm_output.errors:
-        errors.extend(llm_output.errors)
     
     # if llm_output.filters:
         # for filter in llm_output.filters:
@@ -115,13 +171,24 @@ def validate_cypher(state: dict, llm: ChatOpenAI, graph) -> dict:
         #             f"Missing value mapping for {filter.node_label} on property {filter.property_key} with value {filter.property_value}"
         #         )
 
+    update = {}
     if mapping_errors:
         next_action = "end"
     elif errors:
         next_action = "correct_cypher"
+        # The loop stops when a correction would repeat, or its retry budget or the request deadline is spent.
+        started = state.get("request_started") or time.monotonic()
+        reason = _give_up_reason(state, correction_key(errors, corrected_cypher, schema_version),
+                                 max_corrections, deadline, started)
+        if reason:
+            logging.warning(f"Giving up on {corrected_cypher!r}: {reason}; errors {errors}")
+            next_action = "end"
+            update["database_records"] = f"{gave_up}. The last attempt had these errors: {'; '.join(errors)}"
     else:
         next_action = "execute_cypher"
-    
+        if corrections is not None and state.get("correction_pending"):
+            corrections.put(state["correction_pending"], corrected_cypher)
+
     state["next_action"] = next_action
     state["cypher_errors"] = errors
     state["steps"].append("validate_cypher")
@@ -130,20 +197,47 @@ def validate_cypher(state: dict, llm: ChatOpenAI, graph) -> dict:
         "cypher_statement": corrected_cypher,
         "cypher_errors": errors,
         "steps": ["validate_cypher"],
+        **update,
     }
 
-def correct_cypher(state: dict, llm: ChatOpenAI, graph) -> dict:
-    correct_cypher_prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                ("You are a Cypher expert reviewing a statement written by a junior developer. "
-                 "You need to correct the Cypher statement based on the provided errors. No pre-amble."
-                 "Do not wrap the response in any backticks or anything else. Respond with a Cypher statement only!")
-            ),
-            (
-                "human",
-                ("""Check for invalid syntax or semantics and return a corrected Cypher statement.
+def validate_cypher(state: dict, llm: ChatOpenAI, graph, schema: SchemaService, mode: str = "local",
+                    guard: CostGuard = None, max_corrections: int = DEFAULT_MAX_CORRECTIONS,
+                    deadline: float = None, corrections: CorrectionCache = None) -> dict:
+    errors = _explain_errors(state, graph, state.get("cypher_statement"), guard)
+    corrected_cypher, analysis, schema_version = _local_review(state, schema, errors)
+    llm_output = None
+    if _needs_llm_review(mode, analysis, errors):
+        # Validate with the LLM chain
+        validate_cypher_chain = validate_cypher_prompt | llm.with_structured_output(ValidateCypherOutput)
+        llm_output = validate_cypher_chain.invoke(_review_inputs(state, schema))
+    return _validation_result(state, errors, corrected_cypher, analysis, mode, llm_output, schema_version,
+                              max_corrections, deadline, corrections)
+
+async def avalidate_cypher(state: dict, llm: ChatOpenAI, graph, schema: SchemaService, mode: str = "local",
+                          guard: CostGuard = None, max_corrections: int = DEFAULT_MAX_CORRECTIONS,
+                          deadline: float = None, corrections: CorrectionCache = None) -> dict:
+    errors = await _aexplain_errors(state, graph, state.get("cypher_statement"), guard)
+    # The schema snapshot may have to be read from the database or disk.
+    corrected_cypher, analysis, schema_version = await asyncio.to_thread(_local_review, state, schema, errors)
+    llm_output = None
+    if _needs_llm_review(mode, analysis, errors):
+        validate_cypher_chain = validate_cypher_prompt | llm.with_structured_output(ValidateCypherOutput)
+        inputs = await asyncio.to_thread(_review_inputs, state, schema)
+        llm_output = await validate_cypher_chain.ainvoke(inputs)
+    return _validation_result(state, errors, corrected_cypher, analysis, mode, llm_output, schema_version,
+                              max_corrections, deadline, corrections)
+
+correct_cypher_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            ("You are a Cypher expert reviewing a statement written by a junior developer. "
+             "You need to correct the Cypher statement based on the provided errors. No pre-amble."
+             "Do not wrap the response in any backticks or anything else. Respond with a Cypher statement only!")
+        ),
+        (
+            "human",
+            ("""Check for invalid syntax or semantics and return a corrected Cypher statement.
 
 Schema:
 {schema}
@@ -162,18 +256,29 @@ The errors are:
 {errors}
 
 Corrected Cypher statement:""")
-            ),
-        ]
-    )
-    correct_cypher_chain = correct_cypher_prompt | llm | StrOutputParser()
-    corrected_cypher = correct_cypher_chain.invoke(
-        {
-            "question": state.get("question"),
-            "errors": state.get("cypher_errors"),
-            "cypher": state.get("cypher_statement"),
-            "schema": graph.schema,
-        }
-    )
+        ),
+    ]
+)
+
+def _correction_inputs(state, schema):
+    return {
+        "question": state.get("question"),
+        "errors": state.get("cypher_errors"),
+        "cypher": state.get("cypher_statement"),
+        "schema": schema.text_for(state.get("question"), state.get("cypher_statement")),
+    }
+
+def _correction_key(state, schema):
+    return correction_key(state.get("cypher_errors"), state.get("cypher_statement"), schema.current().version)
+
+def _known_correction(corrections, key):
+    corrected_cypher = corrections.get(key) if corrections is not None else None
+    if corrected_cypher is not None:
+        logging.info("Reusing a correction that passed validation before")
+        record_cache_hit("correction_cache")
+    return corrected_cypher
+
+def _correction_result(state, corrected_cypher, key):
     state["cypher_statement"] = corrected_cypher
     state["next_action"] = "validate_cypher"
     state["steps"].append("correct_cypher")
@@ -182,5 +287,26 @@ Corrected Cypher statement:""")
         "next_action": "validate_cypher",
         "cypher_statement": corrected_cypher,
         "steps": ["correct_cypher"],
+        "correction_attempts": (state.get("correction_attempts") or 0) + 1,
+        "correction_keys": list(state.get("correction_keys") or []) + [key],
+        # Stored in the correction cache if the next validation passes.
+        "correction_pending": key,
     }
 
+def correct_cypher(state: dict, llm: ChatOpenAI, schema: SchemaService, corrections: CorrectionCache = None) -> dict:
+    key = _correction_key(state, schema)
+    corrected_cypher = _known_correction(corrections, key)
+    if corrected_cypher is None:
+        correct_cypher_chain = correct_cypher_prompt | llm | StrOutputParser()
+        corrected_cypher = correct_cypher_chain.invoke(_correction_inputs(state, schema))
+    return _correction_result(state, corrected_cypher, key)
+
+async def acorrect_cypher(state: dict, llm: ChatOpenAI, schema: SchemaService,
+                          corrections: CorrectionCache = None) -> dict:
+    key = await asyncio.to_thread(_correction_key, state, schema)
+    corrected_cypher = _known_correction(corrections, key)
+    if corrected_cypher is None:
+        correct_cypher_chain = correct_cypher_prompt | llm | StrOutputParser()
+        inputs = await asyncio.to_thread(_correction_inputs, state, schema)
+        corrected_cypher = await correct_cypher_chain.ainvoke(inputs)
+    return _correction_result(state, corrected_cypher, key)
@@ -3,6 +3,7 @@ from pydantic.v1 import BaseModel, Field
 from typing import Literal, List
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
+import time
 import logging
 
 from typing_extensions import TypedDict
@@ -12,11 +13,19 @@ class InputState(TypedDict):
 
 class OverallState(TypedDict):
     question: str
+    # time.monotonic() when the request entered the pipeline; the correction deadline counts from it.
+    request_started: float
     next_action: str
     cypher_statement: str
     cypher_errors: List[str]
     database_records: List[dict]
+    # Row limit the cost guard added, when the result reached it.
+    results_truncated_at: int
     steps: List[str]
+    # Bookkeeping of the validate/correct loop.
+    correction_attempts: int
+    correction_keys: List[str]
+    correction_pending: str
 
 class GuardrailsOutput(BaseModel):
     decision: Literal["microstructure", "end"] = Field(
@@ -38,9 +47,11 @@ guardrails_prompt = ChatPromptTemplate.from_messages(
 
 
 
-def guardrails(state: InputState, llm: ChatOpenAI) -> OverallState:
-    guardrails_chain = guardrails_prompt | llm.with_structured_output(schema=GuardrailsOutput)
-    guardrails_output = guardrails_chain.invoke({"question": state.get("question")})
+def start_request(state: InputState) -> OverallState:
+    """First node of the pipeline: stamps the request so deadlines cover every node, not one loop."""
+    return {"request_started": time.monotonic()}
+
+def _guardrails_result(guardrails_output):
     logging.info(f"guardrails_output {guardrails_output}")
     database_records = None
     if guardrails_output.decision == "end":
@@ -50,3 +61,11 @@ def guardrails(state: InputState, llm: ChatOpenAI) -> OverallState:
         "database_records": database_records,
         "steps": ["guardrail"],
     }
+
+def guardrails(state: InputState, llm: ChatOpenAI) -> OverallState:
+    guardrails_chain = guardrails_prompt | llm.with_structured_output(schema=GuardrailsOutput)
+    return _guardrails_result(guardrails_chain.invoke({"question": state.get("question")}))
+
+async def aguardrails(state: InputState, llm: ChatOpenAI) -> OverallState:
+    guardrails_chain = guardrails_prompt | llm.with_structured_output(schema=GuardrailsOutput)
+    return _guardrails_result(await guardrails_chain.ainvoke({"question": state.get("question")}))
@@ -0,0 +1,27 @@
+from neo4j import AsyncGraphDatabase, Query
+
+
+class AsyncGraph:
+    """Async counterpart of ``Neo4jGraph.query`` on one pooled driver.
+
+    The driver belongs to the event loop it is first used on, so create one per loop.
+    """
+
+    def __init__(self, url, username, password, database=None, timeout=None, **driver_config):
+        self.driver = AsyncGraphDatabase.driver(url, auth=(username, password), **driver_config)
+        self.database = database
+        self.timeout = timeout
+
+    async def aquery(self, query, params=None):
+        async with self.driver.session(database=self.database) as session:
+            result = await session.run(Query(query, timeout=self.timeout), params or {})
+            return [record.data() async for record in result]
+
+    async def aexplain(self, cypher, params=None):
+        """Plan of ``cypher`` from an EXPLAIN call, as ``cost_guard.explain_plan`` returns it."""
+        async with self.driver.session(database=self.database) as session:
+            result = await session.run(Query(f"EXPLAIN {cypher}", timeout=self.timeout), params or {})
+            return (await result.consume()).plan
+
+    async def close(self):
+        await self.driver.close()
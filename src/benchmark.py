@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Pipeline settings recorded with every run, so results are only compared like for like.
+SETTINGS = (
+    "SEMANTIC_CACHE", "RESULT_CACHE", "QUESTION_TEMPLATES", "SPECULATION", "CYPHER_VALIDATION",
+    "SCHEMA_PRUNING", "RESULT_COMPACTION", "COST_GUARD", "TRACING", "MAX_CORRECTIONS", "CORRECTION_DEADLINE",
+    "CORRECTION_CACHE",
+)
+
+
+def _stats(values):
+    if not values:
+        return {"count": 0}
+    values = np.asarray(values, dtype=float)
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(values.max()),
+    }
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+    except OSError:
+        return None
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _run_sync(pipeline, questions, concurrency):
+    def ask(question):
+        start = time.perf_counter()
+        pipeline.invoke({"question": question})
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(ask, questions))
+
+
+async def _run_async(pipeline, questions, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def ask(question):
+        async with slots:
+            start = time.perf_counter()
+            await pipeline.ainvoke({"question": question})
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*(ask(q) for q in questions))
+
+
+def _node_stats(trace_log):
+    nodes, tokens, llm_calls, queries, hits = {}, [], [], [], {}
+    with open(trace_log) as f:
+        for line in f:
+            trace = json.loads(line)
+            tokens.append(trace["prompt_tokens"] + trace["completion_tokens"])
+            llm_calls.append(sum(n["llm_calls"] for n in trace["nodes"]))
+            queries.append(sum(n["queries"] for n in trace["nodes"]))
+            for hit in trace["cache_hits"]:
+                hits[hit.split(":")[0]] = hits.get(hit.split(":")[0], 0) + 1
+            for node in trace["nodes"]:
+                nodes.setdefault(node["node"], []).append(node["seconds"])
+    per_question = {"tokens": _stats(tokens), "llm_calls": _stats(llm_calls), "queries": _stats(queries)}
+    return {name: _stats(values) for name, values in sorted(nodes.items())}, per_question, hits
+
+
+def run(args):
+    """Run the corpus through the pipeline on the offline backends and return the results."""
+    # The backends and caches are chosen when src.config is imported, so set them first.
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="graphrag-bench-")
+    trace_log = os.path.join(cache_dir, "traces.jsonl")
+    if os.path.exists(trace_log):
+        os.remove(trace_log)
+    os.environ.update({
+        "GRAPHRAG_BACKEND": "offline",
+        "OFFLINE_CORPUS": args.corpus,
+        "OFFLINE_LLM_LATENCY": str(args.llm_latency),
+        "OFFLINE_QUERY_LATENCY": str(args.query_latency),
+        "OFFLINE_EMBEDDING_LATENCY": str(args.embedding_latency),
+        "GRAPHRAG_CACHE_DIR": cache_dir,
+        "TRACE_LOG": trace_log,
+        "TRACING": "1",
+    })
+    from src.config import get_graph, offline_corpus
+    from src.llm_query import build_pipeline
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    pipeline = build_pipeline(asynchronous=args.asynchronous)
+    build_seconds = time.perf_counter() - start
+
+    questions = [q["question"] for q in offline_corpus()["questions"]] * args.repeat
+    start = time.perf_counter()
+    if args.asynchronous:
+        latencies = asyncio.run(_run_async(pipeline, questions, args.concurrency))
+    else:
+        latencies = _run_sync(pipeline, questions, args.concurrency)
+    wall = time.perf_counter() - start
+
+    nodes, per_question, hits = _node_stats(trace_log)
+    return {
+        "label": args.label,
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "settings": {name: os.environ.get(name) for name in SETTINGS},
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "build_seconds": build_seconds,
+        "questions": len(questions),
+        "wall_seconds": wall,
+        "throughput_qps": len(questions) / wall if wall else None,
+        "latency": _stats(latencies),
+        "nodes": nodes,
+        "per_question": per_question,
+        "cache_hits": hits,
+        "replay_misses": get_graph().misses,
+        "memory_mb": {
+            "rss_before": rss_before,
+            "rss_after": _rss_mb(),
+            "peak": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        },
+    }
+
+
+def compare(result, baseline):
+    """Lines describing how ``result`` moved against ``baseline``."""
+
+    def change(name, new, old):
+        if old in (None, 0) or new is None:
+            return f"{name:<34} {old!s:>10} -> {new!s:>10}"
+        return f"{name:<34} {old:>10.3f} -> {new:>10.3f} ({(new - old) / old:+.1%})"
+
+    lines = [f"Compared with {baseline.get('label') or baseline.get('time')} ({baseline.get('commit')})"]
+    if baseline.get("settings") != result.get("settings") or baseline.get("args", {}).get("llm_latency") != \
+            result.get("args", {}).get("llm_latency"):
+        lines.append("Warning: the settings or simulated latencies differ between the two runs")
+    lines.append(change("throughput (q/s)", result["throughput_qps"], baseline.get("throughput_qps")))
+    for key in ("p50", "p95"):
+        lines.append(change(f"latency {key} (s)", result["latency"].get(key), baseline["latency"].get(key)))
+    for node, stats in result["nodes"].items():
+        old = baseline.get("nodes", {}).get(node, {})
+        lines.append(change(f"{node} p95 (s)", stats.get("p95"), old.get("p95")))
+    lines.append(change("tokens per question", result["per_question"]["tokens"].get("mean"),
+                        baseline.get("per_question", {}).get("tokens", {}).get("mean")))
+    lines.append(change("peak memory (MB)", result["memory_mb"]["peak"], baseline.get("memory_mb", {}).get("peak")))
+    return lines
+
+
+def report(result):
+    latency = result["latency"]
+    lines = [
+        f"{result['questions']} questions in {result['wall_seconds']:.2f}s "
+        f"({result['throughput_qps']:.2f} q/s at concurrency {result['args']['concurrency']})",
+        f"latency mean {latency['mean']:.3f}s p50 {latency['p50']:.3f}s p95 {latency['p95']:.3f}s",
+        f"pipeline built in {result['build_seconds']:.2f}s, peak memory {result['memory_mb']['peak']:.0f} MB",
+        f"per question: {result['per_question']['llm_calls'].get('mean', 0):.2f} LLM calls, "
+        f"{result['per_question']['tokens'].get('mean', 0):.0f} tokens, "
+        f"{result['per_question']['queries'].get('mean', 0):.2f} queries; cache hits {result['cache_hits']}",
+    ]
+    if result["replay_misses"]:
+        lines.append(f"{result['replay_misses']} queries were not in the corpus and returned no rows")
+    for node, stats in result["nodes"].items():
+        lines.append(f"  {node:<24} n={stats['count']:<5} p50 {stats['p50']:.3f}s p95 {stats['p95']:.3f}s")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the query pipeline offline, without OpenAI or Neo4j.")
+    parser.add_argument("--corpus", default=os.path.join("benchmarks", "questions.json"),
+                        help="Questions with their recorded Cypher and rows.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3, help="Times every question is asked.")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Simulated seconds per LLM call.")
+    parser.add_argument("--query-latency", type=float, default=0.02, help="Simulated seconds per Neo4j query.")
+    parser.add_argument("--embedding-latency", type=float, default=0.05,
+                        help="Simulated seconds per embedding call.")
+    parser.add_argument("--async", dest="asynchronous", action="store_true", help="Benchmark the async pipeline.")
+    parser.add_argument("--cache-dir", help="Reuse a cache directory (warm caches); a fresh one by default.")
+    parser.add_argument("--label", default="", help="Name of this run in the results.")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results"),
+                        help="Directory the results are written to.")
+    parser.add_argument("--compare", help="Earlier results file to compare against.")
+    args = parser.parse_args()
+
+    result = run(args)
+    print("\n".join(report(result)))
+    os.makedirs(args.output, exist_ok=True)
+    name = f"{result['time'].replace(':', '')}{'-' + args.label if args.label else ''}.json"
+    path = os.path.join(args.output, name)
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {path}")
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(result, json.load(f))))
+    sys.exit(0)
@@ -0,0 +1,198 @@
+import os
+import csv
+import time
+from collections import deque
+from datetime import datetime, timezone
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from src.inject import GraphRows, NODE_LABELS, constraint_query, load_rows
+from src.features import DISLOCATION_FEATURES, PILEUP_FEATURES
+from src.graph_version import GRAPH_META_LABEL
+from src.parallel_ingest import IngestStats, parse_file
+
+# Separator of array values such as start_pos, the neo4j-admin default.
+ARRAY_DELIMITER = ";"
+IMPORT_SCRIPT = "import.sh"
+CONSTRAINTS_FILE = "constraints.cypher"
+
+
+def _column(header, key):
+    return header, (key if callable(key) else lambda row: row.get(key))
+
+
+def _feature(name):
+    return _column(f"{name}:double", lambda row: row.get("features", {}).get(name))
+
+
+# File, columns and source rows of every node and relationship file. The properties are the ones
+# the batched writers of DislocationGraph set; a missing value leaves the property unset, like SET to null.
+NODE_FILES = {
+    "Microstructure": ("microstructures.csv", "microstructures", [
+        _column("id:ID(Microstructure)", "ms_id"),
+        _column("ms_id", "ms_id"),
+    ]),
+    "GrainBoundary": ("grain_boundaries.csv", "grain_boundaries", [
+        _column("id:ID(GrainBoundary)", "gb_id"),
+        _column("gb_id", "gb_id"),
+        _column("gb_angle:double", "gb_angle"),
+        _column("gb_center:double[]", "gb_center"),
+        _column("lw:double", "lw"),
+    ]),
+    "SlipTrace": ("slip_traces.csv", "slip_traces", [
+        _column("id:ID(SlipTrace)", "st_id"),
+        _column("slip_id", lambda row: "<id> " + row["st_id"]),
+    ]),
+    "Pileup": ("pileups.csv", "pileups", [
+        _column("id:ID(Pileup)", "pileup_id"),
+        _column("pileup_id", "pileup_id"),
+        _column("n_dislocations:long", "n_dislocations"),
+        _column("start_pos:double[]", "start_pos"),
+        _column("slip_width:double", "slip_width"),
+        _column("offset:double[]", "offset"),
+        _column("direction:double", "direction"),
+    ] + [_feature(name) for name in PILEUP_FEATURES]),
+    "Dislocation": ("dislocations.csv", "dislocations", [
+        _column("id:ID(Dislocation)", "composite_id"),
+        _column("dis_id", "composite_id"),
+        _column("spline_id", "spline_id"),
+        _column("start_pos_x:double", "start_pos_x"),
+        _column("start_pos_y:double", "start_pos_y"),
+        _column("offset:double", "offset"),
+    ] + [_feature(name) for name in DISLOCATION_FEATURES]),
+}
+
+RELATIONSHIP_FILES = [
+    ("HAS_GRAIN_BOUNDARY", "has_grain_boundary.csv", "grain_boundaries", "Microstructure", "ms_id",
+     "GrainBoundary", "gb_id"),
+    ("HAS_SLIP_TRACE", "microstructure_slip_traces.csv", "slip_traces", "Microstructure", "ms_id",
+     "SlipTrace", "st_id"),
+    ("HAS_SLIP_TRACE", "pileup_slip_traces.csv", "pileup_slip_traces", "Pileup", "pileup_id",
+     "SlipTrace", "st_id"),
+    ("HAS_PILEUP", "has_pileup.csv", "has_pileup", "Microstructure", "ms_id", "Pileup", "pileup_id"),
+    ("CONTAINS", "contains.csv", "dislocations", "Pileup", "pileup_id", "Dislocation", "composite_id"),
+    ("NEIGHBOR", "neighbors.csv", "neighbors", "Dislocation", "id1", "Dislocation", "id2"),
+    ("NEAR", "near.csv", "near", "Dislocation", "id1", "Dislocation", "id2"),
+]
+
+
+def _value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return ARRAY_DELIMITER.join(str(v) for v in value)
+    return str(value)
+
+
+class CsvExporter:
+    """Streams ``GraphRows`` into headered node and relationship CSV files for
+    ``neo4j-admin database import full``.
+
+    Rows are written as they arrive, so memory does not grow with the number of files.
+    Node ids are unique per label, as the online writers' uniqueness constraints require.
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        os.makedirs(out_dir, exist_ok=True)
+        self.files = []
+        self.nodes = 0
+        self.relationships = 0
+        self.node_writers = {}
+        for label, (name, source, columns) in NODE_FILES.items():
+            self.node_writers[label] = (self._open(name, [header for header, _ in columns]), source, columns)
+        self.relationship_writers = []
+        for rel_type, name, source, start_label, start_key, end_label, end_key in RELATIONSHIP_FILES:
+            headers = [f":START_ID({start_label})", f":END_ID({end_label})", ":TYPE"]
+            if rel_type == "NEAR":
+                headers.append("distance:double")
+            self.relationship_writers.append((self._open(name, headers), rel_type, source, start_key, end_key))
+
+    def _open(self, name, headers):
+        f = open(os.path.join(self.out_dir, name), "w", newline="")
+        self.files.append(f)
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        return writer
+
+    def write(self, rows: GraphRows):
+        for writer, source, columns in self.node_writers.values():
+            for row in getattr(rows, source):
+                writer.writerow([_value(get(row)) for _, get in columns])
+            self.nodes += len(getattr(rows, source))
+        for writer, rel_type, source, start_key, end_key in self.relationship_writers:
+            for row in getattr(rows, source):
+                if rel_type == "NEAR":
+                    writer.writerow([row[start_key], row[end_key], rel_type, _value(row["distance"])])
+                    self.relationships += 1
+                    continue
+                writer.writerow([row[start_key], row[end_key], rel_type])
+                self.relationships += 1
+                if rel_type == "NEIGHBOR":
+                    # The online path merges NEIGHBOR in both directions.
+                    writer.writerow([row[end_key], row[start_key], rel_type])
+                    self.relationships += 1
+
+    def close(self):
+        # The graph version starts at 1, as after a first online ingest, so query-side caches work as usual.
+        meta = self._open("graph_meta.csv", [f"id:ID({GRAPH_META_LABEL})", "version:long", "updated_at:datetime"])
+        meta.writerow(["graph", 1, datetime.now(timezone.utc).isoformat()])
+        for f in self.files:
+            f.close()
+        with open(os.path.join(self.out_dir, CONSTRAINTS_FILE), "w") as f:
+            f.write("".join(f"{constraint_query(label)};\n" for label in NODE_LABELS))
+        script = os.path.join(self.out_dir, IMPORT_SCRIPT)
+        with open(script, "w") as f:
+            f.write("#!/bin/sh\n# Run with the database stopped; creates (or replaces) the database from these files.\n")
+            f.write('cd "$(dirname "$0")"\n')
+            f.write(" \\\n  ".join(self.import_command("${1:-neo4j}")) + "\n")
+        os.chmod(script, 0o755)
+
+    def import_command(self, database="neo4j"):
+        args = ["neo4j-admin database import full", database, "--overwrite-destination",
+                f'--array-delimiter="{ARRAY_DELIMITER}"']
+        for label, (name, _, _) in NODE_FILES.items():
+            args.append(f"--nodes={label}={name}")
+        args.append(f"--nodes={GRAPH_META_LABEL}=graph_meta.csv")
+        args.extend(f"--relationships={rel_type}={name}" for rel_type, name, *_ in RELATIONSHIP_FILES)
+        return args
+
+
+def _parsed(json_files, workers, load_options):
+    if workers <= 0:
+        for json_file in json_files:
+            yield load_rows(json_file, **load_options)
+        return
+    # In file order, with at most 2 * workers parsed files waiting to be written.
+    parse = partial(parse_file, **load_options)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = deque()
+        for json_file in json_files:
+            window.append(pool.submit(parse, json_file))
+            if len(window) >= workers * 2:
+                yield window.popleft().result()[1]
+        while window:
+            yield window.popleft().result()[1]
+
+
+def export_csv(json_files, out_dir, workers=0, geometry=None, **load_options):
+    """Write the graph of ``json_files`` as neo4j-admin import files to ``out_dir``.
+
+    Rows are built by ``load_rows`` with the same ROI, ids and NEIGHBOR order as the online
+    ingest. With a ``GeometryWriter`` the spline geometry is stored alongside.
+    """
+    stats = IngestStats()
+    exporter = CsvExporter(out_dir)
+    start = time.perf_counter()
+    try:
+        for rows in _parsed(json_files, workers, {**load_options, "geometry": geometry is not None}):
+            exporter.write(rows)
+            if geometry is not None:
+                geometry.append(rows.geometry)
+            stats.files += 1
+            stats.nodes += rows.node_count()
+            stats.rows += len(rows)
+    finally:
+        exporter.close()
+        stats.elapsed = time.perf_counter() - start
+    return stats
@@ -1,24 +1,154 @@
 
 import os
 import logging
+from functools import lru_cache
 from dotenv import load_dotenv
 from langchain_neo4j import Neo4jGraph
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from src.embeddings import CachedEmbeddings
+from src.semantic_cache import SemanticCypherCache
+from src.result_cache import ResultCache
+from src.graph_version import GraphVersionWatcher
+from src.schema_snapshot import SchemaService, DEFAULT_SNAPSHOT
+from src.schema_pruning import SchemaPruner
+from src.async_graph import AsyncGraph
+from src.result_compaction import ResultCompactor
+from src.cost_guard import CostGuard
+from src.correction_cache import CorrectionCache
+from src.tracing import Tracer, UsageCallback
+from src.offline import LocalGraph, OfflineChatModel, OfflineEmbeddings, load_corpus
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
 load_dotenv()  
 
+# Local caches (embeddings, few-shot index, ...) live here.
+CACHE_DIR = os.environ.get("GRAPHRAG_CACHE_DIR", ".cache")
+
+# "offline" replaces OpenAI and Neo4j with stand-ins replaying OFFLINE_CORPUS, e.g. for benchmarks.
+BACKEND = os.environ.get("GRAPHRAG_BACKEND", "live")
+
+def offline_corpus():
+    return load_corpus(os.environ.get("OFFLINE_CORPUS", os.path.join("benchmarks", "questions.json")))
+
+def offline_latency(name):
+    return float(os.environ.get(f"OFFLINE_{name}_LATENCY", "0"))
+
+def query_timeout():
+    # Seconds a pipeline query may run before Neo4j terminates its transaction; 0 disables it.
+    return float(os.environ.get("NEO4J_QUERY_TIMEOUT", "30")) or None
+
+def pool_config():
+    # Shared by the sync and async drivers; idle connections are checked before reuse.
+    return {
+        "max_connection_pool_size": int(os.environ.get("NEO4J_MAX_POOL_SIZE", "100")),
+        "liveness_check_timeout": float(os.environ.get("NEO4J_LIVENESS_CHECK", "30")),
+    }
+
+@lru_cache(maxsize=None)
 def get_graph() -> Neo4jGraph:
+    if BACKEND == "offline":
+        return LocalGraph(offline_corpus(), latency=offline_latency("QUERY"))
+    # One driver and connection pool per process.
     graph = Neo4jGraph(
         url=os.environ["NEO4J_URI"],
         username=os.environ["NEO4J_USERNAME"],
         password=os.environ["NEO4J_PASSWORD"],
+        # The schema is served by SchemaService, from a snapshot when one is current.
+        refresh_schema=False,
+        timeout=query_timeout(),
+        driver_config=pool_config(),
     )
-    logging.info(f"GRAPH SCHEMA {graph.schema}")
     return graph
 
+def get_async_graph() -> AsyncGraph:
+    if BACKEND == "offline":
+        return get_graph()
+    return AsyncGraph(
+        os.environ["NEO4J_URI"],
+        os.environ["NEO4J_USERNAME"],
+        os.environ["NEO4J_PASSWORD"],
+        timeout=query_timeout(),
+        **pool_config(),
+    )
+
+@lru_cache(maxsize=None)
 def get_llm() -> ChatOpenAI:
     # You can choose the model as needed.
-    return ChatOpenAI(model="gpt-4o", temperature=0)
+    # Token usage goes to the trace of the question being answered, streamed answers included.
+    if BACKEND == "offline":
+        return OfflineChatModel.from_corpus(offline_corpus(), latency=offline_latency("LLM"),
+                                            callbacks=[UsageCallback()])
+    return ChatOpenAI(model="gpt-4o", temperature=0, stream_usage=True, callbacks=[UsageCallback()])
+
+@lru_cache(maxsize=None)
+def get_embeddings() -> CachedEmbeddings:
+    # One shared instance, so every component hits the same query LRU.
+    if BACKEND == "offline":
+        return CachedEmbeddings(OfflineEmbeddings(latency=offline_latency("EMBEDDING")),
+                                os.path.join(CACHE_DIR, "embeddings.sqlite"), model="offline")
+    model = os.environ.get("EMBEDDING_MODEL", "text-embedding-ada-002")
+    return CachedEmbeddings(OpenAIEmbeddings(model=model), os.path.join(CACHE_DIR, "embeddings.sqlite"), model=model)
+
+def get_semantic_cache() -> SemanticCypherCache:
+    return SemanticCypherCache(
+        os.path.join(CACHE_DIR, "cypher_cache.sqlite"),
+        get_embeddings(),
+        threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+        max_entries=int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "1000")),
+        ttl=float(os.environ.get("SEMANTIC_CACHE_TTL", str(7 * 24 * 3600))),
+    )
+
+def get_result_cache() -> ResultCache:
+    spill_dir = os.environ.get("RESULT_CACHE_SPILL_DIR", os.path.join(CACHE_DIR, "results"))
+    return ResultCache(
+        max_bytes=int(float(os.environ.get("RESULT_CACHE_MAX_MB", "64")) * (1 << 20)),
+        spill_dir=spill_dir or None,
+        spill_bytes=int(float(os.environ.get("RESULT_CACHE_SPILL_MB", "1")) * (1 << 20)),
+        max_disk_bytes=int(float(os.environ.get("RESULT_CACHE_MAX_DISK_MB", "1024")) * (1 << 20)),
+    )
+
+def get_result_compactor() -> ResultCompactor:
+    return ResultCompactor(
+        max_rows=int(os.environ.get("RESULT_MAX_ROWS", "50")),
+        max_tokens=int(os.environ.get("RESULT_MAX_TOKENS", "4000")),
+        max_chars=int(os.environ.get("RESULT_MAX_CHARS", "200")),
+    )
+
+def get_correction_cache() -> CorrectionCache:
+    return CorrectionCache(max_entries=int(os.environ.get("CORRECTION_CACHE_MAX_ENTRIES", "256")))
+
+def get_cost_guard() -> CostGuard:
+    return CostGuard(
+        max_estimated_rows=float(os.environ.get("COST_GUARD_MAX_ESTIMATED_ROWS", "1000000")),
+        max_rows=int(os.environ.get("COST_GUARD_MAX_ROWS", "1000")),
+        blocked_operators=[op.strip() for op in os.environ.get("COST_GUARD_BLOCKED_OPERATORS", "CartesianProduct").split(",")
+                           if op.strip()],
+        log_path=os.environ.get("COST_GUARD_LOG", os.path.join(CACHE_DIR, "blocked_queries.jsonl")) or None,
+    )
+
+@lru_cache(maxsize=None)
+def get_tracer() -> Tracer:
+    # Prices are USD per million tokens; the defaults are gpt-4o's.
+    return Tracer(
+        log_path=os.environ.get("TRACE_LOG", os.path.join(CACHE_DIR, "traces.jsonl")) or None,
+        window=int(os.environ.get("TRACE_WINDOW", "1000")),
+        prompt_price=float(os.environ.get("LLM_PROMPT_PRICE", "2.5")),
+        completion_price=float(os.environ.get("LLM_COMPLETION_PRICE", "10")),
+    )
+
+def get_version_watcher(graph) -> GraphVersionWatcher:
+    return GraphVersionWatcher(graph, interval=float(os.environ.get("GRAPH_VERSION_INTERVAL", "5")))
+
+def get_schema_service(graph, version_watcher) -> SchemaService:
+    pruner = None
+    if os.environ.get("SCHEMA_PRUNING", "1") != "0":
+        pruner = SchemaPruner(
+            get_embeddings(),
+            max_labels=int(os.environ.get("SCHEMA_PRUNING_LABELS", "3")),
+            max_properties=int(os.environ.get("SCHEMA_PRUNING_PROPERTIES", "6")),
+        )
+    return SchemaService(graph, version_watcher, snapshot_path=os.environ.get("SCHEMA_SNAPSHOT", DEFAULT_SNAPSHOT),
+                         pruner=pruner)
@@ -0,0 +1,61 @@
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from src.result_cache import normalize_cypher
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def error_signature(errors):
+    """Order-, case- and whitespace-insensitive fingerprint of a set of validation errors."""
+    normalized = sorted({_WHITESPACE.sub(" ", str(error)).strip().lower() for error in errors or []})
+    return hashlib.sha256("\n".join(normalized).encode("utf-8")).hexdigest()[:16]
+
+
+def correction_key(errors, cypher, schema_version=None):
+    # A correction only holds for the schema it was validated against.
+    text = f"{schema_version}\0{error_signature(errors)}\0{normalize_cypher(cypher or '')}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CorrectionCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+
+class CorrectionCache:
+    """LRU cache of corrections that passed validation, keyed by the errors and the Cypher they fixed.
+
+    A recurring mistake (same statement, same errors) is then corrected without an LLM call.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.stats = CorrectionCacheStats()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            corrected = self.entries.get(key)
+            if corrected is None:
+                self.stats.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats.hits += 1
+            return corrected
+
+    def put(self, key, corrected):
+        with self.lock:
+            self.entries[key] = corrected
+            self.entries.move_to_end(key)
+            self.stats.stores += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats.evictions += 1
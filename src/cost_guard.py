@@ -0,0 +1,108 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from typing import List
+
+from neo4j import Query
+
+from src.cypher_analysis import strip_literals
+
+# Neo4j errors raised when a running query hits the transaction timeout or the memory limit.
+ABORT_CODES = (
+    "Neo.ClientError.Transaction.TransactionTimedOut",
+    "Neo.ClientError.Transaction.TransactionTimedOutClientConfiguration",
+    "Neo.TransientError.General.MemoryPoolOutOfMemoryError",
+    "Neo.TransientError.General.TransactionMemoryLimit",
+)
+
+# A variable-length pattern without an upper bound, e.g. -[:NEIGHBOR*]- or -[*2..]-.
+_UNBOUNDED = re.compile(r"\[[^\[\]]*\*\s*(?:\d*\s*\.\.\s*)?\]")
+_FINAL_LIMIT = re.compile(r"\bLIMIT\s+(\d+)\s*;?\s*$", re.IGNORECASE)
+
+
+def explain_plan(graph, cypher, params=None):
+    """Plan of ``cypher`` from an EXPLAIN call on a ``Neo4jGraph``; raises CypherSyntaxError like ``query``."""
+    if hasattr(graph, "explain"):
+        # Stand-ins such as offline.LocalGraph plan statements themselves.
+        return graph.explain(cypher, params)
+    _, summary, _ = graph._driver.execute_query(
+        Query(text=f"EXPLAIN {cypher}", timeout=graph.timeout), database_=graph._database, parameters_=params or {}
+    )
+    return summary.plan
+
+
+def _operators(plan):
+    # Operator names carry the runtime since Neo4j 5, e.g. "CartesianProduct@neo4j".
+    # The Bolt plan metadata keeps the operator arguments under "args".
+    yield plan.get("operatorType", "").split("@")[0], plan.get("args", {})
+    for child in plan.get("children", []):
+        yield from _operators(child)
+
+
+def is_aborted(error):
+    return getattr(error, "code", None) in ABORT_CODES
+
+
+class CostGuard:
+    """Keeps expensive statements away from the database.
+
+    ``check`` rejects a statement from its EXPLAIN plan when an operator estimates more than
+    ``max_estimated_rows`` rows, uses a blocked operator such as a cartesian product, or when the
+    statement has an unbounded variable-length pattern. ``limit`` caps what a statement returns.
+    Every blocked statement is logged, and appended to ``log_path`` as JSON lines when set.
+    """
+
+    def __init__(self, max_estimated_rows=1_000_000, max_rows=1000, blocked_operators=("CartesianProduct",),
+                 log_path=None):
+        self.max_estimated_rows = max_estimated_rows
+        self.max_rows = max_rows
+        self.blocked_operators = set(blocked_operators)
+        self.log_path = log_path
+        self.lock = threading.Lock()
+
+    def check(self, cypher, plan) -> List[str]:
+        reasons = []
+        if _UNBOUNDED.search(strip_literals(cypher or "")):
+            reasons.append("it has a variable-length relationship without an upper bound")
+        estimated = 0.0
+        for operator, arguments in _operators(plan or {}):
+            if operator in self.blocked_operators:
+                reasons.append(f"its plan uses {operator}")
+            estimated = max(estimated, float(arguments.get("EstimatedRows", 0) or 0))
+        if estimated > self.max_estimated_rows:
+            reasons.append(f"its plan estimates {estimated:,.0f} rows, more than {self.max_estimated_rows:,}")
+        return list(dict.fromkeys(reasons))
+
+    def limit(self, cypher):
+        """``cypher`` with its final RETURN capped at ``max_rows`` rows.
+
+        Only a trailing LIMIT is added or lowered, so the result may be cut short: a result of
+        ``max_rows`` rows is possibly incomplete, and callers must say so.
+        """
+        text = strip_literals(cypher).rstrip().rstrip(";")
+        returns = list(re.finditer(r"\bRETURN\b", text, re.IGNORECASE))
+        # UNION applies a trailing LIMIT to the last part only; a trailing "}" means the last RETURN is nested.
+        if not returns or re.search(r"\bUNION\b", text, re.IGNORECASE) or "}" in text[returns[-1].end():]:
+            return cypher
+        tail = text[returns[-1].end():]
+        existing = _FINAL_LIMIT.search(cypher.rstrip())
+        if existing:
+            if int(existing.group(1)) <= self.max_rows:
+                return cypher
+            return cypher[:existing.start(1)] + str(self.max_rows) + cypher[existing.end(1):]
+        if re.search(r"\bLIMIT\b", tail, re.IGNORECASE):
+            # A parameter or expression limit; leave it alone.
+            return cypher
+        return f"{cypher.rstrip().rstrip(';')}\nLIMIT {self.max_rows}"
+
+    def record_blocked(self, question, cypher, reasons):
+        logging.warning(f"Blocked query {cypher!r}: {'; '.join(reasons)}")
+        if not self.log_path:
+            return
+        entry = {"time": time.time(), "question": question, "cypher": cypher, "reasons": reasons}
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with self.lock, open(self.log_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
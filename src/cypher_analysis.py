@@ -0,0 +1,174 @@
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+_STRING_OR_COMMENT = re.compile(r"""'(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*"|//[^\n]*|/\*.*?\*/""", re.DOTALL)
+_NAME = r"`?[A-Za-z_]\w*`?"
+_NODE = re.compile(
+    r"\(\s*(?P<var>[A-Za-z_]\w*)?\s*(?P<labels>(?::\s*%s\s*)+)?\s*(?P<props>\{[^{}]*\})?\s*\)" % _NAME
+)
+_REL = re.compile(
+    r"\s*(?P<left><)?-\s*(?:\[\s*(?P<var>[A-Za-z_]\w*)?\s*"
+    r"(?P<types>:\s*%s(?:\s*\|\s*:?\s*%s)*)?\s*(?P<hops>\*[\d.\s]*)?\s*(?P<props>\{[^{}]*\})?\s*\]\s*)?-(?P<right>>)?\s*"
+    % (_NAME, _NAME)
+)
+_MAP_KEY = re.compile(r"(?:^|[{,])\s*(%s)\s*:" % _NAME)
+_PROPERTY = re.compile(r"(?<![\w.$])([A-Za-z_]\w*)\s*\.\s*(%s)(?!\s*[.(\w])" % _NAME)
+_ALIAS = re.compile(r"\b(?:AS|as|As)\s+(%s)" % _NAME)
+_ITERATOR = re.compile(r"([A-Za-z_]\w*)\s+IN\b", re.IGNORECASE)
+_ASSIGNED = re.compile(r"\b([A-Za-z_]\w*)\s*=(?![=~])")
+# Constructs the analyser does not model; statements using them go to the LLM review.
+_UNSUPPORTED = re.compile(
+    r"\bCALL\b|\b(?:EXISTS|COUNT|COLLECT)\s*\{|\bapoc\.|\bgds\.|\)\s*\{\s*\d+\s*,|:\s*[!%]|\$\(",
+    re.IGNORECASE,
+)
+
+
+def _unquote(name):
+    return name.strip("`")
+
+
+def strip_literals(cypher):
+    # Literals become empty strings so their contents can never look like patterns.
+    return _STRING_OR_COMMENT.sub(lambda m: "''" if m.group()[0] in "'\"" else " ", cypher)
+
+
+@dataclass
+class CypherAnalysis:
+    """Schema problems found in a statement; ``undecided`` lists what the analyser could not check."""
+
+    errors: List[str] = field(default_factory=list)
+    undecided: List[str] = field(default_factory=list)
+
+    @property
+    def valid(self):
+        return not self.errors and not self.undecided
+
+
+def analyse_cypher(cypher, structured) -> CypherAnalysis:
+    """Check labels, relationship types and directions, properties and variable binding against a
+    structured schema (``node_props``, ``rel_props`` and ``relationships`` as built by Neo4jGraph)."""
+    result = CypherAnalysis()
+    text = strip_literals(cypher or "")
+    if not text.strip():
+        result.errors.append("The Cypher statement is empty")
+        return result
+    for m in _UNSUPPORTED.finditer(text):
+        result.undecided.append(f"Unsupported construct {m.group().strip()!r}")
+
+    node_props = {label: {p["property"] for p in props} for label, props in structured.get("node_props", {}).items()}
+    rel_props = {t: {p["property"] for p in props} for t, props in structured.get("rel_props", {}).items()}
+    triples = {(r["start"], r["type"], r["end"]) for r in structured.get("relationships", [])}
+    rel_types = {t for _, t, _ in triples} | set(rel_props)
+    all_props = set().union(*node_props.values(), *rel_props.values())
+
+    # First pass: every path pattern, and the labels and types its variables are bound to.
+    chains, node_vars, rel_vars, inline = [], {}, {}, []
+    pos = 0
+    while True:
+        m = _NODE.search(text, pos)
+        if m is None:
+            break
+        nodes, rels = [m], []
+        while True:
+            r = _REL.match(text, nodes[-1].end())
+            n = _NODE.match(text, r.end()) if r else None
+            if n is None:
+                break
+            rels.append(r)
+            nodes.append(n)
+        pos = nodes[-1].end()
+        chains.append((nodes, rels))
+        for node in nodes:
+            names = [_unquote(x) for x in re.findall(_NAME, node.group("labels") or "")]
+            if node.group("var"):
+                node_vars.setdefault(node.group("var"), set()).update(names)
+            for label in names:
+                if label not in node_props:
+                    result.errors.append(f"Label {label} is not in the schema")
+            # A bare "({...})" is far more often a map argument, e.g. point({x: 1, y: 2}).
+            if node.group("props") and (names or node.group("var")):
+                inline.append((names, node_props, node.group("props")))
+        for rel in rels:
+            types = [_unquote(x) for x in re.findall(_NAME, rel.group("types") or "")]
+            if rel.group("var"):
+                rel_vars.setdefault(rel.group("var"), set()).update(types)
+            for t in types:
+                if t not in rel_types:
+                    result.errors.append(f"Relationship type {t} is not in the schema")
+            if rel.group("props"):
+                inline.append((types, rel_props, rel.group("props")))
+
+    # Second pass: relationship directions, with labels bound anywhere in the statement.
+    bracketed = 0
+    for nodes, rels in chains:
+        labels = []
+        for node in nodes:
+            names = {_unquote(x) for x in re.findall(_NAME, node.group("labels") or "")}
+            labels.append(names or node_vars.get(node.group("var"), set()))
+        for i, rel in enumerate(rels):
+            bracketed += "[" in rel.group()
+            types = [_unquote(x) for x in re.findall(_NAME, rel.group("types") or "")]
+            if rel.group("hops") is None:
+                _check_direction(result, triples, labels[i], types, labels[i + 1],
+                                 bool(rel.group("left")), bool(rel.group("right")))
+
+    # Relationship patterns the regular expressions did not pick up, e.g. label expressions.
+    if text.count("-[") > bracketed:
+        result.undecided.append("Relationship pattern the analyser could not parse")
+
+    for names, props_by_name, props in inline:
+        for key in (_unquote(k) for k in _MAP_KEY.findall(props)):
+            known = set().union(*(props_by_name.get(n, set()) for n in names)) if names else all_props
+            if key not in known:
+                result.errors.append(f"Property {key} is not in the schema of {'|'.join(names) or 'any label'}")
+
+    bound = set(node_vars) | set(rel_vars)
+    bound |= {_unquote(a) for a in _ALIAS.findall(text)}
+    bound |= set(_ITERATOR.findall(text)) | set(_ASSIGNED.findall(text))
+    for var, prop in _PROPERTY.findall(text):
+        prop = _unquote(prop)
+        if var not in bound:
+            result.errors.append(f"Variable {var} is not defined")
+            continue
+        if var in node_vars and node_vars[var]:
+            known = set().union(*(node_props.get(label, set()) for label in node_vars[var]))
+            where = "|".join(sorted(node_vars[var]))
+        elif var in rel_vars and rel_vars[var]:
+            known = set().union(*(rel_props.get(t, set()) for t in rel_vars[var]))
+            where = "|".join(sorted(rel_vars[var]))
+        elif var in node_vars or var in rel_vars:
+            known, where = all_props, "any label"
+        else:
+            # Aliases may hold maps or projections, so their keys are not checked.
+            continue
+        if prop not in known:
+            result.errors.append(f"Property {prop} is not in the schema of {where}")
+
+    result.errors = list(dict.fromkeys(result.errors))
+    return result
+
+
+def _check_direction(result, triples, left, types, right, points_left, points_right):
+    if not types or not (left or right):
+        return
+
+    def fits(start, end):
+        return any(
+            (not start or s in start) and t in types and (not end or e in end)
+            for s, t, e in triples
+        )
+
+    if points_right and not points_left:
+        ok, reverse = fits(left, right), fits(right, left)
+    elif points_left and not points_right:
+        ok, reverse = fits(right, left), fits(left, right)
+    else:
+        ok, reverse = fits(left, right) or fits(right, left), False
+    if ok:
+        return
+    pattern = f"({'|'.join(sorted(left))})-[:{'|'.join(types)}]-({'|'.join(sorted(right))})"
+    if reverse:
+        result.errors.append(f"Relationship {pattern} points the wrong way")
+    else:
+        result.errors.append(f"Relationship {pattern} does not exist in the schema")
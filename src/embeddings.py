@@ -0,0 +1,86 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+QUERY_CACHE_SIZE = 4096
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embedding model with an on-disk cache for documents and an LRU for queries.
+
+    Document vectors are stored in SQLite keyed by (model, sha256 of the text), so a text
+    is only ever sent to the embedding API once per model.
+    """
+
+    def __init__(self, embeddings: Embeddings, path, model=None, query_cache_size=QUERY_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self.conn.commit()
+        self._embed_query = lru_cache(maxsize=query_cache_size)(self._embed_query_uncached)
+
+    def embed_vectors(self, texts: List[str]) -> np.ndarray:
+        """Embeddings of ``texts`` as a float32 matrix, computing only the ones not cached yet."""
+        hashes = [text_hash(t) for t in texts]
+        found = {}
+        with self.lock:
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                rows = self.conn.execute(
+                    "SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN (%s)"
+                    % ",".join("?" * len(batch)),
+                    [self.model, *batch],
+                )
+                found.update((h, np.frombuffer(v, dtype=np.float32)) for h, v in rows)
+        missing = [i for i, h in enumerate(hashes) if h not in found]
+        if missing:
+            vectors = self.embeddings.embed_documents([texts[i] for i in missing])
+            new = {hashes[i]: np.asarray(v, dtype=np.float32) for i, v in zip(missing, vectors)}
+            with self.lock:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                    [(self.model, h, v.tobytes()) for h, v in new.items()],
+                )
+                self.conn.commit()
+            found.update(new)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([found[h] for h in hashes])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_vectors(texts).tolist()
+
+    def _embed_query_uncached(self, text):
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        vector.setflags(write=False)
+        return vector
+
+    def embed_query_vector(self, text) -> np.ndarray:
+        return self._embed_query(text)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_query(text).tolist()
+
+    def query_cache_info(self):
+        return self._embed_query.cache_info()
@@ -0,0 +1,82 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.example_selectors.base import BaseExampleSelector
+
+from src.embeddings import CachedEmbeddings, text_hash
+
+
+def load_examples_file(path) -> List[Dict[str, str]]:
+    """Curated question/Cypher pairs, a JSON list of {"question": ..., "query": ...} objects."""
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class ExampleStore(BaseExampleSelector):
+    """Few-shot example selector over an in-memory, on-disk persisted embedding matrix.
+
+    Example vectors come from the shared embedding cache, so each example is embedded once
+    per model. The normalised matrix is saved next to the cache and reused as long as the
+    example set and model are unchanged; selecting is then one matrix-vector product.
+    """
+
+    def __init__(self, examples, embeddings: CachedEmbeddings, index_path, k=5, input_key="question"):
+        self.examples = list(examples)
+        self.embeddings = embeddings
+        self.index_path = index_path
+        self.k = k
+        self.input_key = input_key
+        self.matrix = self._load_or_build()
+
+    def _fingerprint(self):
+        digest = hashlib.sha256(self.embeddings.model.encode("utf-8"))
+        for example in self.examples:
+            digest.update(text_hash(example[self.input_key]).encode("ascii"))
+        return digest.hexdigest()
+
+    def _load_or_build(self):
+        fingerprint = self._fingerprint()
+        if os.path.exists(self.index_path):
+            with np.load(self.index_path) as index:
+                if str(index["fingerprint"]) == fingerprint:
+                    return index["matrix"]
+        logging.info(f"Building few-shot example index for {len(self.examples)} examples")
+        matrix = self._normalise(self.embeddings.embed_vectors([e[self.input_key] for e in self.examples]))
+        if os.path.dirname(self.index_path):
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, fingerprint=np.asarray(fingerprint), matrix=matrix)
+        os.replace(tmp, self.index_path)
+        return matrix
+
+    @staticmethod
+    def _normalise(matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.size == 0:
+            return matrix
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def add_example(self, example: Dict[str, str]) -> None:
+        vector = self._normalise(self.embeddings.embed_vectors([example[self.input_key]]))
+        self.examples.append(example)
+        self.matrix = vector if self.matrix.size == 0 else np.vstack([self.matrix, vector])
+
+    def similarities(self, text) -> np.ndarray:
+        if not self.examples:
+            return np.empty(0, dtype=np.float32)
+        return self.matrix @ self._normalise(self.embeddings.embed_query_vector(text))
+
+    def select_examples(self, input_variables: Dict[str, str]) -> List[dict]:
+        scores = self.similarities(input_variables[self.input_key])
+        k = min(self.k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [self.examples[i] for i in top[np.argsort(-scores[top], kind="stable")]]
@@ -1,32 +1,118 @@
 
+import time
+import asyncio
 import logging
+from neo4j.exceptions import Neo4jError
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_openai import ChatOpenAI
 
+from src.schema_snapshot import SchemaService
+from src.result_compaction import ResultCompactor, truncation_note
+from src.cost_guard import CostGuard, is_aborted
+from src.tracing import record_query, record_cache_hit
+
 no_results = "I couldn't find any relevant information in the database"
+aborted = "The database stopped the query because it took too long or needed too much memory"
+
+def run_query(graph, cypher, params=None, result_cache=None, version_watcher=None):
+    records = None
+    if result_cache is not None:
+        # Keyed by the graph version, so a re-ingest never serves rows from before it.
+        version = version_watcher.current()
+        records = result_cache.get(cypher, version, params)
+        if records is not None:
+            logging.info(f"Result cache hit {result_cache.info()}")
+            record_cache_hit("result_cache")
+    if records is None:
+        start = time.perf_counter()
+        records = graph.query(cypher, params or {})
+        record_query(time.perf_counter() - start, len(records))
+        if result_cache is not None:
+            result_cache.put(cypher, version, records, params)
+    return records
+
+async def arun_query(graph, cypher, params=None, result_cache=None, version_watcher=None):
+    """``run_query`` on an ``AsyncGraph``; the version check may hit the database, so it runs in a thread."""
+    records = None
+    if result_cache is not None:
+        version = await asyncio.to_thread(version_watcher.current)
+        records = result_cache.get(cypher, version, params)
+        if records is not None:
+            logging.info(f"Result cache hit {result_cache.info()}")
+            record_cache_hit("result_cache")
+    if records is None:
+        start = time.perf_counter()
+        records = await graph.aquery(cypher, params or {})
+        record_query(time.perf_counter() - start, len(records))
+        if result_cache is not None:
+            result_cache.put(cypher, version, records, params)
+    return records
+
+def _limited(state, guard):
+    """The statement to run and the row limit the guard added to it, if any."""
+    cypher = state.get("cypher_statement")
+    if guard is None:
+        return cypher, None
+    limited = guard.limit(cypher)
+    if limited == cypher:
+        return cypher, None
+    logging.info(f"Capped the query at {guard.max_rows} rows")
+    return limited, guard.max_rows
 
-def execute_cypher(state: dict, graph) -> dict:
-    records = graph.query(state.get("cypher_statement"))
+def _aborted(state, cypher, guard, error):
+    if not is_aborted(error):
+        raise error
+    if guard is not None:
+        guard.record_blocked(state.get("question"), cypher, [error.code])
+    else:
+        logging.warning(f"Query aborted by the database {error.code}")
+    return aborted
+
+def _execution_result(state, cypher, records, cap=None):
+    # A result as long as the added limit is most likely incomplete; the answer prompt must say so.
+    truncated_at = cap if cap and isinstance(records, list) and len(records) >= cap else None
+    if truncated_at:
+        logging.warning(f"Results truncated at {truncated_at} rows: {cypher!r}")
+    state["cypher_statement"] = cypher
     state["database_records"] = records if records else no_results
+    state["results_truncated_at"] = truncated_at
     state["next_action"] = "end"
     state["steps"].append("execute_cypher")
     return {
+        "cypher_statement": cypher,
         "database_records": records if records else no_results,
+        "results_truncated_at": truncated_at,
         "next_action": "end",
         "steps": ["execute_cypher"],
     }
 
-def generate_final_answer(state: dict, llm: ChatOpenAI, graph) -> dict:
-    generate_final_prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                "You are a helpful assistant who can analyse the json data and provide correct response to user queries."
-            ),
-            (
-                "human",
-                ("""Use the following results retrieved from neo4j database using the CYPHER query which has the SCHEMA to provide a succinct, definitive answer to the user's question. The results of query might be in json format.  Respond as if you are answering the question directly.
+def execute_cypher(state: dict, graph, result_cache=None, version_watcher=None, guard: CostGuard = None) -> dict:
+    cypher, cap = _limited(state, guard)
+    try:
+        records = run_query(graph, cypher, result_cache=result_cache, version_watcher=version_watcher)
+    except Neo4jError as e:
+        records = _aborted(state, cypher, guard, e)
+    return _execution_result(state, cypher, records, cap)
+
+async def aexecute_cypher(state: dict, graph, result_cache=None, version_watcher=None,
+                          guard: CostGuard = None) -> dict:
+    cypher, cap = _limited(state, guard)
+    try:
+        records = await arun_query(graph, cypher, result_cache=result_cache, version_watcher=version_watcher)
+    except Neo4jError as e:
+        records = _aborted(state, cypher, guard, e)
+    return _execution_result(state, cypher, records, cap)
+
+generate_final_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            "You are a helpful assistant who can analyse the json data and provide correct response to user queries."
+        ),
+        (
+            "human",
+            ("""Use the following results retrieved from neo4j database using the CYPHER query which has the SCHEMA to provide a succinct, definitive answer to the user's question. The results of query might be in json format.  Respond as if you are answering the question directly.
 
 SCHEMA: {schema}
 QUESTION: {question}
@@ -34,21 +120,39 @@ CYPHER: {cypher}
 RESULTS: {results}
 
 For the above question and results of query, reply to user question and provide all the important details to help user understand the answer.""")
-            ),
-        ]
-    )
-    generate_final_chain = generate_final_prompt | llm | StrOutputParser()
+        ),
+    ]
+)
+
+def _answer_inputs(state, schema, compactor=None):
     logging.info(f"GRAPH EXECUTED RESULTS {state.get('database_records')}")
+    results = state.get("database_records")
+    truncated_at = state.get("results_truncated_at")
+    if compactor is not None:
+        # Large results are reduced to a row and token budget plus summary statistics.
+        results = compactor(results, capped_at=truncated_at)
+    elif truncated_at:
+        results = f"{results}\nNOTE: {truncation_note(truncated_at)}"
+    return {
+        "question": state.get("question"),
+        "schema": schema.text_for(state.get("question"), state.get("cypher_statement")),
+        "cypher": state.get("cypher_statement"),
+        "results": results,
+    }
 
-    final_answer = generate_final_chain.invoke(
-        {
-            "question": state.get("question"),
-            "schema": graph.schema,
-            "cypher": state.get("cypher_statement"),
-            "results": state.get("database_records"),
-        }
-    )
+def _answer_result(state, final_answer):
     logging.info(f"Final Answer: {final_answer}")
     state["answer"] = final_answer
     state["steps"].append("generate_final_answer")
-    return {"answer": final_answer, "steps": ["generate_final_answer"]}
\ No newline at end of file
+    return {"answer": final_answer, "steps": ["generate_final_answer"]}
+
+def generate_final_answer(state: dict, llm: ChatOpenAI, schema: SchemaService,
+                          compactor: ResultCompactor = None) -> dict:
+    generate_final_chain = generate_final_prompt | llm | StrOutputParser()
+    return _answer_result(state, generate_final_chain.invoke(_answer_inputs(state, schema, compactor)))
+
+async def agenerate_final_answer(state: dict, llm: ChatOpenAI, schema: SchemaService,
+                                 compactor: ResultCompactor = None) -> dict:
+    generate_final_chain = generate_final_prompt | llm | StrOutputParser()
+    inputs = await asyncio.to_thread(_answer_inputs, state, schema, compactor)
+    return _answer_result(state, await generate_final_chain.ainvoke(inputs))
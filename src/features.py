@@ -0,0 +1,125 @@
+import warnings
+
+import numpy as np
+
+DISLOCATION_FEATURES = (
+    "arc_length", "mean_curvature", "max_curvature",
+    "bbox_min_x", "bbox_min_y", "bbox_max_x", "bbox_max_y",
+    "spacing",
+)
+PILEUP_FEATURES = (
+    "mean_spacing", "min_spacing", "max_spacing", "spread",
+    "total_arc_length", "mean_arc_length",
+)
+
+
+def _padded(arrays):
+    # Splines of different lengths are NaN-padded into one matrix so every op runs once per file.
+    width = max((len(a) for a in arrays), default=0)
+    out = np.full((len(arrays), width), np.nan)
+    for i, a in enumerate(arrays):
+        out[i, :len(a)] = a
+    return out
+
+
+def spline_features(xs, ys):
+    """Arc length, curvature and bounding box of every spline, as arrays of length ``len(xs)``."""
+    n = len(xs)
+    if n == 0:
+        return {name: np.empty(0) for name in DISLOCATION_FEATURES if name != "spacing"}
+    X, Y = _padded(xs), _padded(ys)
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        arc_length = np.nansum(np.hypot(np.diff(X, axis=1), np.diff(Y, axis=1)), axis=1)
+        if X.shape[1] >= 3:
+            dx, dy = np.gradient(X, axis=1), np.gradient(Y, axis=1)
+            ddx, ddy = np.gradient(dx, axis=1), np.gradient(dy, axis=1)
+            speed = np.hypot(dx, dy)
+            curvature = np.abs(dx * ddy - dy * ddx) / speed ** 3
+            curvature[~np.isfinite(curvature)] = np.nan
+            mean_curvature = np.nanmean(curvature, axis=1)
+            max_curvature = np.nanmax(curvature, axis=1)
+        else:
+            mean_curvature = max_curvature = np.full(n, np.nan)
+        return {
+            "arc_length": arc_length,
+            "mean_curvature": mean_curvature,
+            "max_curvature": max_curvature,
+            "bbox_min_x": np.nanmin(X, axis=1),
+            "bbox_min_y": np.nanmin(Y, axis=1),
+            "bbox_max_x": np.nanmax(X, axis=1),
+            "bbox_max_y": np.nanmax(Y, axis=1),
+        }
+
+
+def spacing_features(start_pos, pileup_index, n_pileups):
+    """Distance to the next dislocation plus per-pileup spacing statistics.
+
+    ``start_pos`` is (n, 2) and ``pileup_index`` the pileup of each row; rows of one pileup
+    are contiguous and in NEIGHBOR order.
+    """
+    start_pos = np.asarray(start_pos, dtype=float).reshape(-1, 2)
+    pileup_index = np.asarray(pileup_index, dtype=np.int64)
+    n = len(start_pos)
+    spacing = np.full(n, np.nan)
+    if n > 1:
+        gaps = np.hypot(*np.diff(start_pos, axis=0).T)
+        same_pileup = pileup_index[1:] == pileup_index[:-1]
+        spacing[:-1] = np.where(same_pileup, gaps, np.nan)
+
+    stats = {name: np.full(n_pileups, np.nan) for name in ("mean_spacing", "min_spacing", "max_spacing", "spread")}
+    if n == 0:
+        return spacing, stats
+    counts = np.bincount(pileup_index, minlength=n_pileups)
+    gap_rows = ~np.isnan(spacing)
+    gap_counts = np.bincount(pileup_index[gap_rows], minlength=n_pileups)
+    gap_sums = np.bincount(pileup_index[gap_rows], weights=spacing[gap_rows], minlength=n_pileups)
+    has_gaps = gap_counts > 0
+    stats["mean_spacing"][has_gaps] = gap_sums[has_gaps] / gap_counts[has_gaps]
+    if gap_rows.any():
+        present = np.unique(pileup_index[gap_rows])
+        starts = np.searchsorted(pileup_index[gap_rows], present)
+        stats["min_spacing"][present] = np.minimum.reduceat(spacing[gap_rows], starts)
+        stats["max_spacing"][present] = np.maximum.reduceat(spacing[gap_rows], starts)
+
+    # Spread: RMS distance of the dislocation start positions from their pileup centroid.
+    occupied = counts > 0
+    centroid = np.zeros((n_pileups, 2))
+    for axis in range(2):
+        sums = np.bincount(pileup_index, weights=start_pos[:, axis], minlength=n_pileups)
+        centroid[occupied, axis] = sums[occupied] / counts[occupied]
+    squared = np.sum((start_pos - centroid[pileup_index]) ** 2, axis=1)
+    sq_sums = np.bincount(pileup_index, weights=squared, minlength=n_pileups)
+    stats["spread"][occupied] = np.sqrt(sq_sums[occupied] / counts[occupied])
+    return spacing, stats
+
+
+def _as_property(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def annotate_rows(dislocation_rows, pileup_rows, pileup_index, start_pos, splines=None):
+    """Add the derived features to the Dislocation and Pileup parameter rows of one file.
+
+    ``splines`` holds the (xglobal, yglobal) arrays of each dislocation row, in the pixel
+    frame of ``start_pos``; without them
+    only the spacing features, which need start positions alone, are filled in.
+    """
+    n_pileups = len(pileup_rows)
+    pileup_index = np.asarray(pileup_index, dtype=np.int64)
+    spacing, pileup_stats = spacing_features(start_pos, pileup_index, n_pileups)
+    per_dislocation = {"spacing": spacing}
+    if splines is not None:
+        per_dislocation.update(spline_features([s[0] for s in splines], [s[1] for s in splines]))
+        arc_length = per_dislocation["arc_length"]
+        counts = np.bincount(pileup_index, minlength=n_pileups)
+        totals = np.bincount(pileup_index, weights=arc_length, minlength=n_pileups)
+        pileup_stats["total_arc_length"] = np.where(counts > 0, totals, np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pileup_stats["mean_arc_length"] = np.where(counts > 0, totals / counts, np.nan)
+
+    # Stored under "features" so the writers can SET them as a map and skip any not computed.
+    for rows, values_by_name in ((dislocation_rows, per_dislocation), (pileup_rows, pileup_stats)):
+        for i, row in enumerate(rows):
+            row["features"] = {name: _as_property(values[i]) for name, values in values_by_name.items()}
@@ -0,0 +1,154 @@
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable
+
+import numpy as np
+
+# Columns written per dislocation; each one is a flat float32 file.
+COLUMNS = ("x", "y", "xglobal", "yglobal")
+INDEX_FILE = "index.npz"
+
+
+@dataclass
+class SplineGeometry:
+    dis_id: str
+    x: np.ndarray
+    y: np.ndarray
+    xglobal: np.ndarray
+    yglobal: np.ndarray
+    lw: float
+    c_factor: float
+
+
+def _column_path(root, column):
+    return os.path.join(root, f"{column}.f32")
+
+
+def _read_index(root):
+    path = os.path.join(root, INDEX_FILE)
+    if not os.path.exists(path):
+        return {}
+    with np.load(path) as index:
+        return {
+            dis_id: (offset, length, lw, c_factor)
+            for dis_id, offset, length, lw, c_factor in zip(
+                index["ids"].tolist(), index["offsets"], index["lengths"], index["lw"], index["c_factor"]
+            )
+        }
+
+
+class GeometryWriter:
+    """Appends spline geometry to the column files of a store directory.
+
+    Re-written dislocations are appended again and the index points at the newest copy;
+    ``close`` compacts the columns once more than half of their contents are stale.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.index = _read_index(root)
+        self.files = {column: open(_column_path(root, column), "ab") for column in COLUMNS}
+        self.sizes = {column: self.files[column].tell() // 4 for column in COLUMNS}
+
+    def append(self, records):
+        """``records`` are dicts with ``dis_id``, the four coordinate arrays, ``lw`` and ``c_factor``."""
+        with self.lock:
+            for record in records:
+                offsets, lengths = [], []
+                for column in COLUMNS:
+                    values = np.ascontiguousarray(record[column], dtype=np.float32)
+                    values.tofile(self.files[column])
+                    offsets.append(self.sizes[column])
+                    lengths.append(values.size)
+                    self.sizes[column] += values.size
+                self.index[record["dis_id"]] = (
+                    np.asarray(offsets, dtype=np.int64),
+                    np.asarray(lengths, dtype=np.int64),
+                    np.float32(record.get("lw") if record.get("lw") is not None else np.nan),
+                    np.float32(record.get("c_factor") if record.get("c_factor") is not None else np.nan),
+                )
+
+    def remove_microstructures(self, ms_ids):
+        prefixes = tuple(f"{ms_id}_" for ms_id in ms_ids)
+        with self.lock:
+            for dis_id in [d for d in self.index if d.startswith(prefixes)]:
+                del self.index[dis_id]
+
+    def _write_index(self):
+        ids = list(self.index)
+        entries = [self.index[dis_id] for dis_id in ids]
+        tmp = os.path.join(self.root, INDEX_FILE + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                ids=np.asarray(ids, dtype=str),
+                offsets=np.asarray([e[0] for e in entries], dtype=np.int64).reshape(-1, len(COLUMNS)),
+                lengths=np.asarray([e[1] for e in entries], dtype=np.int64).reshape(-1, len(COLUMNS)),
+                lw=np.asarray([e[2] for e in entries], dtype=np.float32),
+                c_factor=np.asarray([e[3] for e in entries], dtype=np.float32),
+            )
+        # The index is swapped in last, so readers never see offsets past the column ends.
+        os.replace(tmp, os.path.join(self.root, INDEX_FILE))
+
+    def _compact(self):
+        for i, column in enumerate(COLUMNS):
+            self.files[column].close()
+            old = np.fromfile(_column_path(self.root, column), dtype=np.float32)
+            tmp = _column_path(self.root, column) + ".tmp"
+            position = 0
+            with open(tmp, "wb") as f:
+                for offsets, lengths, _, _ in self.index.values():
+                    old[offsets[i]:offsets[i] + lengths[i]].tofile(f)
+                    offsets[i] = position
+                    position += lengths[i]
+            os.replace(tmp, _column_path(self.root, column))
+
+    def close(self):
+        with self.lock:
+            for f in self.files.values():
+                f.flush()
+            live = sum(int(entry[1].sum()) for entry in self.index.values())
+            if live * 2 < sum(self.sizes.values()):
+                self._compact()
+            for f in self.files.values():
+                f.close()
+            self._write_index()
+
+
+class GeometryStore:
+    """Read-only, memory-mapped view of a store written by ``GeometryWriter``."""
+
+    def __init__(self, root):
+        self.root = root
+        self.index = _read_index(root)
+        self.columns = {}
+        for column in COLUMNS:
+            path = _column_path(root, column)
+            if os.path.exists(path) and os.path.getsize(path):
+                self.columns[column] = np.memmap(path, dtype=np.float32, mode="r")
+            else:
+                self.columns[column] = np.empty(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, dis_id):
+        return dis_id in self.index
+
+    def ids(self):
+        return list(self.index)
+
+    def get(self, dis_id) -> SplineGeometry:
+        offsets, lengths, lw, c_factor = self.index[dis_id]
+        arrays = {
+            column: self.columns[column][offsets[i]:offsets[i] + lengths[i]]
+            for i, column in enumerate(COLUMNS)
+        }
+        return SplineGeometry(dis_id=dis_id, lw=float(lw), c_factor=float(c_factor), **arrays)
+
+    def load(self, dis_ids: Iterable[str]) -> Dict[str, SplineGeometry]:
+        """Geometry of every known id in ``dis_ids``; arrays are views into the mapped files."""
+        return {dis_id: self.get(dis_id) for dis_id in dis_ids if dis_id in self.index}
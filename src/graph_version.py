@@ -0,0 +1,36 @@
+import time
+import threading
+
+# The ingester bumps this counter after every write, so caches can tell when the data changed.
+GRAPH_META_LABEL = "_GraphMeta"
+
+BUMP_VERSION_QUERY = (
+    f"MERGE (g:{GRAPH_META_LABEL} {{ id: 'graph' }}) "
+    "SET g.version = coalesce(g.version, 0) + 1, g.updated_at = datetime() "
+    "RETURN g.version AS version"
+)
+READ_VERSION_QUERY = f"MATCH (g:{GRAPH_META_LABEL} {{ id: 'graph' }}) RETURN g.version AS version"
+
+
+def read_graph_version(graph):
+    records = graph.query(READ_VERSION_QUERY)
+    return records[0]["version"] if records else 0
+
+
+class GraphVersionWatcher:
+    """Reads the graph version at most once every ``interval`` seconds."""
+
+    def __init__(self, graph, interval=5.0):
+        self.graph = graph
+        self.interval = interval
+        self.lock = threading.Lock()
+        self._version = None
+        self._checked = 0.0
+
+    def current(self):
+        with self.lock:
+            now = time.monotonic()
+            if self._version is None or now - self._checked >= self.interval:
+                self._version = read_graph_version(self.graph)
+                self._checked = now
+            return self._version
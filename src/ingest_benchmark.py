@@ -0,0 +1,179 @@
+import os
+import io
+import shlex
+import json
+import time
+import argparse
+import subprocess
+import resource
+import contextlib
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from neo4j import GraphDatabase
+from neo4j.exceptions import ServiceUnavailable
+
+from src.benchmark import git_commit
+from src.inject import DislocationGraph, DEFAULT_BATCH_SIZE
+from src.synthetic_data import SyntheticConfig, write_dataset
+
+MODES = ("row", "batched", "parallel")
+DEFAULT_SCALES = (1000, 10000, 100000)
+# The ./data volume of docker-compose.yaml.
+DEFAULT_STORE_DIR = os.path.join("data", "databases", "neo4j")
+
+_CLEAR_QUERY = "MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS"
+_COUNT_QUERY = (
+    "CALL { MATCH (n) WHERE NOT n:_GraphMeta RETURN count(n) AS nodes } "
+    "CALL { MATCH ()-[r]->() RETURN count(r) AS relationships } "
+    "RETURN nodes, relationships"
+)
+
+
+def _ingest(mode, files, connection, batch_size, workers, writers):
+    # Runs in a fresh process, so ru_maxrss is the peak of this ingest alone.
+    processor = DislocationGraph(*connection, batch_size=batch_size, mode="row" if mode == "row" else "batched")
+    try:
+        processor.create_constraints()
+        start = time.perf_counter()
+        # The row mode prints every node it creates.
+        with contextlib.redirect_stdout(io.StringIO()):
+            if mode == "parallel":
+                from src.parallel_ingest import ingest_parallel
+                retries = ingest_parallel(processor, files, workers=workers, writers=writers).retries
+            else:
+                processor.process_json_files(files)
+                retries = 0
+        seconds = time.perf_counter() - start
+    finally:
+        processor.close()
+    return {
+        "seconds": seconds,
+        "retries": retries,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "worker_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def store_size_mb(store_dir):
+    if not store_dir or not os.path.isdir(store_dir):
+        return None
+    total = 0
+    for root, _, names in os.walk(store_dir):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total / (1 << 20)
+
+
+def reset_store(command, connection, timeout=300):
+    """Run ``command`` to replace the database with an empty store, then wait until it accepts connections."""
+    subprocess.run(shlex.split(command), check=True)
+    deadline = time.monotonic() + timeout
+    with GraphDatabase.driver(connection[0], auth=connection[1:]) as driver:
+        while True:
+            try:
+                driver.verify_connectivity()
+                return
+            except ServiceUnavailable:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(2)
+
+
+def run_one(mode, files, connection, batch_size=DEFAULT_BATCH_SIZE, workers=4, writers=2, store_dir=None,
+            measure_store=True):
+    """Ingest ``files`` into an emptied database with one mode and measure it.
+
+    Neo4j does not shrink its store files after deletes, so the store size is only reported
+    when ``measure_store`` says the store started out fresh.
+    """
+    driver = GraphDatabase.driver(connection[0], auth=connection[1:])
+    try:
+        with driver.session() as session:
+            session.run(_CLEAR_QUERY).consume()
+        spawn = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            result = pool.submit(_ingest, mode, files, connection, batch_size, workers, writers).result()
+        with driver.session() as session:
+            counts = session.run(_COUNT_QUERY).single().data()
+    finally:
+        driver.close()
+    seconds = result["seconds"]
+    return {
+        "mode": mode,
+        "files": len(files),
+        **counts,
+        **result,
+        "files_per_second": len(files) / seconds if seconds else None,
+        "nodes_per_second": counts["nodes"] / seconds if seconds else None,
+        "store_mb": store_size_mb(store_dir) if measure_store else None,
+    }
+
+
+def report(runs):
+    lines = [f"{'files':>8} {'mode':<9} {'seconds':>9} {'files/s':>9} {'nodes/s':>10} {'peak RSS':>9} "
+             f"{'workers':>8} {'store MB':>9}"]
+    for run in runs:
+        store = f"{run['store_mb']:.0f}" if run["store_mb"] is not None else "-"
+        lines.append(f"{run['files']:>8} {run['mode']:<9} {run['seconds']:>9.1f} {run['files_per_second']:>9.1f} "
+                     f"{run['nodes_per_second']:>10.0f} {run['peak_rss_mb']:>8.0f}M "
+                     f"{run['worker_peak_rss_mb']:>7.0f}M {store:>9}")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure ingest throughput, memory and store size on synthetic datasets.")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="Microstructures per run")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--data-dir", default=os.path.join("benchmarks", "synthetic"),
+                        help="Generated files, grown and reused across runs")
+    parser.add_argument("--points", type=int, default=SyntheticConfig.points, help="Points per spline")
+    parser.add_argument("--seed", type=int, default=SyntheticConfig.seed)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=4, help="Parser processes of the parallel mode")
+    parser.add_argument("--writers", type=int, default=2, help="Writer sessions of the parallel mode")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help="Neo4j store directory, to report its size")
+    parser.add_argument("--reset-store", default=None, metavar="COMMAND",
+                        help="Command that recreates the database with an empty store before every run, e.g. "
+                             "'sh -c \"docker compose down && rm -rf data && docker compose up -d\"'; "
+                             "without it the store size is only reported for the first run")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results"))
+    parser.add_argument("--uri", default=os.environ.get("NEO4J_URI", "neo4j://localhost:7687"))
+    parser.add_argument("--user", default=os.environ.get("NEO4J_USERNAME", "neo4j"))
+    parser.add_argument("--password", default=os.environ.get("NEO4J_PASSWORD", "password"))
+    args = parser.parse_args()
+
+    config = SyntheticConfig(points=args.points, seed=args.seed)
+    connection = (args.uri, args.user, args.password)
+    runs = []
+    for scale in sorted(args.scales):
+        start = time.perf_counter()
+        files = write_dataset(args.data_dir, scale, config, workers=os.cpu_count() or 1)
+        print(f"{scale} files ready in {time.perf_counter() - start:.1f}s")
+        for mode in args.modes:
+            # Without a reset, the store still holds the space of earlier runs.
+            if args.reset_store:
+                reset_store(args.reset_store, connection)
+            runs.append(run_one(mode, files, connection, batch_size=args.batch_size, workers=args.workers,
+                                writers=args.writers, store_dir=args.store_dir,
+                                measure_store=bool(args.reset_store) or not runs))
+            print(report(runs)[-1])
+
+    print("\n".join(report(runs)))
+    result = {
+        "label": args.label,
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "args": {k: v for k, v in vars(args).items() if k != "password"},
+        "runs": runs,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"ingest-{result['time'].replace(':', '')}{'-' + args.label if args.label else ''}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {path}")
@@ -1,12 +1,222 @@
+import os
 import json
 import glob
+import time
+import random
+import argparse
+from dataclasses import dataclass, field
+from typing import List
 from neo4j import GraphDatabase
+from neo4j.exceptions import TransientError
+
+from src.json_reader import read_microstructure, SPLINE_KEYS
+from src.geometry_store import GeometryWriter
+from src.features import annotate_rows
+from src.spatial_index import GridIndex, SpatialIndexStore, window_mask
+from src.manifest import IngestManifest, DEFAULT_MANIFEST
+from src.graph_version import BUMP_VERSION_QUERY
+from src.schema_snapshot import DEFAULT_SNAPSHOT, fetch_structured_schema, write_snapshot
+
+# Pileups and dislocations whose start position falls outside this window are skipped
+# (xmin <= x < xmax and ymin <= y < ymax).
+DEFAULT_ROI = (float("-inf"), float("-inf"), 450.0, 450.0)
+MISSING_POS = [9999, 9999]
+BOX_FEATURES = ("bbox_min_x", "bbox_min_y", "bbox_max_x", "bbox_max_y")
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_MAX_RETRIES = 5
+NODE_LABELS = ("Microstructure", "Pileup", "Dislocation", "GrainBoundary", "SlipTrace")
+
+
+def constraint_query(label):
+    return f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{label}) REQUIRE n.id IS UNIQUE"
+
+
+def ms_id_from_path(json_file):
+    return "ms_" + str(int(os.path.basename(json_file).split(".")[0].replace("param_img", "")))
+
+
+def pileup_node_id(ms_id, pileup_key):
+    # Pileup keys such as "id_0" repeat in every file, so node ids are scoped by microstructure.
+    return f"{ms_id}_{pileup_key}"
+
+
+def in_roi(start_pos, roi=DEFAULT_ROI):
+    return roi[0] <= start_pos[0] < roi[2] and roi[1] <= start_pos[1] < roi[3]
+
+
+@dataclass
+class GraphRows:
+    """Parameter lists for every entity type of one or more microstructures."""
+    microstructures: List[dict] = field(default_factory=list)
+    grain_boundaries: List[dict] = field(default_factory=list)
+    slip_traces: List[dict] = field(default_factory=list)
+    pileups: List[dict] = field(default_factory=list)
+    has_pileup: List[dict] = field(default_factory=list)
+    dislocations: List[dict] = field(default_factory=list)
+    neighbors: List[dict] = field(default_factory=list)
+    pileup_slip_traces: List[dict] = field(default_factory=list)
+    near: List[dict] = field(default_factory=list)
+    # Spline arrays for the geometry store; only filled when the file was read with its arrays.
+    geometry: List[dict] = field(default_factory=list)
+    # Per-microstructure positions and spline boxes for the spatial index.
+    spatial: List[dict] = field(default_factory=list)
+
+    def extend(self, other):
+        for name in self.__dataclass_fields__:
+            getattr(self, name).extend(getattr(other, name))
+
+    def node_count(self):
+        return (len(self.microstructures) + len(self.grain_boundaries) + len(self.slip_traces)
+                + len(self.pileups) + len(self.dislocations))
+
+    def __len__(self):
+        side_fields = ("geometry", "spatial")
+        return sum(len(getattr(self, name)) for name in self.__dataclass_fields__ if name not in side_fields)
+
+
+def build_rows(data, ms_id, geometry=False, roi=DEFAULT_ROI, near_radius=None):
+    # Mirrors the filtering and ordering of the per-row path in process_json_file.
+    rows = GraphRows()
+    rows.microstructures.append({"ms_id": ms_id})
+
+    gb_data = data.get("grain_boundary", None)
+    slip_trace_flag = data.get("slip_trace", False)
+    gb_node_id = "gb_" + ms_id
+    st_node_id = "st_" + ms_id
+
+    if data.get("include_gb", False) and gb_data is not None:
+        rows.grain_boundaries.append({
+            "ms_id": ms_id,
+            "gb_id": gb_node_id,
+            "gb_angle": gb_data.get("gb_angle"),
+            "gb_center": gb_data.get("gb_center"),
+            "lw": gb_data.get("lw"),
+        })
+    if slip_trace_flag:
+        rows.slip_traces.append({"ms_id": ms_id, "st_id": st_node_id})
+
+    # The ROI is a window query over the start positions of all pileups, then of all
+    # dislocations of the kept pileups (in NEIGHBOR order).
+    pileups = list(data.get("pileup", {}).items())
+    kept_pileups = window_mask([p.get("start_pos", MISSING_POS)[:2] for _, p in pileups], roi)
+    candidates = []
+    for kept, (pileup_key, pileup_data) in zip(kept_pileups, pileups):
+        if not kept:
+            continue
+        dislocations = pileup_data.get("dislocation", {})
+        sorted_keys = sorted(dislocations.keys(), key=lambda k: int(k.split('_')[-1]))
+        candidates.extend((pileup_key, dkey, dislocations[dkey]) for dkey in sorted_keys)
+    kept_dislocations = window_mask([d.get("start_pos", MISSING_POS)[:2] for _, _, d in candidates], roi)
+
+    pileup_index, start_pos, splines = [], [], []
+    position = 0
+    for kept, (pileup_key, pileup_data) in zip(kept_pileups, pileups):
+        if not kept:
+            continue
+        pileup_id = pileup_node_id(ms_id, pileup_key)
+        rows.pileups.append({
+            "pileup_id": pileup_id,
+            "n_dislocations": pileup_data.get("n_dislocations"),
+            "start_pos": pileup_data.get("start_pos"),
+            "slip_width": pileup_data.get("slip_width"),
+            "offset": pileup_data.get("offset"),
+            "direction": pileup_data.get("direction"),
+        })
+        rows.has_pileup.append({"ms_id": ms_id, "pileup_id": pileup_id})
+
+        composite_ids = []
+        while position < len(candidates) and candidates[position][0] == pileup_key:
+            _, dkey, ddata = candidates[position]
+            in_window = kept_dislocations[position]
+            position += 1
+            if not in_window:
+                continue
+            composite_id = f"{pileup_id}_{dkey}"
+            rows.dislocations.append({
+                "composite_id": composite_id,
+                "pileup_id": pileup_id,
+                "spline_id": ddata.get("spline_id"),
+                "start_pos_x": ddata.get("start_pos")[0],
+                "start_pos_y": ddata.get("start_pos")[1],
+                "offset": ddata.get("offset"),
+            })
+            composite_ids.append(composite_id)
+            pileup_index.append(len(rows.pileups) - 1)
+            start_pos.append(ddata.get("start_pos")[:2])
+            if ddata.get("xglobal") is not None:
+                splines.append((ddata.get("xglobal"), ddata.get("yglobal")))
+            if geometry and ddata.get("x") is not None:
+                rows.geometry.append({
+                    "dis_id": composite_id,
+                    **{key: ddata.get(key) for key in SPLINE_KEYS},
+                    "lw": ddata.get("lw"),
+                    "c_factor": ddata.get("c_factor"),
+                })
+
+        for i in range(len(composite_ids) - 1):
+            rows.neighbors.append({"id1": composite_ids[i], "id2": composite_ids[i + 1]})
+
+        if slip_trace_flag:
+            rows.pileup_slip_traces.append({"pileup_id": pileup_id, "st_id": st_node_id})
+
+    annotate_rows(rows.dislocations, rows.pileups, pileup_index, start_pos,
+                  splines if splines and len(splines) == len(rows.dislocations) else None)
+
+    dis_ids = [row["composite_id"] for row in rows.dislocations]
+    boxes = None
+    if splines and len(splines) == len(rows.dislocations):
+        boxes = [[row["features"][name] for name in BOX_FEATURES] for row in rows.dislocations]
+        boxes = [[float("nan") if v is None else v for v in box] for box in boxes]
+    rows.spatial.append({"ms_id": ms_id, "ids": dis_ids, "points": start_pos, "boxes": boxes})
+    if near_radius:
+        grid = GridIndex(start_pos)
+        for i, j, distance in grid.pairs_within(near_radius):
+            rows.near.append({"id1": dis_ids[i], "id2": dis_ids[j], "distance": distance})
+    return rows
+
+
+def load_rows(json_file, features=True, geometry=False, roi=DEFAULT_ROI, near_radius=None):
+    # The spline arrays are only parsed (into NumPy, never Python lists) for feature extraction or the geometry store.
+    data = read_microstructure(json_file, arrays=features or geometry)
+    return build_rows(data, ms_id_from_path(json_file), geometry=geometry, roi=roi, near_radius=near_radius)
+
+
+def chunks(rows, size):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
 
 class DislocationGraph:
-    def __init__(self, uri, user, password):
+    def __init__(self, uri, user, password, batch_size=DEFAULT_BATCH_SIZE, mode="batched",
+                 max_retries=DEFAULT_MAX_RETRIES, geometry_dir=None, features=True, roi=DEFAULT_ROI,
+                 near_radius=None, spatial_dir=None, schema_snapshot=None):
+        if mode not in ("batched", "row"):
+            raise ValueError(f"Unknown ingest mode {mode!r}, expected 'batched' or 'row'")
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        self.batch_size = batch_size
+        self.mode = mode
+        self.max_retries = max_retries
+        self.geometry = GeometryWriter(geometry_dir) if geometry_dir else None
+        self.features = features
+        self.roi = tuple(roi)
+        self.near_radius = near_radius
+        self.spatial = SpatialIndexStore(spatial_dir) if spatial_dir else None
+        self.schema_snapshot = schema_snapshot
+
+    @property
+    def load_options(self):
+        return {
+            "features": self.features,
+            "geometry": self.geometry is not None,
+            "roi": self.roi,
+            "near_radius": self.near_radius,
+        }
 
     def close(self):
+        if self.geometry is not None:
+            self.geometry.close()
+        if self.spatial is not None:
+            self.spatial.save()
         self.driver.close()
 
     def create_pileup(self, tx, pileup_id, pileup_data):
@@ -97,11 +307,252 @@ class DislocationGraph:
         )
         tx.run(query, ms_id=ms_id)
 
+    def create_constraints(self):
+        # MERGE on an unindexed id scans the whole label, which dominates batched writes.
+        with self.driver.session() as session:
+            for label in NODE_LABELS:
+                session.run(constraint_query(label))
+
+    # Batched (UNWIND) writers, one statement per chunk of rows.
+
+    def merge_microstructures(self, tx, rows):
+        tx.run(
+            "UNWIND $rows AS row "
+            "MERGE (m:Microstructure { id: row.ms_id }) "
+            "SET m.ms_id = row.ms_id",
+            rows=rows
+        )
+
+    def merge_grain_boundaries(self, tx, rows):
+        tx.run(
+            "UNWIND $rows AS row "
+            "MERGE (gb:GrainBoundary { id: row.gb_id }) "
+            "SET gb.gb_id = row.gb_id, "
+            "    gb.gb_angle = row.gb_angle, "
+            "    gb.gb_center = row.gb_center, "
+            "    gb.lw = row.lw "
+            "WITH gb, row "
+            "MATCH (m:Microstructure { id: row.ms_id }) "
+            "MERGE (m)-[:HAS_GRAIN_BOUNDARY]->(gb)",
+            rows=rows
+        )
+
+    def merge_slip_traces(self, tx, rows):
+        tx.run(
+            "UNWIND $rows AS row "
+            "MERGE (st:SlipTrace { id: row.st_id }) "
+            "SET st.slip_id = '<id> ' + row.st_id "
+            "WITH st, row "
+            "MATCH (m:Microstructure { id: row.ms_id }) "
+            "MERGE (m)-[:HAS_SLIP_TRACE]->(st)",
+            rows=rows
+        )
+
+    def merge_pileups(self, tx, rows):
+        tx.run(
+            "UNWIND $rows AS row "
+            "MERGE (p:Pileup { id: row.pileup_id }) "
+            "SET p.pileup_id = row.pileup_id, "
+            "    p.n_dislocations = row.n_dislocations, "
+            "    p.start_pos = row.start_pos, "
+            "    p.slip_width = row.slip_width, "
+            "    p.offset = row.offset, "
+            "    p.direction = row.direction "
+            "SET p += row.features",
+            rows=rows
+        )
+
+    def merge_has_pileup(self, tx, rows):
+        tx.run(
+            "UNWIND $rows AS row "
+            "MATCH (m:Microstructure { id: row.ms_id }), (p:Pileup { id: row.pileup_id }) "
+            "MERGE (m)-[:HAS_PILEUP]->(p)",
+            rows=rows
+        )
+
+    def merge_dislocations(self, tx, rows):
+        tx.run(
+            "UNWIND $rows AS row "
+            "MERGE (d:Dislocation { id: row.composite_id }) "
+            "SET d.dis_id = row.composite_id, "
+            "    d.spline_id = row.spline_id, "
+            "    d.start_pos_x = row.start_pos_x, "
+            "    d.start_pos_y = row.start_pos_y, "
+            "    d.offset = row.offset "
+            "SET d += row.features "
+            "WITH d, row "
+            "MATCH (p:Pileup { id: row.pileup_id }) "
+            "MERGE (p)-[:CONTAINS]->(d)",
+            rows=rows
+        )
+
+    def merge_neighbors(self, tx, rows):
+        tx.run(
+            "UNWIND $rows AS row "
+            "MATCH (d1:Dislocation { id: row.id1 }), (d2:Dislocation { id: row.id2 }) "
+            "MERGE (d1)-[:NEIGHBOR]->(d2) "
+            "MERGE (d2)-[:NEIGHBOR]->(d1)",
+            rows=rows
+        )
+
+    def merge_pileup_slip_traces(self, tx, rows):
+        tx.run(
+            "UNWIND $rows AS row "
+            "MATCH (p:Pileup { id: row.pileup_id }), (st:SlipTrace { id: row.st_id }) "
+            "MERGE (p)-[:HAS_SLIP_TRACE]->(st)",
+            rows=rows
+        )
+
+    def merge_near(self, tx, rows):
+        # Stored once per pair; query it undirected, e.g. (d1)-[:NEAR]-(d2).
+        tx.run(
+            "UNWIND $rows AS row "
+            "MATCH (d1:Dislocation { id: row.id1 }), (d2:Dislocation { id: row.id2 }) "
+            "MERGE (d1)-[r:NEAR]->(d2) "
+            "SET r.distance = row.distance",
+            rows=rows
+        )
+
+    def delete_microstructures(self, tx, ms_ids):
+        # Removes each microstructure together with everything only it owns.
+        tx.run(
+            "UNWIND $ms_ids AS ms_id "
+            "MATCH (m:Microstructure { id: ms_id }) "
+            "OPTIONAL MATCH (m)-[:HAS_PILEUP]->(p:Pileup) "
+            "OPTIONAL MATCH (p)-[:CONTAINS]->(d:Dislocation) "
+            "WITH m, collect(DISTINCT p) + collect(DISTINCT d) AS owned "
+            "OPTIONAL MATCH (m)-[:HAS_GRAIN_BOUNDARY|HAS_SLIP_TRACE]->(x) "
+            # Neo4j 5 rejects aggregating over a non-grouping variable, so owned is carried as a key.
+            "WITH m, owned, collect(DISTINCT x) AS extra "
+            "FOREACH (n IN owned + extra | DETACH DELETE n) "
+            "DETACH DELETE m",
+            ms_ids=ms_ids
+        )
+
+    def remove_microstructures(self, ms_ids):
+        with self.driver.session() as session:
+            for chunk in chunks(ms_ids, self.batch_size):
+                session.execute_write(self.delete_microstructures, chunk)
+        if self.geometry is not None:
+            self.geometry.remove_microstructures(ms_ids)
+        if self.spatial is not None:
+            self.spatial.remove(ms_ids)
+        self.bump_graph_version()
+
+    def bump_graph_version(self):
+        # Query-side caches compare this counter to decide whether cached rows and schemas are stale.
+        with self.driver.session() as session:
+            version = session.execute_write(lambda tx: tx.run(BUMP_VERSION_QUERY).single()["version"])
+        if self.schema_snapshot:
+            write_snapshot(self.schema_snapshot, fetch_structured_schema(self.driver), version)
+        return version
+
+    def write_rows(self, tx, rows, replace=False):
+        if replace:
+            # Replacing inside the same transaction keeps each microstructure swap atomic.
+            self.delete_microstructures(tx, [row["ms_id"] for row in rows.microstructures])
+        # Nodes are written before the relationships that MATCH on them.
+        writers = [
+            (self.merge_microstructures, rows.microstructures),
+            (self.merge_grain_boundaries, rows.grain_boundaries),
+            (self.merge_slip_traces, rows.slip_traces),
+            (self.merge_pileups, rows.pileups),
+            (self.merge_has_pileup, rows.has_pileup),
+            (self.merge_dislocations, rows.dislocations),
+            (self.merge_neighbors, rows.neighbors),
+            (self.merge_pileup_slip_traces, rows.pileup_slip_traces),
+            (self.merge_near, rows.near),
+        ]
+        for writer, entity_rows in writers:
+            for chunk in chunks(entity_rows, self.batch_size):
+                writer(tx, chunk)
+
+    def write_with_retry(self, session, rows, replace=False):
+        # Concurrent MERGEs on shared nodes can deadlock; the transaction is rolled back and replayed.
+        attempt = 0
+        while True:
+            try:
+                with session.begin_transaction() as tx:
+                    self.write_rows(tx, rows, replace=replace)
+                return attempt
+            except TransientError as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = min(2.0, 0.05 * 2 ** attempt) * (0.5 + random.random())
+                print(f"Transient error ({e.code}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+    def flush(self, rows, session=None, replace=False):
+        if not len(rows):
+            return 0
+        if session is not None:
+            retries = self.write_with_retry(session, rows, replace=replace)
+        else:
+            with self.driver.session() as session:
+                retries = self.write_with_retry(session, rows, replace=replace)
+        if self.geometry is not None:
+            # Written after the commit so the store never references dislocations missing from the graph.
+            if replace:
+                self.geometry.remove_microstructures([row["ms_id"] for row in rows.microstructures])
+            self.geometry.append(rows.geometry)
+        if self.spatial is not None:
+            for entry in rows.spatial:
+                self.spatial.add(entry["ms_id"], entry["ids"], entry["points"], entry["boxes"])
+        return retries
+
     def process_json_file(self, json_file):
+        if self.mode == "row":
+            self.process_json_file_rowwise(json_file)
+        else:
+            self.flush(load_rows(json_file, **self.load_options))
+        self.bump_graph_version()
+
+    def process_json_files(self, json_files, replace=False, on_written=None):
+        # Rows of several files are accumulated and written together once batch_size is reached.
+        # on_written receives the files of every committed batch.
+        if self.mode == "row":
+            for json_file in json_files:
+                self.process_json_file_rowwise(json_file)
+                if on_written:
+                    on_written([json_file])
+            self.bump_graph_version()
+            return
+        pending, pending_files = GraphRows(), []
+        for json_file in json_files:
+            pending.extend(load_rows(json_file, **self.load_options))
+            pending_files.append(json_file)
+            if len(pending) >= self.batch_size:
+                self.flush(pending, replace=replace)
+                if on_written:
+                    on_written(pending_files)
+                pending, pending_files = GraphRows(), []
+        self.flush(pending, replace=replace)
+        if on_written and pending_files:
+            on_written(pending_files)
+        self.bump_graph_version()
+
+    def ingest_incremental(self, json_files, manifest, force=False, workers=0, **parallel_options):
+        """Ingest only new or changed files, replacing their microstructures, and drop deleted ones."""
+        if self.mode == "row":
+            raise ValueError("Incremental ingest requires the batched mode")
+        plan = manifest.plan(json_files, ms_id_from_path, force=force)
+        print(f"Manifest: {plan.summary()}")
+        if plan.removed:
+            self.remove_microstructures([ms_id for _, ms_id in plan.removed])
+            manifest.forget([path for path, _ in plan.removed])
+        if workers > 0:
+            from src.parallel_ingest import ingest_parallel
+            return ingest_parallel(self, plan.changed, workers=workers, replace=True,
+                                   on_written=manifest.commit, **parallel_options)
+        self.process_json_files(plan.changed, replace=True, on_written=manifest.commit)
+
+    def process_json_file_rowwise(self, json_file):
+        # Reference path: one round trip per node and relationship.
         with open(json_file, 'r') as f:
             data = json.load(f)
 
-        ms_id = "ms_" + str(int(json_file.split("/")[-1].split(".")[0].replace("param_img", "")))
+        ms_id = ms_id_from_path(json_file)
 
         include_gb = data.get("include_gb", False)
         slip_trace_flag = data.get("slip_trace", False)
@@ -134,11 +585,13 @@ class DislocationGraph:
                     )
 
                 pileups = data.get("pileup", {})
-                for pileup_id, pileup_data in pileups.items():
+                for pileup_key, pileup_data in pileups.items():
                     pileup_start_pos = pileup_data.get("start_pos", [9999, 9999])  # Default to high value if missing
-                    if not (pileup_start_pos[0] < 450 and pileup_start_pos[1] < 450):
+                    if not in_roi(pileup_start_pos, self.roi):
                         continue  # Skip this pileup
 
+                    pileup_id = pileup_node_id(ms_id, pileup_key)
+
                     print(f"Processing pileup {pileup_id}")
                     self.create_pileup(tx, pileup_id, pileup_data)
 
@@ -155,7 +608,7 @@ class DislocationGraph:
                     for dkey in sorted_keys:
                         ddata = dislocations[dkey]
                         d_start = ddata.get("start_pos", [9999, 9999])
-                        if not (d_start[0] < 450 and d_start[1] < 450):
+                        if not in_roi(d_start, self.roi):
                             continue  # Skip this dislocation
 
                         comp_id = self.create_dislocation(tx, pileup_id, dkey, ddata)
@@ -173,13 +626,83 @@ class DislocationGraph:
 
 
 if __name__ == "__main__":
-    uri = "neo4j://localhost:7687"
-    user = "neo4j"
-    password = "password"
-    
-    processor = DislocationGraph(uri, user, password)
+    parser = argparse.ArgumentParser(description="Load dislocation microstructure JSON files into Neo4j.")
+    parser.add_argument("pattern", nargs="?", default="sample_data/*.json")
+    parser.add_argument("--mode", choices=["batched", "row"], default="batched")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Parser processes; 0 keeps parsing and writing on a single session")
+    parser.add_argument("--writers", type=int, default=2, help="Concurrent writer sessions (with --workers)")
+    parser.add_argument("--queue-size", type=int, default=64, help="Parsed files buffered for the writers")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES)
+    parser.add_argument("--manifest", nargs="?", const=DEFAULT_MANIFEST, default=None,
+                        help="Only ingest new or changed files, tracked in this SQLite manifest")
+    parser.add_argument("--force", action="store_true", help="With --manifest, replace every file")
+    parser.add_argument("--geometry", default=None, metavar="DIR",
+                        help="Also write spline geometry to a memory-mapped store in DIR")
+    parser.add_argument("--no-features", dest="features", action="store_false",
+                        help="Skip spline parsing and the arc length/curvature/bounding box properties")
+    parser.add_argument("--roi", type=float, nargs=4, default=DEFAULT_ROI, metavar=("XMIN", "YMIN", "XMAX", "YMAX"),
+                        help="Keep pileups and dislocations starting inside this window")
+    parser.add_argument("--near-radius", type=float, default=None,
+                        help="Write NEAR {distance} relationships between dislocations of a microstructure")
+    parser.add_argument("--spatial", default=None, metavar="DIR",
+                        help="Persist a per-microstructure spatial index of dislocation positions in DIR")
+    parser.add_argument("--schema-snapshot", nargs="?", const=DEFAULT_SNAPSHOT, default=None, metavar="PATH",
+                        help="Export the graph schema after ingest so the query pipeline need not introspect it")
+    parser.add_argument("--export-csv", default=None, metavar="DIR",
+                        help="Write neo4j-admin import CSV files to DIR instead of writing to Neo4j")
+    parser.add_argument("--uri", default=os.environ.get("NEO4J_URI", "neo4j://localhost:7687"))
+    parser.add_argument("--user", default=os.environ.get("NEO4J_USERNAME", "neo4j"))
+    parser.add_argument("--password", default=os.environ.get("NEO4J_PASSWORD", "password"))
+    args = parser.parse_args()
+    if args.manifest and args.mode == "row":
+        parser.error("--manifest requires the batched mode")
+    if args.geometry and args.mode == "row":
+        parser.error("--geometry requires the batched mode")
+    if args.export_csv and (args.manifest or args.spatial or args.schema_snapshot or args.mode == "row"):
+        parser.error("--export-csv cannot be combined with --manifest, --spatial, --schema-snapshot or --mode row")
+
+    if args.export_csv:
+        from src.bulk_export import export_csv, IMPORT_SCRIPT, CONSTRAINTS_FILE
+        geometry = GeometryWriter(args.geometry) if args.geometry else None
+        try:
+            stats = export_csv(sorted(glob.glob(args.pattern)), args.export_csv, workers=args.workers,
+                               geometry=geometry, features=args.features, roi=args.roi,
+                               near_radius=args.near_radius)
+        finally:
+            if geometry is not None:
+                geometry.close()
+        print(stats.summary())
+        print(f"Import with {os.path.join(args.export_csv, IMPORT_SCRIPT)} while Neo4j is stopped, "
+              f"then run {CONSTRAINTS_FILE} (cypher-shell -f) once it is up.")
+        raise SystemExit(0)
+
+    processor = DislocationGraph(args.uri, args.user, args.password, batch_size=args.batch_size,
+                                 mode=args.mode, max_retries=args.max_retries, geometry_dir=args.geometry,
+                                 features=args.features, roi=args.roi, near_radius=args.near_radius,
+                                 spatial_dir=args.spatial, schema_snapshot=args.schema_snapshot)
+    files = sorted(glob.glob(args.pattern))
+    start = time.perf_counter()
     try:
-        for filepath in glob.glob("sample_data/*.json"):
-            processor.process_json_file(filepath)
+        processor.create_constraints()
+        if args.manifest:
+            manifest = IngestManifest(args.manifest)
+            try:
+                stats = processor.ingest_incremental(files, manifest, force=args.force, workers=args.workers,
+                                                     writers=args.writers, queue_size=args.queue_size)
+            finally:
+                manifest.close()
+            if stats:
+                print(stats.summary())
+        elif args.workers > 0 and args.mode == "batched":
+            from src.parallel_ingest import ingest_parallel
+            stats = ingest_parallel(processor, files, workers=args.workers, writers=args.writers,
+                                    queue_size=args.queue_size)
+            print(stats.summary())
+        else:
+            processor.process_json_files(files)
     finally:
-        processor.close()
\ No newline at end of file
+        processor.close()
+    elapsed = time.perf_counter() - start
+    print(f"Ingested {len(files)} files in {elapsed:.2f}s ({args.mode} mode)")
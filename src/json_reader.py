@@ -0,0 +1,105 @@
+import re
+import json
+
+import numpy as np
+
+# Per-dislocation spline coordinates; about 95% of every param_img*.json by size.
+SPLINE_KEYS = ("x", "y", "xglobal", "yglobal")
+CHUNK_SIZE = 1 << 16
+# Characters held back between chunks so a key split across two reads is still recognised.
+_TAIL = 64
+_BRACKET = re.compile(r"[\[\]]")
+
+
+def _key_pattern(keys):
+    return re.compile(r'"(?:%s)"\s*:\s*\[' % "|".join(re.escape(k) for k in keys))
+
+
+def _parse_array(text):
+    if not text.strip():
+        return np.empty(0)
+    if "[" in text:
+        # Nested lists are rare enough to leave to the json module.
+        return np.asarray(json.loads("[" + text + "]"), dtype=float)
+    return np.fromstring(text, dtype=float, sep=",")
+
+
+def iter_stripped(f, skip_keys=SPLINE_KEYS, chunk_size=CHUNK_SIZE, captured=None):
+    """Yield the text of a JSON document with the array values of ``skip_keys`` replaced by null.
+
+    The file is read in chunks and skipped arrays are only scanned for their closing
+    bracket, so their numbers are never parsed into Python objects. When ``captured``
+    is a list, each array is instead parsed straight into a float64 NumPy array,
+    appended to it, and replaced by its index in that list.
+    """
+    pattern = _key_pattern(skip_keys)
+    buf = ""
+    depth = 0
+    array_text = []
+    while True:
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf += chunk
+        pos = 0
+        while True:
+            if depth:
+                start = pos
+                while depth:
+                    m = _BRACKET.search(buf, pos)
+                    if m is None:
+                        pos = len(buf)
+                        break
+                    depth += 1 if m.group() == "[" else -1
+                    pos = m.end()
+                if captured is not None:
+                    array_text.append(buf[start:pos] if depth else buf[start:pos - 1])
+                if depth:
+                    break
+                if captured is not None:
+                    yield str(len(captured))
+                    captured.append(_parse_array("".join(array_text)))
+                    array_text = []
+            m = pattern.search(buf, pos)
+            if m is None:
+                keep = len(buf) if eof else max(pos, len(buf) - _TAIL)
+                yield buf[pos:keep]
+                pos = keep
+                break
+            yield buf[pos:m.end() - 1] if captured is not None else buf[pos:m.end() - 1] + "null"
+            pos = m.end()
+            depth = 1
+        buf = buf[pos:]
+        if eof:
+            break
+    if depth:
+        raise ValueError("Unterminated array in JSON document")
+
+
+def _attach(node, keys, captured):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in keys and isinstance(value, int) and not isinstance(value, bool):
+                node[key] = captured[value]
+            else:
+                _attach(value, keys, captured)
+    elif isinstance(node, list):
+        for value in node:
+            _attach(value, keys, captured)
+
+
+def read_microstructure(json_file, skip_keys=SPLINE_KEYS, arrays=False):
+    """Load a param_img*.json file without materialising its spline coordinate arrays.
+
+    With ``arrays=True`` the ``skip_keys`` arrays are kept, but as NumPy arrays parsed
+    directly from the text instead of Python lists of floats (with identical values).
+    """
+    if not skip_keys:
+        with open(json_file, 'r') as f:
+            return json.load(f)
+    with open(json_file, 'r') as f:
+        if not arrays:
+            return json.loads("".join(iter_stripped(f, skip_keys)))
+        captured = []
+        data = json.loads("".join(iter_stripped(f, skip_keys, captured=captured)))
+    _attach(data, set(skip_keys), captured)
+    return data
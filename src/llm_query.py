@@ -1,6 +1,8 @@
 
 
-from functools import partial
+import os
+import threading
+from functools import partial, lru_cache
 from typing import Literal
 from typing import Annotated, List
 from typing_extensions import TypedDict
@@ -10,11 +12,17 @@ from langchain_core.output_parsers import StrOutputParser
 from langgraph.graph import END, START, StateGraph
 from langchain_openai import ChatOpenAI
 
-from src.config import get_graph, get_llm, logger
-from src.agent_nodes.guardrails import guardrails, InputState, OverallState
-from src.agent_nodes.cypher_generator import generate_cypher
-from src.agent_nodes.cypher_validator import validate_cypher, correct_cypher
-from src.executor import execute_cypher, generate_final_answer
+from src.config import (get_graph, get_async_graph, get_llm, get_semantic_cache, get_result_cache,
+                        get_version_watcher, get_schema_service, get_result_compactor, get_cost_guard, get_correction_cache, get_tracer, logger)
+from src.agent_nodes.guardrails import guardrails, aguardrails, start_request, InputState, OverallState
+from src.agent_nodes.cypher_generator import generate_cypher, agenerate_cypher, get_example_selector
+from src.agent_nodes.cypher_validator import (validate_cypher, avalidate_cypher, correct_cypher, acorrect_cypher,
+                                              VALIDATION_MODES, DEFAULT_MAX_CORRECTIONS)
+from src.executor import execute_cypher, aexecute_cypher, generate_final_answer, agenerate_final_answer
+from src.semantic_cache import lookup_cypher_cache, store_cypher_cache
+from src.question_templates import TemplateEngine, answer_from_template
+from src.speculation import Speculator, SPECULATION_MODES
+from src.tracing import TracedPipeline, traced, start_metrics_server
 
 
 
@@ -36,6 +44,27 @@ def validate_cypher_condition(state: OverallState
         return "execute_cypher"
 
 
+def template_condition(state: OverallState
+) -> Literal["guardrails", "__end__"]:
+    if state.get("next_action") == "end":
+        return END
+    return "guardrails"
+
+
+def speculation_condition(state: OverallState
+) -> Literal["generate_final_answer", "validate_cypher", "correct_cypher", "execute_cypher"]:
+    if state.get("next_action") in ("validate_cypher", "correct_cypher", "execute_cypher"):
+        return state.get("next_action")
+    return "generate_final_answer"
+
+
+def cypher_cache_condition(state: OverallState
+) -> Literal["generate_cypher", "execute_cypher"]:
+    if state.get("next_action") == "execute_cypher":
+        return "execute_cypher"
+    return "generate_cypher"
+
+
 class OutputState(TypedDict):
     answer: str
     steps: List[str]
@@ -43,30 +72,146 @@ class OutputState(TypedDict):
 
 
 
-def build_pipeline() -> StateGraph:
+def build_pipeline(semantic_cache=None, result_cache=None, templates=None, speculation=None,
+                   asynchronous=False, tracing=None) -> StateGraph:
+    """Compile the pipeline; with ``asynchronous`` the LLM and Neo4j nodes are coroutines for ``ainvoke``."""
     llm = get_llm()
     graph = get_graph()
+    if semantic_cache is None:
+        semantic_cache = os.environ.get("SEMANTIC_CACHE", "1") != "0"
+    cypher_cache = get_semantic_cache() if semantic_cache else None
+    if result_cache is None:
+        result_cache = os.environ.get("RESULT_CACHE", "1") != "0"
+    results = get_result_cache() if result_cache else None
+    compactor = get_result_compactor() if os.environ.get("RESULT_COMPACTION", "1") != "0" else None
+    guard = get_cost_guard() if os.environ.get("COST_GUARD", "1") != "0" else None
+    if tracing is None:
+        tracing = os.environ.get("TRACING", "1") != "0"
+    tracer = get_tracer() if tracing else None
+    # One watcher drives both the schema snapshot and the result cache invalidation.
+    version_watcher = get_version_watcher(graph)
+    schema = get_schema_service(graph, version_watcher)
+    if templates is None:
+        templates = os.environ.get("QUESTION_TEMPLATES", "1") != "0"
+    if speculation is None:
+        speculation = os.environ.get("SPECULATION", "off")
+    if speculation not in SPECULATION_MODES:
+        raise ValueError(f"Unknown SPECULATION {speculation!r}, expected one of {SPECULATION_MODES}")
+    validation_mode = os.environ.get("CYPHER_VALIDATION", "local")
+    if validation_mode not in VALIDATION_MODES:
+        raise ValueError(f"Unknown CYPHER_VALIDATION {validation_mode!r}, expected one of {VALIDATION_MODES}")
+    # The validate/correct loop gives up after MAX_CORRECTIONS rounds, or once the request has run for
+    # CORRECTION_DEADLINE seconds.
+    max_corrections = int(os.environ.get("MAX_CORRECTIONS", str(DEFAULT_MAX_CORRECTIONS)))
+    correction_deadline = float(os.environ.get("CORRECTION_DEADLINE", "30")) or None
+    corrections = get_correction_cache() if os.environ.get("CORRECTION_CACHE", "1") != "0" else None
     
     logger.info(f"Setting langgraph.....")
     langgraph = StateGraph(OverallState, input=InputState, output=OutputState)
+
+    def add_node(name, node):
+        # Every node records its wall time, LLM tokens, queries and cache hits on the request trace.
+        langgraph.add_node(name, traced(name, node) if tracer is not None else node)
+
     # Build a state graph (pipeline) instance.
-    langgraph.add_node("guardrails", partial(guardrails, llm=llm))
-    langgraph.add_node("generate_cypher", partial(generate_cypher, llm=llm, graph=graph))
-    langgraph.add_node("validate_cypher", partial(validate_cypher, llm=llm, graph=graph))
-    langgraph.add_node("correct_cypher", partial(correct_cypher, llm=llm, graph=graph))
-    langgraph.add_node("execute_cypher", partial(execute_cypher, graph=graph))
-    langgraph.add_node("generate_final_answer", partial(generate_final_answer, llm=llm, graph=graph))
+    if asynchronous:
+        # Cache, template and snapshot nodes stay synchronous; LangGraph runs them in threads.
+        query_graph = get_async_graph()
+        nodes = (aguardrails, agenerate_cypher, avalidate_cypher, acorrect_cypher, aexecute_cypher,
+                 agenerate_final_answer)
+    else:
+        query_graph = graph
+        nodes = (guardrails, generate_cypher, validate_cypher, correct_cypher, execute_cypher,
+                 generate_final_answer)
+    guardrails_fn, generate_fn, validate_fn, correct_fn, execute_fn, answer_fn = nodes
+    guardrails_node = partial(guardrails_fn, llm=llm)
+    generate_node = partial(generate_fn, llm=llm, schema=schema)
+    validate_node = partial(validate_fn, llm=llm, graph=query_graph, schema=schema, mode=validation_mode,
+                            guard=guard, max_corrections=max_corrections, deadline=correction_deadline,
+                            corrections=corrections)
+    add_node("generate_cypher", generate_node)
+    add_node("validate_cypher", validate_node)
+    add_node("correct_cypher", partial(correct_fn, llm=llm, schema=schema, corrections=corrections))
+    add_node("execute_cypher", partial(execute_fn, graph=query_graph, result_cache=results,
+                                       version_watcher=version_watcher, guard=guard))
+    add_node("generate_final_answer", partial(answer_fn, llm=llm, schema=schema, compactor=compactor))
 
     
-    langgraph.add_edge(START, "guardrails")
-    langgraph.add_conditional_edges("guardrails", guardrails_condition)
+    # Stamps the request start, so the correction deadline counts from here.
+    langgraph.add_node("start_request", start_request)
+    langgraph.add_edge(START, "start_request")
+    if templates:
+        # Common question shapes are answered from pre-validated Cypher without any LLM call.
+        add_node("match_template", partial(answer_from_template, engine=TemplateEngine(), graph=graph,
+                                           schema=schema, result_cache=results,
+                                           version_watcher=version_watcher))
+        langgraph.add_edge("start_request", "match_template")
+        langgraph.add_conditional_edges("match_template", template_condition)
+    else:
+        langgraph.add_edge("start_request", "guardrails")
     langgraph.add_edge("generate_cypher", "validate_cypher")
-    langgraph.add_conditional_edges("validate_cypher", validate_cypher_condition)
+    if speculation != "off":
+        # Cypher is generated (and validated) while the guardrail runs; the guardrail node
+        # returns the speculative results, or discards them when the question is off topic.
+        speculator = Speculator(
+            guardrails_node,
+            generate_node,
+            lookup=partial(lookup_cypher_cache, cache=cypher_cache, schema=schema) if cypher_cache else None,
+            validate=validate_node if speculation == "validate" else None,
+            store=partial(store_cypher_cache, cache=cypher_cache) if cypher_cache else None,
+        )
+        add_node("guardrails", speculator.arun if asynchronous else speculator)
+        if tracer is not None:
+            tracer.watch("speculation", speculator.snapshot)
+        langgraph.add_conditional_edges("guardrails", speculation_condition)
+    elif cypher_cache is None:
+        add_node("guardrails", guardrails_node)
+        langgraph.add_conditional_edges("guardrails", guardrails_condition)
+    else:
+        # Near-duplicate questions reuse validated Cypher and skip generation and validation.
+        add_node("guardrails", guardrails_node)
+        add_node("lookup_cypher_cache", partial(lookup_cypher_cache, cache=cypher_cache, schema=schema))
+        langgraph.add_conditional_edges("guardrails", guardrails_condition, {
+            "generate_cypher": "lookup_cypher_cache",
+            "generate_final_answer": "generate_final_answer",
+        })
+        langgraph.add_conditional_edges("lookup_cypher_cache", cypher_cache_condition)
+    if cypher_cache is None:
+        langgraph.add_conditional_edges("validate_cypher", validate_cypher_condition)
+    else:
+        add_node("store_cypher_cache", partial(store_cypher_cache, cache=cypher_cache))
+        langgraph.add_conditional_edges("validate_cypher", validate_cypher_condition, {
+            "execute_cypher": "store_cypher_cache",
+            "correct_cypher": "correct_cypher",
+            "generate_final_answer": "generate_final_answer",
+        })
+        langgraph.add_edge("store_cypher_cache", "execute_cypher")
     langgraph.add_edge("execute_cypher", "generate_final_answer")
     langgraph.add_edge("correct_cypher", "validate_cypher")
     langgraph.add_edge("generate_final_answer", END)
+    if tracer is not None:
+        return TracedPipeline(langgraph.compile(), tracer)
     return langgraph.compile()
 
+_shared_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def _shared_pipeline():
+    pipeline = build_pipeline()
+    # Load the few-shot index now rather than in the first question.
+    get_example_selector()
+    if os.environ.get("METRICS_PORT"):
+        start_metrics_server(get_tracer(), int(os.environ["METRICS_PORT"]))
+    return pipeline
+
+def get_pipeline():
+    """The compiled pipeline shared by every session of this process, built on first use.
+
+    It holds no per-session state: everything a question needs is passed in its input.
+    """
+    with _shared_lock:
+        return _shared_pipeline()
+
 if __name__ == "__main__":
     pipeline = build_pipeline()
     # Example usage; you can change the question
@@ -0,0 +1,90 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+DEFAULT_MANIFEST = ".ingest_manifest.sqlite"
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@dataclass
+class IngestPlan:
+    changed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    # (path, ms_id) of files recorded earlier that no longer exist on disk.
+    removed: List[Tuple[str, str]] = field(default_factory=list)
+
+    def summary(self):
+        return f"{len(self.changed)} new/changed, {len(self.unchanged)} unchanged, {len(self.removed)} removed"
+
+
+class IngestManifest:
+    """SQLite record of which source file produced which microstructure, and its content hash."""
+
+    def __init__(self, path=DEFAULT_MANIFEST):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " ms_id TEXT NOT NULL,"
+            " sha256 TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime REAL NOT NULL,"
+            " ingested_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+        # Digests computed by plan() and written once the graph transaction has committed.
+        self._pending: Dict[str, tuple] = {}
+
+    def close(self):
+        self.conn.close()
+
+    def plan(self, json_files, ms_id_for, force=False):
+        plan = IngestPlan()
+        known = {row[0]: row[1:] for row in self.conn.execute("SELECT path, ms_id, sha256, size, mtime FROM files")}
+        for path in json_files:
+            key = os.path.abspath(path)
+            stat = os.stat(path)
+            previous = known.get(key)
+            if previous and not force and previous[2] == stat.st_size and previous[3] == stat.st_mtime:
+                plan.unchanged.append(path)
+                continue
+            digest = file_digest(path)
+            self._pending[path] = (key, ms_id_for(path), digest, stat.st_size, stat.st_mtime)
+            if previous and not force and previous[1] == digest:
+                # Touched but identical; only the stat fields need refreshing.
+                plan.unchanged.append(path)
+                self.commit([path])
+            else:
+                plan.changed.append(path)
+        for key, (ms_id, *_rest) in known.items():
+            if not os.path.exists(key):
+                plan.removed.append((key, ms_id))
+        return plan
+
+    def commit(self, json_files):
+        with self.lock:
+            now = time.time()
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (path, ms_id, sha256, size, mtime, ingested_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [self._pending.pop(path) + (now,) for path in json_files if path in self._pending],
+            )
+            self.conn.commit()
+
+    def forget(self, paths):
+        with self.lock:
+            self.conn.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in paths])
+            self.conn.commit()
@@ -0,0 +1,207 @@
+import re
+import json
+import time
+import asyncio
+import hashlib
+from functools import lru_cache
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from src.result_cache import normalize_cypher
+
+# Stand-ins for OpenAI and Neo4j that replay a question corpus, for benchmarks and offline runs.
+# A corpus is a JSON object with the graph "schema" (structured, as Neo4jGraph builds it), the
+# "questions" ({"question", "cypher", "rows"} or {"question", "off_topic": true}) and extra
+# recorded "queries" ({"cypher", "params", "rows"}), e.g. the ones the question templates run.
+
+FALLBACK_CYPHER = "MATCH (m:Microstructure) RETURN count(m) AS count"
+_WORD = re.compile(r"\w+")
+_FINAL_LIMIT = re.compile(r"\s+LIMIT\s+\d+\s*;?\s*$", re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
+def load_corpus(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _between(text, start, end):
+    head, _, tail = text.partition(start)
+    return tail.split(end)[0].strip() if tail else ""
+
+
+def _tokens(text):
+    return max(1, len(text) // 4)
+
+
+class OfflineChatModel(BaseChatModel):
+    """Deterministic chat model: Cypher comes from the corpus, every call takes ``latency`` seconds.
+
+    Structured output goes through the model as JSON, so token usage is reported for every call.
+    """
+
+    cypher: Dict[str, str] = {}
+    off_topic: List[str] = []
+    latency: float = 0.0
+
+    @classmethod
+    def from_corpus(cls, corpus, latency=0.0, **kwargs):
+        questions = corpus.get("questions", [])
+        return cls(
+            cypher={q["question"]: q["cypher"] for q in questions if q.get("cypher")},
+            off_topic=[q["question"] for q in questions if q.get("off_topic")],
+            latency=latency,
+            **kwargs,
+        )
+
+    @property
+    def _llm_type(self):
+        return "offline"
+
+    def _reply(self, messages):
+        system = " ".join(m.content for m in messages if m.type == "system")
+        text = messages[-1].content
+        if "related to microstructure" in system:
+            return json.dumps({"decision": "end" if text.strip() in self.off_topic else "microstructure"})
+        if "Cypher query:" in text:
+            return self.cypher.get(_between(text, "User input:", "\nCypher query:"), FALLBACK_CYPHER)
+        if "Corrected Cypher statement:" in text:
+            return _between(text, "The Cypher statement is:", "\n\nThe errors are:") or FALLBACK_CYPHER
+        if "You must check the following" in text:
+            return json.dumps({"errors": [], "filters": []})
+        question = _between(text, "QUESTION:", "\n")
+        results = _between(text, "RESULTS:", "\n\nFor the above question")
+        return f"For the question \"{question}\" the database returned: {results[:400]}"
+
+    def _usage(self, messages, content):
+        prompt = sum(_tokens(m.content) for m in messages)
+        return {"input_tokens": prompt, "output_tokens": _tokens(content), "total_tokens": prompt + _tokens(content)}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        content = self._reply(messages)
+        message = AIMessage(content=content, usage_metadata=self._usage(messages, content))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        content = self._reply(messages)
+        message = AIMessage(content=content, usage_metadata=self._usage(messages, content))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, messages):
+        content = self._reply(messages)
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=word if last else word + " ",
+                usage_metadata=self._usage(messages, content) if last else None,
+            ))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        # The whole latency is spent before the first token, as with a real model under load.
+        time.sleep(self.latency)
+        for chunk in self._chunks(messages):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(messages):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema, **kwargs):
+        return self | RunnableLambda(lambda message: schema(**json.loads(message.content)))
+
+
+class OfflineEmbeddings(Embeddings):
+    """Bag-of-words hashing vectors: texts sharing words are similar, identical texts are equal."""
+
+    model = "offline"
+
+    def __init__(self, dimensions=256, latency=0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+
+    def _vector(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            vector[int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return self._vector(text)
+
+
+def _params_key(params):
+    return json.dumps(params or {}, sort_keys=True, default=str)
+
+
+class LocalGraph:
+    """Replays the recorded rows of a corpus in place of Neo4j, for both the sync and async nodes.
+
+    Statements that were not recorded return no rows and are counted in ``misses``.
+    """
+
+    def __init__(self, corpus, latency=0.0, version=1):
+        self.structured_schema = corpus["schema"]
+        self.latency = latency
+        self.version = version
+        self.timeout = None
+        self.misses = 0
+        self.recorded = {}
+        for entry in corpus.get("questions", []) + corpus.get("queries", []):
+            if entry.get("cypher") and "rows" in entry:
+                self.recorded[(normalize_cypher(entry["cypher"]), _params_key(entry.get("params")))] = entry["rows"]
+
+    def refresh_schema(self):
+        pass
+
+    def _replay(self, cypher, params):
+        if "_GraphMeta" in cypher:
+            return [{"version": self.version}]
+        for text in (cypher, _FINAL_LIMIT.sub("", cypher)):
+            rows = self.recorded.get((normalize_cypher(text), _params_key(params)))
+            if rows is not None:
+                return rows
+        self.misses += 1
+        return []
+
+    def _plan(self, cypher, params):
+        rows = self.recorded.get((normalize_cypher(cypher), _params_key(params)), [])
+        return {"operatorType": "ProduceResults@offline", "args": {"EstimatedRows": float(len(rows))}}
+
+    def query(self, query, params=None):
+        time.sleep(self.latency)
+        return self._replay(query, params)
+
+    def explain(self, cypher, params=None):
+        time.sleep(self.latency)
+        return self._plan(cypher, params)
+
+    async def aquery(self, query, params=None):
+        await asyncio.sleep(self.latency)
+        return self._replay(query, params)
+
+    async def aexplain(self, cypher, params=None):
+        await asyncio.sleep(self.latency)
+        return self._plan(cypher, params)
+
+    async def close(self):
+        pass
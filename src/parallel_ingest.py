@@ -0,0 +1,126 @@
+import time
+import queue
+import threading
+from functools import partial
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from src.inject import GraphRows, load_rows
+
+_DONE = object()
+
+
+@dataclass
+class IngestStats:
+    files: int = 0
+    nodes: int = 0
+    rows: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def files_per_second(self):
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def nodes_per_second(self):
+        return self.nodes / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f"{self.files} files, {self.nodes} nodes in {self.elapsed:.2f}s "
+                f"({self.files_per_second:.1f} files/s, {self.nodes_per_second:.0f} nodes/s, "
+                f"{self.retries} retries)")
+
+
+def parse_file(json_file, **load_options):
+    # Runs in a worker process; GraphRows pickles as plain lists of dicts (and NumPy arrays).
+    return json_file, load_rows(json_file, **load_options)
+
+
+class _Writer(threading.Thread):
+    def __init__(self, processor, work, stats, lock, replace=False, on_written=None):
+        super().__init__(daemon=True)
+        self.processor = processor
+        self.work = work
+        self.stats = stats
+        self.lock = lock
+        self.replace = replace
+        self.on_written = on_written
+        self.error = None
+
+    def run(self):
+        pending, pending_files = GraphRows(), []
+        done = False
+        try:
+            with self.processor.driver.session() as session:
+                while True:
+                    item = self.work.get()
+                    if item is _DONE:
+                        done = True
+                        break
+                    json_file, rows = item
+                    pending.extend(rows)
+                    pending_files.append(json_file)
+                    if len(pending) >= self.processor.batch_size:
+                        self._flush(session, pending, pending_files)
+                        pending, pending_files = GraphRows(), []
+                self._flush(session, pending, pending_files)
+        except Exception as e:
+            self.error = e
+            # Keep draining so the producer never blocks on a dead writer; once this writer has
+            # its _DONE, the rest belong to the other writers.
+            while not done:
+                done = self.work.get() is _DONE
+
+    def _flush(self, session, rows, json_files):
+        if not json_files:
+            return
+        retries = self.processor.flush(rows, session=session, replace=self.replace)
+        if self.on_written:
+            self.on_written(json_files)
+        with self.lock:
+            self.stats.files += len(json_files)
+            self.stats.nodes += rows.node_count()
+            self.stats.rows += len(rows)
+            self.stats.retries += retries
+
+
+def ingest_parallel(processor, json_files, workers=4, writers=2, queue_size=64, replace=False, on_written=None):
+    """Parse files in a process pool and write them through ``writers`` sessions on one driver."""
+    stats = IngestStats()
+    lock = threading.Lock()
+    work = queue.Queue(maxsize=queue_size)
+    writer_threads = [_Writer(processor, work, stats, lock, replace, on_written) for _ in range(writers)]
+    start = time.perf_counter()
+    for writer in writer_threads:
+        writer.start()
+
+    parse = partial(parse_file, **processor.load_options)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            files = iter(json_files)
+            in_flight = set()
+            # Only a bounded number of parsed files may wait for a writer at any time.
+            for json_file in files:
+                in_flight.add(pool.submit(parse, json_file))
+                if len(in_flight) >= workers * 2:
+                    break
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    work.put(future.result())
+                    next_file = next(files, None)
+                    if next_file is not None:
+                        in_flight.add(pool.submit(parse, next_file))
+    finally:
+        for _ in writer_threads:
+            work.put(_DONE)
+        for writer in writer_threads:
+            writer.join()
+        stats.elapsed = time.perf_counter() - start
+
+    for writer in writer_threads:
+        if writer.error is not None:
+            raise writer.error
+    processor.bump_graph_version()
+    return stats
@@ -0,0 +1,334 @@
+import re
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.cypher_analysis import analyse_cypher
+from src.executor import run_query, no_results
+
+_FILLER = re.compile(
+    r"^(?:please |can you |could you )?"
+    r"(?:find|what is|what's|what are|tell me|give me|show me|show|get|list|compute|calculate)?\s*(?:the )?"
+)
+_MS = r"(?:microstructure )?(?:with )?(?:id )?ms[_ ]?(?P<{}>\d+)"
+_MAX = ("highest", "maximum", "max", "largest", "most", "biggest", "greatest")
+_MIN = ("lowest", "minimum", "min", "smallest", "fewest", "least")
+_AGG = "(?P<agg>%s)" % "|".join(_MAX + _MIN)
+_CHILD = r"(?P<child>pileups?|dislocations?)"
+_PARENT = r"(?P<parent>microstructures?|pileups?)"
+_OPS = {
+    "greater than or equal to": ">=", "at least": ">=", ">=": ">=",
+    "less than or equal to": "<=", "at most": "<=", "<=": "<=",
+    "greater than": ">", "more than": ">", "larger than": ">", "higher than": ">", "above": ">", "over": ">", ">": ">",
+    "less than": "<", "smaller than": "<", "lower than": "<", "below": "<", "under": "<", "<": "<",
+}
+_OP = "(?P<op>%s)" % "|".join(re.escape(op) for op in sorted(_OPS, key=len, reverse=True))
+
+# Counting children per parent; pileups without dislocations and microstructures without
+# pileups count as zero.
+_PER_PARENT = {
+    ("pileup", "microstructure"):
+        "MATCH (m:Microstructure) OPTIONAL MATCH (m)-[:HAS_PILEUP]->(p:Pileup) WITH m AS parent, count(p) AS n",
+    ("dislocation", "microstructure"):
+        "MATCH (m:Microstructure) OPTIONAL MATCH (m)-[:HAS_PILEUP]->(:Pileup)-[:CONTAINS]->(d:Dislocation) "
+        "WITH m AS parent, count(d) AS n",
+    ("dislocation", "pileup"):
+        "MATCH (p:Pileup) OPTIONAL MATCH (p)-[:CONTAINS]->(d:Dislocation) WITH p AS parent, count(d) AS n",
+}
+
+
+def normalize_question(question):
+    q = re.sub(r"\s+", " ", (question or "").lower()).strip()
+    q = re.sub(r"[?!.\s]+$", "", q)
+    q = re.sub(r"[,;:]", " ", q)
+    q = re.sub(r"\s+", " ", q).strip()
+    return _FILLER.sub("", q, count=1).strip()
+
+
+def _singular(word):
+    return word[:-1] if word.endswith("s") else word
+
+
+def _plural(word, n=2):
+    return word if n == 1 else word + "s"
+
+
+def _ms_id(slots):
+    for key in ("ms", "ms2", "ms3"):
+        if slots.get(key):
+            return f"ms_{int(slots[key])}"
+    return None
+
+
+@dataclass
+class QuestionTemplate:
+    """Questions matching one of ``patterns`` are answered by one of the ``cypher`` variants.
+
+    ``build`` maps the regex slots to (variant, parameters), or None to fall through;
+    ``answer`` formats the records of the variant into the reply.
+    """
+
+    name: str
+    patterns: List[str]
+    cypher: Dict[str, str]
+    build: Callable[[dict], Optional[Tuple[str, dict]]]
+    answer: Callable[[dict, List[dict]], str]
+
+    def __post_init__(self):
+        self.compiled = [re.compile("^" + p + "$") for p in self.patterns]
+
+
+@dataclass
+class TemplateMatch:
+    template: QuestionTemplate
+    slots: dict
+    cypher: str
+    params: dict
+
+    def answer(self, records):
+        return self.template.answer(self.slots, records)
+
+
+def _count_all(slots):
+    return (_singular(slots["what"]), {})
+
+
+def _count_in_ms(slots):
+    return (_singular(slots["what"]), {"ms_id": _ms_id(slots)})
+
+
+def _per_parent(slots):
+    key = (_singular(slots["child"]), _singular(slots["parent"]))
+    if key not in _PER_PARENT:
+        return None
+    order = "desc" if slots.get("agg", "highest") in _MAX else "asc"
+    return (f"{key[0]}/{key[1]}/{order}", {})
+
+
+def _average(slots):
+    key = (_singular(slots["child"]), _singular(slots["parent"]))
+    return ("/".join(key), {}) if key in _PER_PARENT else None
+
+
+def _direction(slots):
+    return (_OPS[slots["op"]], {"threshold": float(slots["threshold"]), "ms_id": _ms_id(slots)})
+
+
+def _lookup(slots):
+    return ("lookup", {"ms_id": _ms_id(slots)})
+
+
+def _answer_count_all(slots, records):
+    n = records[0]["count"]
+    return f"There {'is' if n == 1 else 'are'} {n} {_plural(_singular(slots['what']), n)} in the dataset."
+
+
+def _answer_count_in_ms(slots, records):
+    n = records[0]["count"]
+    return f"Microstructure {_ms_id(slots)} has {n} {_plural(_singular(slots['what']), n)}."
+
+
+def _answer_extreme(slots, records):
+    if not records:
+        return no_results
+    child, parent = _singular(slots["child"]), _singular(slots["parent"])
+    n, ids = records[0]["count"], [r["id"] for r in records if r["count"] == records[0]["count"]]
+    which = "highest" if slots["agg"] in _MAX else "lowest"
+    return (f"The {which} number of {_plural(child)} in a {parent} is {n}, "
+            f"found in {parent} {', '.join(str(i) for i in ids)}.")
+
+
+def _answer_average(slots, records):
+    child, parent = _singular(slots["child"]), _singular(slots["parent"])
+    value = records[0]["value"]
+    if value is None:
+        return no_results
+    return f"On average a {parent} has {value:.2f} {_plural(child)}."
+
+
+def _answer_distribution(slots, records):
+    if not records:
+        return no_results
+    child, parent = _singular(slots["child"]), _singular(slots["parent"])
+    lines = [f"- {r['count']} {_plural(child, r['count'])}: {r['frequency']} {_plural(parent, r['frequency'])}"
+             for r in records]
+    return f"Number of {_plural(child)} per {parent}:\n" + "\n".join(lines)
+
+
+def _answer_direction(slots, records, limit=20):
+    where = f" in microstructure {_ms_id(slots)}" if _ms_id(slots) else ""
+    n = len(records)
+    head = f"{n} {_plural('pileup', n)}{where} {'has' if n == 1 else 'have'} a direction {slots['op']} {slots['threshold']}"
+    if not records:
+        return head + "."
+    lines = [f"- {r['pileup']} ({r['microstructure']}): {r['direction']:.4f}" for r in records[:limit]]
+    if len(records) > limit:
+        lines.append(f"- ... and {len(records) - limit} more")
+    return head + ":\n" + "\n".join(lines)
+
+
+def _answer_lookup(slots, records):
+    if not records:
+        return f"Microstructure {_ms_id(slots)} is not in the dataset."
+    r = records[0]
+    return (f"Microstructure {r['id']} has {r['pileups']} {_plural('pileup', r['pileups'])} "
+            f"with {r['dislocations']} {_plural('dislocation', r['dislocations'])} in total.")
+
+
+TEMPLATES = [
+    QuestionTemplate(
+        name="count_all",
+        patterns=[
+            r"how many (?:dislocation )?(?P<what>microstructures?|pileups?|dislocations?)"
+            r"(?: are there| do we have| we have| are| exist| in total)*(?: in the (?:dataset|database|graph))?",
+            r"(?:total )?number of (?P<what>microstructures?|pileups?|dislocations?)(?: in the (?:dataset|database|graph))?",
+        ],
+        cypher={
+            "microstructure": "MATCH (m:Microstructure) RETURN count(m) AS count",
+            "pileup": "MATCH (p:Pileup) RETURN count(p) AS count",
+            "dislocation": "MATCH (d:Dislocation) RETURN count(d) AS count",
+        },
+        build=_count_all,
+        answer=_answer_count_all,
+    ),
+    QuestionTemplate(
+        name="count_in_microstructure",
+        patterns=[
+            r"how many (?P<what>pileups?|dislocations?) (?:are there |are )?(?:in|does|do|of) %s(?: have| contain)?"
+            % _MS.format("ms"),
+            r"number of (?P<what>pileups?|dislocations?) (?:in|of) %s" % _MS.format("ms"),
+        ],
+        cypher={
+            "pileup": "MATCH (m:Microstructure {id: $ms_id})-[:HAS_PILEUP]->(p:Pileup) RETURN count(p) AS count",
+            "dislocation": "MATCH (m:Microstructure {id: $ms_id})-[:HAS_PILEUP]->(:Pileup)-[:CONTAINS]->(d:Dislocation) "
+                           "RETURN count(d) AS count",
+        },
+        build=_count_in_ms,
+        answer=_answer_count_in_ms,
+    ),
+    QuestionTemplate(
+        name="extreme_per_parent",
+        patterns=[
+            r"%s number of %s (?:in|per|of) (?:a |any |one |each )?%s" % (_AGG, _CHILD, _PARENT),
+            r"(?:which )?%s (?:with|has|having|contains) the %s (?:number of )?%s"
+            r"(?: and how many (?:\w+ )*(?:does it|do they) (?:contain|have))?" % (_PARENT, _AGG, _CHILD),
+        ],
+        cypher={
+            f"{child}/{parent}/{order}": f"{head} RETURN parent.id AS id, n AS count ORDER BY n {order.upper()} LIMIT 10"
+            for (child, parent), head in _PER_PARENT.items() for order in ("asc", "desc")
+        },
+        build=_per_parent,
+        answer=_answer_extreme,
+    ),
+    QuestionTemplate(
+        name="average_per_parent",
+        patterns=[r"(?:average|mean|avg) number of %s (?:in|per) (?:a |each |one )?%s" % (_CHILD, _PARENT)],
+        cypher={"/".join(key): f"{head} RETURN avg(n) AS value" for key, head in _PER_PARENT.items()},
+        build=_average,
+        answer=_answer_average,
+    ),
+    QuestionTemplate(
+        name="distribution_per_parent",
+        patterns=[r"distribution of (?:the )?number of %s (?:in|per) (?:a |each )?%s" % (_CHILD, _PARENT)],
+        cypher={"/".join(key): f"{head} RETURN n AS count, count(*) AS frequency ORDER BY n"
+                for key, head in _PER_PARENT.items()},
+        build=_average,
+        answer=_answer_distribution,
+    ),
+    QuestionTemplate(
+        name="pileup_direction",
+        patterns=[
+            r"(?:for %s )?(?:find |list |show |which )?(?:all )?(?:the )?pileups? (?:(?:in|of) %s )?"
+            r"(?:with|having|whose|where|that have) (?:a |the )?direction (?:is )?%s (?P<threshold>-?\d+(?:\.\d+)?)"
+            r"(?: radians?| rad)?(?: (?:in|of|for) %s)?"
+            % (_MS.format("ms"), _MS.format("ms2"), _OP, _MS.format("ms3")),
+        ],
+        cypher={
+            op: "MATCH (m:Microstructure)-[:HAS_PILEUP]->(p:Pileup) "
+                f"WHERE ($ms_id IS NULL OR m.id = $ms_id) AND p.direction {op} $threshold "
+                "RETURN m.id AS microstructure, p.id AS pileup, p.direction AS direction ORDER BY p.direction DESC"
+            for op in (">", ">=", "<", "<=")
+        },
+        build=_direction,
+        answer=_answer_direction,
+    ),
+    QuestionTemplate(
+        name="microstructure_lookup",
+        patterns=[
+            r"(?:details|description|summary|information|info|overview)(?: of| for| about| on)? %s" % _MS.format("ms"),
+            r"(?:describe|summari[sz]e|about) %s" % _MS.format("ms"),
+        ],
+        cypher={
+            "lookup": "MATCH (m:Microstructure {id: $ms_id}) "
+                      "OPTIONAL MATCH (m)-[:HAS_PILEUP]->(p:Pileup) "
+                      "OPTIONAL MATCH (p)-[:CONTAINS]->(d:Dislocation) "
+                      "RETURN m.id AS id, count(DISTINCT p) AS pileups, count(DISTINCT d) AS dislocations",
+        },
+        build=_lookup,
+        answer=_answer_lookup,
+    ),
+]
+
+
+class TemplateEngine:
+    """Matches questions against ``templates`` and returns the Cypher that answers them.
+
+    ``validate`` checks every Cypher variant against a schema snapshot once per schema
+    version; variants that do not fit the schema are never used.
+    """
+
+    def __init__(self, templates=TEMPLATES):
+        self.templates = list(templates)
+        self.lock = threading.Lock()
+        self.schema_version = None
+        self.valid = {(t.name, key) for t in self.templates for key in t.cypher}
+
+    def validate(self, snapshot):
+        with self.lock:
+            if snapshot.version == self.schema_version:
+                return
+            valid = set()
+            for template in self.templates:
+                for key, cypher in template.cypher.items():
+                    analysis = analyse_cypher(cypher, snapshot.structured)
+                    if analysis.valid:
+                        valid.add((template.name, key))
+                    else:
+                        logging.info(f"Template {template.name}/{key} does not fit the schema: "
+                                     f"{analysis.errors + analysis.undecided}")
+            self.valid = valid
+            self.schema_version = snapshot.version
+
+    def match(self, question) -> Optional[TemplateMatch]:
+        q = normalize_question(question)
+        for template in self.templates:
+            for pattern in template.compiled:
+                m = pattern.match(q)
+                if m is None:
+                    continue
+                slots = {k: v for k, v in m.groupdict().items() if v is not None}
+                built = template.build(slots)
+                if built is None or (template.name, built[0]) not in self.valid:
+                    continue
+                key, params = built
+                return TemplateMatch(template, slots, template.cypher[key], params)
+        return None
+
+
+def answer_from_template(state: dict, engine: TemplateEngine, graph, schema,
+                         result_cache=None, version_watcher=None) -> dict:
+    engine.validate(schema.current())
+    match = engine.match(state.get("question"))
+    if match is None:
+        return {"next_action": "guardrails", "steps": ["template_miss"]}
+    logging.info(f"Question matched template {match.template.name} with {match.params}")
+    records = run_query(graph, match.cypher, match.params, result_cache=result_cache,
+                        version_watcher=version_watcher)
+    return {
+        "cypher_statement": match.cypher,
+        "database_records": records if records else no_results,
+        "answer": match.answer(records),
+        "next_action": "end",
+        "steps": [f"template:{match.template.name}"],
+    }
@@ -0,0 +1,195 @@
+import os
+import re
+import json
+import uuid
+import pickle
+import shutil
+import weakref
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+
+_STRING_OR_COMMENT = re.compile(r"""('(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*"|`[^`]*`)|(//[^\n]*|/\*.*?\*/)""", re.DOTALL)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_cypher(cypher):
+    """Drop comments and collapse whitespace outside string literals; strip a trailing semicolon."""
+    parts, code, pos = [], [], 0
+    for m in _STRING_OR_COMMENT.finditer(cypher):
+        code.append(cypher[pos:m.start()])
+        if m.group(1):
+            parts.append(_WHITESPACE.sub(" ", "".join(code)))
+            parts.append(m.group(1))
+            code = []
+        else:
+            code.append(" ")
+        pos = m.end()
+    code.append(cypher[pos:])
+    parts.append(_WHITESPACE.sub(" ", "".join(code)))
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _remove_stale_spills(root):
+    # Spill directories are named "<pid>-<suffix>"; those of exited processes are never read again.
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.isdir(path):
+            pid = name.split("-")[0]
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                shutil.rmtree(path, ignore_errors=True)
+        elif name.endswith(".pkl"):
+            # Left by versions that spilled straight into the shared directory.
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _size_of(records):
+    return len(json.dumps(records, default=str))
+
+
+@dataclass
+class ResultCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    spills: int = 0
+    invalidations: int = 0
+
+
+class ResultCache:
+    """LRU cache of query results keyed by (graph version, normalized Cypher).
+
+    Results count against ``max_bytes`` by their JSON size. Results larger than
+    ``spill_bytes`` are pickled to ``spill_dir`` (when set) and only their path is kept in
+    memory; those files count against ``max_disk_bytes``. Everything is dropped when the
+    graph version changes.
+
+    Each instance spills into its own subdirectory of ``spill_dir``, removed with the instance,
+    so processes and pipelines sharing the directory never read or delete each other's files.
+    """
+
+    def __init__(self, max_bytes=64 << 20, spill_dir=None, spill_bytes=1 << 20, max_disk_bytes=1 << 30):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_bytes = spill_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()  # key -> (records or spill path, size, spilled)
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.version = None
+        self.stats = ResultCacheStats()
+        self.lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            _remove_stale_spills(spill_dir)
+            self.spill_dir = os.path.join(spill_dir, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+            os.makedirs(self.spill_dir)
+            weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+
+    @staticmethod
+    def key(cypher, params=None):
+        text = normalize_cypher(cypher)
+        if params:
+            text += "\0" + json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _drop(self, key):
+        value, size, spilled = self.entries.pop(key)
+        if spilled:
+            self.disk_bytes -= size
+            try:
+                os.remove(value)
+            except OSError:
+                pass
+        else:
+            self.memory_bytes -= size
+
+    def _sync_version(self, version):
+        if version != self.version:
+            if self.entries:
+                logging.info(f"Graph version {self.version} -> {version}, dropping {len(self.entries)} cached results")
+                self.stats.invalidations += len(self.entries)
+            for key in list(self.entries):
+                self._drop(key)
+            self.version = version
+
+    def get(self, cypher, version, params=None):
+        key = self.key(cypher, params)
+        with self.lock:
+            self._sync_version(version)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats.hits += 1
+            value, _, spilled = entry
+        if spilled:
+            try:
+                with open(value, "rb") as f:
+                    return pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+                # Dropped or rewritten while it was read; a miss either way.
+                with self.lock:
+                    if self.entries.get(key, (None,))[0] == value:
+                        self._drop(key)
+                    self.stats.hits -= 1
+                    self.stats.misses += 1
+                return None
+        return value
+
+    def put(self, cypher, version, records, params=None):
+        key = self.key(cypher, params)
+        size = _size_of(records)
+        spill = self.spill_dir is not None and size > self.spill_bytes
+        if (spill and size > self.max_disk_bytes) or (not spill and size > self.max_bytes):
+            return
+        with self.lock:
+            self._sync_version(version)
+            if key in self.entries:
+                self._drop(key)
+            if spill:
+                path = os.path.join(self.spill_dir, f"{version}-{key}.pkl")
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    pickle.dump(records, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+                self.entries[key] = (path, size, True)
+                self.disk_bytes += size
+                self.stats.spills += 1
+            else:
+                self.entries[key] = (records, size, False)
+                self.memory_bytes += size
+            self.stats.stores += 1
+            for oldest in list(self.entries):
+                if self.memory_bytes <= self.max_bytes and self.disk_bytes <= self.max_disk_bytes:
+                    break
+                if oldest == key:
+                    continue
+                self._drop(oldest)
+                self.stats.evictions += 1
+
+    def info(self):
+        return {
+            "entries": len(self.entries),
+            "memory_bytes": self.memory_bytes,
+            "disk_bytes": self.disk_bytes,
+            "version": self.version,
+            **asdict(self.stats),
+        }
@@ -0,0 +1,162 @@
+import json
+import logging
+import numbers
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.schema_pruning import count_tokens
+
+_DROPPED = object()
+
+
+def _dumps(value):
+    return json.dumps(value, default=str, separators=(",", ":"))
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def _round(value):
+    return float(f"{value:.4g}")
+
+
+def truncation_note(max_rows):
+    return (f"The query was cut off at {max_rows} rows by the row limit, so more rows may match: "
+            f"counts, totals and other aggregates over these rows may be incomplete.")
+
+
+@dataclass
+class CompactedResult:
+    """What the answer prompt sees instead of the raw records."""
+
+    rows: List[dict]
+    total_rows: int
+    summary: Dict[str, dict] = field(default_factory=dict)
+    dropped: List[str] = field(default_factory=list)
+    truncated: List[str] = field(default_factory=list)
+    # Row limit the query hit, when its result is incomplete.
+    capped_at: Optional[int] = None
+
+    @property
+    def note(self):
+        notes = []
+        if self.capped_at:
+            notes.append(truncation_note(self.capped_at))
+        if len(self.rows) < self.total_rows:
+            covers = "the" if self.capped_at else "all"
+            notes.append(f"Only {len(self.rows)} of {self.total_rows} rows are shown; "
+                         f"SUMMARY covers {covers} {self.total_rows} rows returned.")
+        if self.dropped:
+            notes.append(f"Large values were left out: {', '.join(self.dropped)}.")
+        if self.truncated:
+            notes.append(f"Long values were shortened or cut to their first items: {', '.join(self.truncated)}.")
+        return " ".join(notes)
+
+    def digest(self):
+        parts = [_dumps(self.rows)]
+        if self.summary:
+            parts.append(f"SUMMARY: {_dumps(self.summary)}")
+        if self.note:
+            parts.append(f"NOTE: {self.note}")
+        return "\n".join(parts)
+
+
+class ResultCompactor:
+    """Fits query results into a row and token budget before they reach the answer prompt.
+
+    Long strings are shortened, long lists are cut to their first ``max_items``, and numeric
+    arrays (spline points, coordinates) are dropped. When rows have to be left out, the count,
+    min, max, mean and a histogram of every numeric column and node property are computed
+    over all rows, so aggregate questions are still answered from the full result. When the
+    query itself was cut off by a row limit, the note says the result is incomplete.
+    """
+
+    def __init__(self, max_rows=50, max_tokens=4000, max_chars=200, max_items=10, bins=10):
+        self.max_rows = max_rows
+        self.max_tokens = max_tokens
+        self.max_chars = max_chars
+        self.max_items = max_items
+        self.bins = bins
+
+    def _project(self, value, path, result):
+        if isinstance(value, dict):
+            projected = {}
+            for key, item in value.items():
+                item = self._project(item, f"{path}.{key}", result)
+                if item is not _DROPPED:
+                    projected[key] = item
+            return projected
+        if isinstance(value, str) and len(value) > self.max_chars:
+            result.truncated.append(path)
+            return value[:self.max_chars] + "..."
+        if isinstance(value, list):
+            if len(value) > self.max_items and all(_is_number(v) or isinstance(v, list) for v in value):
+                result.dropped.append(path)
+                return _DROPPED
+            if len(value) > self.max_items:
+                result.truncated.append(path)
+                value = value[:self.max_items]
+            projected = [self._project(item, f"{path}[]", result) for item in value]
+            return [item for item in projected if item is not _DROPPED]
+        return value
+
+    def _numeric_columns(self, records):
+        columns = {}
+        for record in records:
+            for key, value in record.items():
+                if _is_number(value):
+                    columns.setdefault(key, []).append(value)
+                elif isinstance(value, dict):
+                    for prop, item in value.items():
+                        if _is_number(item):
+                            columns.setdefault(f"{key}.{prop}", []).append(item)
+        return columns
+
+    def _summary(self, records):
+        summary = {}
+        for column, values in self._numeric_columns(records).items():
+            values = np.asarray(values, dtype=float)
+            counts, edges = np.histogram(values, bins=min(self.bins, len(np.unique(values))))
+            summary[column] = {
+                "count": int(values.size),
+                "min": _round(values.min()),
+                "max": _round(values.max()),
+                "mean": _round(values.mean()),
+                "histogram": [
+                    {"from": _round(lo), "to": _round(hi), "count": int(n)}
+                    for lo, hi, n in zip(edges[:-1], edges[1:], counts)
+                ],
+            }
+        return summary
+
+    def compact(self, records, capped_at=None) -> CompactedResult:
+        result = CompactedResult(rows=[], total_rows=len(records), capped_at=capped_at)
+        rows = []
+        for record in records[:self.max_rows]:
+            row = {key: self._project(value, key, result) for key, value in record.items()}
+            rows.append({key: value for key, value in row.items() if value is not _DROPPED})
+        result.dropped = sorted(set(result.dropped))
+        result.truncated = sorted(set(result.truncated))
+        # Halve the rows until they fit the token budget, keeping at least one.
+        while len(rows) > 1 and count_tokens(_dumps(rows)) > self.max_tokens:
+            rows = rows[:len(rows) // 2]
+        result.rows = rows
+        if len(rows) < len(records):
+            result.summary = self._summary(records)
+        return result
+
+    def __call__(self, records, capped_at=None):
+        """Prompt text for ``records``; anything that is not a list of rows is passed through.
+
+        ``capped_at`` is the row limit the query hit, which the text then says.
+        """
+        if not isinstance(records, list):
+            return records
+        result = self.compact(records, capped_at)
+        if len(result.rows) == len(records) and not result.dropped and not result.truncated and not capped_at:
+            return records
+        logging.info(f"Compacted {len(records)} records: {result.note}")
+        return result.digest()
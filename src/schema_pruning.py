@@ -0,0 +1,184 @@
+import re
+import logging
+import threading
+from functools import lru_cache
+from collections import OrderedDict, deque
+
+import numpy as np
+import tiktoken
+from neo4j_graphrag.schema import format_schema
+
+from src.embeddings import CachedEmbeddings
+
+_WORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+_CYPHER_LABEL = re.compile(r":\s*`?([A-Za-z_][A-Za-z0-9_]*)")
+_CYPHER_PROPERTY = re.compile(r"\.\s*`?([A-Za-z_][A-Za-z0-9_]*)|\{\s*`?([A-Za-z_][A-Za-z0-9_]*)\s*:")
+
+
+def _words(text):
+    """Lower-case words of a question or identifier, with camelCase and snake_case split
+    and a plural ``s`` dropped, so "pileups" matches ``Pileup`` and "arc length" ``arc_length``."""
+    words = set()
+    for word in _WORD.findall(text or ""):
+        word = word.lower()
+        words.add(word[:-1] if len(word) > 3 and word.endswith("s") else word)
+    return words
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # The BPE files are downloaded on first use; without network fall back to an estimate.
+        return None
+
+
+def count_tokens(text, model="gpt-4o"):
+    encoding = _encoding(model)
+    return len(encoding.encode(text)) if encoding is not None else len(text) // 4
+
+
+class _ElementIndex:
+    """Normalised embeddings of every label, property and relationship of one schema version."""
+
+    def __init__(self, structured, embeddings: CachedEmbeddings):
+        self.structured = structured
+        self.labels = list(structured.get("node_props", {}))
+        self.properties = [
+            (label, prop["property"])
+            for label, props in structured.get("node_props", {}).items() for prop in props
+        ]
+        self.relationships = structured.get("relationships", [])
+        texts = (
+            [f"{label} node" for label in self.labels]
+            + [f"{label} {prop.replace('_', ' ')}" for label, prop in self.properties]
+            + [f"{r['start']} {r['type'].replace('_', ' ').lower()} {r['end']}" for r in self.relationships]
+        )
+        matrix = np.asarray(embeddings.embed_vectors(texts), dtype=np.float32) if texts else np.empty((0, 0))
+        if matrix.size:
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        self.matrix = matrix
+        self.neighbours = {label: set() for label in self.labels}
+        for r in self.relationships:
+            self.neighbours.setdefault(r["start"], set()).add(r["end"])
+            self.neighbours.setdefault(r["end"], set()).add(r["start"])
+
+    def scores(self, vector):
+        if not self.matrix.size:
+            return np.empty(0), np.empty(0), np.empty(0)
+        scores = self.matrix @ vector
+        n_labels, n_props = len(self.labels), len(self.properties)
+        return scores[:n_labels], scores[n_labels:n_labels + n_props], scores[n_labels + n_props:]
+
+    def path(self, source, targets):
+        """Labels on a shortest relationship path from ``source`` to the nearest of ``targets``."""
+        parents = {source: None}
+        queue = deque([source])
+        while queue:
+            label = queue.popleft()
+            if label in targets and label != source:
+                path = []
+                while label is not None:
+                    path.append(label)
+                    label = parents[label]
+                return path
+            for neighbour in self.neighbours.get(label, ()):
+                if neighbour not in parents:
+                    parents[neighbour] = label
+                    queue.append(neighbour)
+        return [source]
+
+
+class SchemaPruner:
+    """Cuts a structured schema down to the labels, relationships and properties a question needs.
+
+    Labels are ranked by the best embedding similarity of the label, its properties and its
+    relationships to the question; the ``max_labels`` best, plus any named in the question or
+    the Cypher statement, are joined along shortest relationship paths. Every relationship
+    touching a kept label is listed, but properties are only listed for kept labels: their
+    ``id``, the ones named in the question or statement, and the ``max_properties`` most similar.
+    """
+
+    def __init__(self, embeddings: CachedEmbeddings, max_labels=3, max_properties=6, cache_size=256):
+        self.embeddings = embeddings
+        self.max_labels = max_labels
+        self.max_properties = max_properties
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self._index_version = None
+        self._index = None
+        self._slices = OrderedDict()
+
+    def _element_index(self, snapshot):
+        with self.lock:
+            if self._index_version != snapshot.version:
+                self._index = _ElementIndex(snapshot.structured, self.embeddings)
+                self._index_version = snapshot.version
+                self._slices.clear()
+            return self._index
+
+    def prune(self, snapshot, question, cypher=None):
+        key = (snapshot.version, question, cypher)
+        with self.lock:
+            if key in self._slices:
+                self._slices.move_to_end(key)
+                return self._slices[key]
+        index = self._element_index(snapshot)
+        text = format_schema(schema=self.select(index, question, cypher), is_enhanced=False)
+        logging.info(f"Schema slice: {count_tokens(snapshot.text)} -> {count_tokens(text)} tokens")
+        with self.lock:
+            self._slices[key] = text
+            while len(self._slices) > self.cache_size:
+                self._slices.popitem(last=False)
+        return text
+
+    def select(self, index: _ElementIndex, question, cypher=None):
+        structured = index.structured
+        if not index.labels:
+            return structured
+        words = _words(question)
+        named_labels = set(_CYPHER_LABEL.findall(cypher or ""))
+        named_props = {a or b for a, b in _CYPHER_PROPERTY.findall(cypher or "")}
+
+        vector = np.asarray(self.embeddings.embed_query_vector(question), dtype=np.float32)
+        label_scores, prop_scores, rel_scores = index.scores(vector / max(np.linalg.norm(vector), 1e-12))
+        best = dict(zip(index.labels, label_scores.tolist()))
+        for (label, _), score in zip(index.properties, prop_scores.tolist()):
+            best[label] = max(best.get(label, score), score)
+        for r, score in zip(index.relationships, rel_scores.tolist()):
+            for label in (r["start"], r["end"]):
+                best[label] = max(best.get(label, score), score)
+
+        ranked = sorted(index.labels, key=lambda label: -best[label])
+        seeds = set(ranked[:self.max_labels])
+        seeds |= {label for label in index.labels if _words(label) <= words or label in named_labels}
+        # Join the seeds along shortest paths so the slice can still express the traversal.
+        kept = set()
+        for label in sorted(seeds, key=lambda label: -best[label]):
+            if label not in kept:
+                kept.update(index.path(label, kept) if kept else [label])
+
+        prop_score = dict(zip(index.properties, prop_scores.tolist()))
+        node_props = {}
+        for label in structured["node_props"]:
+            if label not in kept:
+                continue
+            props = structured["node_props"][label]
+            ranked_props = sorted(props, key=lambda p: -prop_score[(label, p["property"])])
+            top = {p["property"] for p in ranked_props[:self.max_properties]}
+            node_props[label] = [
+                p for p in props
+                if p["property"] == "id" or p["property"] in top or p["property"] in named_props
+                or _words(p["property"]) <= words
+            ]
+        relationships = [r for r in index.relationships if r["start"] in kept or r["end"] in kept]
+        rel_types = {r["type"] for r in relationships}
+        return {
+            **structured,
+            "node_props": node_props,
+            "rel_props": {k: v for k, v in structured.get("rel_props", {}).items() if k in rel_types},
+            "relationships": relationships,
+        }
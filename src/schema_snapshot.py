@@ -0,0 +1,121 @@
+import os
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+
+from neo4j_graphrag.schema import format_schema, get_structured_schema
+from langchain_neo4j.chains.graph_qa.cypher_utils import CypherQueryCorrector, Schema
+
+from src.semantic_cache import schema_version
+
+# Written by the ingester next to the graph version it describes.
+DEFAULT_SNAPSHOT = os.path.join(os.environ.get("GRAPHRAG_CACHE_DIR", ".cache"), "schema.json")
+
+
+def strip_internal(structured):
+    """Drop bookkeeping labels such as ``_GraphMeta`` (leading underscore) from a structured schema."""
+    def internal(label):
+        return label.startswith("_")
+
+    return {
+        **structured,
+        "node_props": {k: v for k, v in structured.get("node_props", {}).items() if not internal(k)},
+        "rel_props": {k: v for k, v in structured.get("rel_props", {}).items() if not internal(k)},
+        "relationships": [
+            r for r in structured.get("relationships", [])
+            if not (internal(r["start"]) or internal(r["end"]) or internal(r["type"]))
+        ],
+    }
+
+
+def fetch_structured_schema(driver, database=None):
+    return strip_internal(get_structured_schema(driver=driver, is_enhanced=False, database=database))
+
+
+def write_snapshot(path, structured, graph_version):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # One temporary file per writer: the service may write from several threads at once.
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"graph_version": graph_version, "structured_schema": structured}, f, default=str)
+    os.replace(tmp, path)
+
+
+def read_snapshot(path):
+    """(structured schema, graph version) of a snapshot file, or None if there is none."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data["structured_schema"], data["graph_version"]
+
+
+@dataclass
+class SchemaSnapshot:
+    """One graph version's schema, with everything derived from it computed once."""
+
+    structured: dict
+    graph_version: int
+    text: str = field(init=False)
+    version: str = field(init=False)
+    corrector: CypherQueryCorrector = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.text = format_schema(schema=self.structured, is_enhanced=False)
+        self.version = schema_version(self.text)
+        self.corrector = CypherQueryCorrector([
+            Schema(el["start"], el["type"], el["end"]) for el in self.structured.get("relationships", [])
+        ])
+
+
+class SchemaService:
+    """Serves the current ``SchemaSnapshot`` to the pipeline nodes.
+
+    The graph is only introspected when the ingester's graph version differs from the
+    one of the snapshot in memory and of the snapshot file; introspected schemas are
+    written back to the file so the next process starts from it.
+    """
+
+    def __init__(self, graph, version_watcher, snapshot_path=DEFAULT_SNAPSHOT, pruner=None):
+        self.graph = graph
+        self.version_watcher = version_watcher
+        self.snapshot_path = snapshot_path
+        self.pruner = pruner
+        self.lock = threading.Lock()
+        self._snapshot = None
+
+    def current(self) -> SchemaSnapshot:
+        graph_version = self.version_watcher.current()
+        with self.lock:
+            if self._snapshot is None or self._snapshot.graph_version != graph_version:
+                self._snapshot = self._load(graph_version)
+            return self._snapshot
+
+    def _load(self, graph_version):
+        stored = read_snapshot(self.snapshot_path) if self.snapshot_path else None
+        if stored is not None and stored[1] == graph_version:
+            logging.info(f"Loaded schema snapshot for graph version {graph_version} from {self.snapshot_path}")
+            return SchemaSnapshot(stored[0], graph_version)
+        self.graph.refresh_schema()
+        snapshot = SchemaSnapshot(strip_internal(self.graph.structured_schema), graph_version)
+        if self.snapshot_path:
+            write_snapshot(self.snapshot_path, snapshot.structured, graph_version)
+        logging.info(f"GRAPH SCHEMA (version {graph_version}) {snapshot.text}")
+        return snapshot
+
+    @property
+    def text(self):
+        return self.current().text
+
+    def text_for(self, question, cypher=None):
+        """Schema text for one prompt: the slice relevant to the question when a pruner is set."""
+        snapshot = self.current()
+        if self.pruner is None:
+            return snapshot.text
+        return self.pruner.prune(snapshot, question, cypher)
+
+    @property
+    def corrector(self):
+        return self.current().corrector
@@ -0,0 +1,212 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, asdict
+
+import numpy as np
+
+from src.embeddings import CachedEmbeddings
+
+# Ids, counts and thresholds in a question; two questions only share a cache entry if these match,
+# so "pileups of ms_200" never reuses the Cypher written for "pileups of ms_201".
+_LITERALS = re.compile(r"\b(?:ms_|id_)?\d+(?:\.\d+)?\b", re.IGNORECASE)
+# Aggregate, comparison and negation words, by the operator they stand for. Embeddings rate
+# "highest number of dislocations in a pileup" and "lowest ..." as near-duplicates, so these
+# must agree too. Multi-word forms come first so "at least" is not read as "least".
+_OPERATORS = [
+    ("gte", r"at least|no (?:less|fewer) than|or more"),
+    ("lte", r"at most|no more than|or (?:less|fewer)"),
+    ("max", r"highest|largest|biggest|greatest|most|maximum|max|top|longest"),
+    ("min", r"lowest|smallest|fewest|least|minimum|min|bottom|shortest"),
+    ("avg", r"average|mean|avg"),
+    ("var", r"variance|standard deviation|std|spread"),
+    ("median", r"median"),
+    ("sum", r"total|sum"),
+    ("gt", r"more|greater|larger|higher|above|over|exceed(?:s|ing)?"),
+    ("lt", r"less|fewer|smaller|lower|below|under"),
+    ("not", r"not|no|without|except|excluding"),
+]
+_OPERATOR_WORDS = re.compile(
+    "|".join(f"(?P<{name}>\\b(?:{words})\\b)" for name, words in _OPERATORS), re.IGNORECASE
+)
+
+
+def question_literals(question):
+    """Ids and numbers plus the aggregate/comparison operators a question uses."""
+    literals = [m.lower() for m in _LITERALS.findall(question)]
+    operators = {m.lastgroup for m in _OPERATOR_WORDS.finditer(question)}
+    return tuple(sorted(literals)) + tuple(f"op:{name}" for name in sorted(operators))
+
+
+def schema_version(schema_text):
+    return hashlib.sha256((schema_text or "").encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class SemanticCypherCache:
+    """Validated Cypher statements keyed by the embedding of the question that produced them.
+
+    Entries live in SQLite and, for lookup, in a normalised in-memory matrix. A lookup hits
+    when the best cosine similarity reaches ``threshold`` and the numeric/id literals and the
+    aggregate/comparison words of both questions agree. Entries expire after ``ttl`` seconds, the least recently used are evicted
+    beyond ``max_entries``, and all entries are dropped when the schema version changes.
+    """
+
+    def __init__(self, path, embeddings: CachedEmbeddings, threshold=0.95, max_entries=1000,
+                 ttl=7 * 24 * 3600, schema_version=None):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cypher_cache ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " question TEXT NOT NULL,"
+            " literals TEXT NOT NULL,"
+            " embedding BLOB NOT NULL,"
+            " cypher TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " schema_version TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_hit REAL NOT NULL,"
+            " hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.conn.commit()
+        self.schema_version = schema_version
+        self._reload()
+
+    def _reload(self):
+        """Load the live entries into memory; returns how many were dropped for another schema version."""
+        self.conn.execute(
+            "DELETE FROM cypher_cache WHERE created_at < ? OR model != ?",
+            (time.time() - self.ttl, self.embeddings.model),
+        )
+        invalidated = 0
+        if self.schema_version is not None:
+            invalidated = self.conn.execute(
+                "DELETE FROM cypher_cache WHERE schema_version != ?", (self.schema_version,)
+            ).rowcount
+        self.conn.commit()
+        rows = self.conn.execute(
+            "SELECT id, literals, embedding, cypher, created_at FROM cypher_cache ORDER BY id"
+        ).fetchall()
+        self.ids = [r[0] for r in rows]
+        self.literals = [r[1] for r in rows]
+        self.cyphers = [r[3] for r in rows]
+        self.created = [r[4] for r in rows]
+        self.matrix = np.stack([np.frombuffer(r[2], dtype=np.float32) for r in rows]) if rows else None
+        return invalidated
+
+    def set_schema_version(self, version):
+        """Drop every entry built against another schema; called when the graph schema changes."""
+        with self.lock:
+            if version == self.schema_version:
+                return
+            if self.schema_version is not None:
+                logging.info(f"Schema changed ({self.schema_version} -> {version}), invalidating the Cypher cache")
+            self.schema_version = version
+            self.stats.invalidations += self._reload()
+
+    def _vector(self, question):
+        vector = np.asarray(self.embeddings.embed_query_vector(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, question):
+        """The cached Cypher for a near-duplicate question, or None."""
+        vector = self._vector(question)
+        literals = "|".join(question_literals(question))
+        with self.lock:
+            if self.matrix is not None:
+                scores = self.matrix @ vector
+                now = time.time()
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    if self.literals[i] != literals or now - self.created[i] > self.ttl:
+                        continue
+                    self.stats.hits += 1
+                    self.conn.execute(
+                        "UPDATE cypher_cache SET hits = hits + 1, last_hit = ? WHERE id = ?", (now, self.ids[i])
+                    )
+                    self.conn.commit()
+                    logging.info(f"Cypher cache hit (similarity {scores[i]:.3f})")
+                    return self.cyphers[i]
+            self.stats.misses += 1
+            return None
+
+    def store(self, question, cypher):
+        vector = self._vector(question)
+        now = time.time()
+        literals = "|".join(question_literals(question))
+        with self.lock:
+            row_id = self.conn.execute(
+                "INSERT INTO cypher_cache (question, literals, embedding, cypher, model, schema_version, created_at, last_hit) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (question, literals, vector.tobytes(), cypher, self.embeddings.model, self.schema_version or "", now, now),
+            ).lastrowid
+            self.stats.stores += 1
+            # The new row is appended in memory; only evicted rows are removed, nothing is decoded again.
+            self.ids.append(row_id)
+            self.literals.append(literals)
+            self.cyphers.append(cypher)
+            self.created.append(now)
+            self.matrix = vector[None, :] if self.matrix is None else np.vstack([self.matrix, vector])
+            excess = len(self.ids) - self.max_entries
+            if excess > 0:
+                evicted = {r[0] for r in self.conn.execute(
+                    "SELECT id FROM cypher_cache ORDER BY last_hit ASC LIMIT ?", (excess,)
+                )}
+                self.conn.executemany("DELETE FROM cypher_cache WHERE id = ?", [(i,) for i in evicted])
+                self.stats.evictions += len(evicted)
+                keep = [i for i, entry in enumerate(self.ids) if entry not in evicted]
+                self.ids = [self.ids[i] for i in keep]
+                self.literals = [self.literals[i] for i in keep]
+                self.cyphers = [self.cyphers[i] for i in keep]
+                self.created = [self.created[i] for i in keep]
+                self.matrix = self.matrix[keep] if keep else None
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM cypher_cache")
+            self.conn.commit()
+            self._reload()
+
+    def info(self):
+        return {"entries": len(self.ids), "hit_rate": self.stats.hit_rate, **asdict(self.stats)}
+
+
+def lookup_cypher_cache(state: dict, cache: SemanticCypherCache, schema) -> dict:
+    cache.set_schema_version(schema.current().version)
+    cypher = cache.lookup(state.get("question"))
+    if cypher is None:
+        return {"next_action": "generate_cypher", "steps": ["cypher_cache_miss"]}
+    return {"cypher_statement": cypher, "next_action": "execute_cypher", "steps": ["cypher_cache_hit"]}
+
+
+def store_cypher_cache(state: dict, cache: SemanticCypherCache) -> dict:
+    cache.store(state.get("question"), state.get("cypher_statement"))
+    return {"steps": ["cypher_cache_store"]}
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+import urllib.request
+from dataclasses import dataclass, asdict
+
+from aiohttp import web
+
+from src.config import get_tracer, logger
+from src.llm_query import build_pipeline
+from src.streaming import StreamEvent, astream_answer
+
+
+@dataclass
+class ServiceStats:
+    served: int = 0
+    failed: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+    active: int = 0
+    waiting: int = 0
+    total_seconds: float = 0.0
+
+
+class QueryService:
+    """Answers questions on one async pipeline, so every request shares the LLM client and the
+    Neo4j connection pool. At most ``concurrency`` requests run at once and at most ``max_queue``
+    wait for a slot; anything beyond that is rejected straight away instead of piling up.
+    """
+
+    def __init__(self, pipeline, concurrency=8, max_queue=32, timeout=120.0):
+        self.pipeline = pipeline
+        self.slots = asyncio.Semaphore(concurrency)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.stats = ServiceStats()
+
+    @property
+    def full(self):
+        return self.slots.locked() and self.stats.waiting >= self.max_queue
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        self.stats.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.stats.waiting -= 1
+        self.stats.active += 1
+        start = time.perf_counter()
+        try:
+            yield start + self.timeout
+        finally:
+            self.stats.active -= 1
+            self.stats.total_seconds += time.perf_counter() - start
+            self.slots.release()
+
+    async def answer(self, question):
+        async with self.slot():
+            return await asyncio.wait_for(self.pipeline.ainvoke({"question": question}), self.timeout)
+
+    async def stream(self, question):
+        async with self.slot() as deadline:
+            events = astream_answer(self.pipeline, question)
+            try:
+                while True:
+                    try:
+                        event = await asyncio.wait_for(events.__anext__(), deadline - time.perf_counter())
+                    except StopAsyncIteration:
+                        return
+                    yield event
+            finally:
+                await events.aclose()
+
+
+async def _question(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Expected a JSON body")
+    question = body.get("question") if isinstance(body, dict) else None
+    if not isinstance(question, str) or not question.strip():
+        raise web.HTTPBadRequest(text="Expected a non-empty 'question'")
+    service = request.app["service"]
+    if service.full:
+        service.stats.rejected += 1
+        raise web.HTTPServiceUnavailable(text=json.dumps({"error": "The service is busy, try again shortly"}),
+                                         content_type="application/json", headers={"Retry-After": "1"})
+    logger.info(f"User Request: {question}")
+    return question
+
+
+async def handle_query(request):
+    service = request.app["service"]
+    question = await _question(request)
+    try:
+        result = await service.answer(question)
+    except asyncio.TimeoutError:
+        service.stats.timed_out += 1
+        return web.json_response({"error": "The question took too long to answer"}, status=504)
+    except Exception as ex:
+        service.stats.failed += 1
+        logger.error(f"Got error processing request {ex}")
+        return web.json_response({"error": "The question could not be answered"}, status=500)
+    service.stats.served += 1
+    return web.json_response({
+        "answer": result.get("answer"),
+        "cypher_statement": result.get("cypher_statement"),
+        "steps": result.get("steps"),
+    })
+
+
+async def handle_stream(request):
+    """Newline-delimited JSON ``StreamEvent``s: generated Cypher, row counts, answer tokens, answer."""
+    service = request.app["service"]
+    question = await _question(request)
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+    try:
+        async for event in service.stream(question):
+            await response.write((json.dumps(asdict(event), default=str) + "\n").encode())
+        service.stats.served += 1
+    except asyncio.TimeoutError:
+        service.stats.timed_out += 1
+        error = StreamEvent("error", text="The question took too long to answer")
+        await response.write((json.dumps(asdict(error)) + "\n").encode())
+    except Exception as ex:
+        service.stats.failed += 1
+        logger.error(f"Got error processing request {ex}")
+        error = StreamEvent("error", text="The question could not be answered")
+        await response.write((json.dumps(asdict(error)) + "\n").encode())
+    await response.write_eof()
+    return response
+
+
+async def handle_health(request):
+    return web.json_response({"status": "ok"})
+
+
+async def handle_metrics(request):
+    return web.Response(text=get_tracer().metrics(), content_type="text/plain")
+
+
+async def handle_stats(request):
+    return web.json_response(asdict(request.app["service"].stats))
+
+
+def create_app(pipeline=None, concurrency=8, max_queue=32, timeout=120.0) -> web.Application:
+    app = web.Application()
+
+    async def start(app):
+        # Built inside the running loop: the async Neo4j driver is bound to it.
+        app["service"] = QueryService(pipeline or build_pipeline(asynchronous=True), concurrency, max_queue, timeout)
+
+    app.on_startup.append(start)
+    app.add_routes([
+        web.post("/query", handle_query),
+        web.post("/query/stream", handle_stream),
+        web.get("/health", handle_health),
+        web.get("/stats", handle_stats),
+        web.get("/metrics", handle_metrics),
+    ])
+    return app
+
+
+class ServiceClient:
+    """Drop-in for a compiled pipeline's ``invoke`` that asks a running service instead, so several
+    UI sessions share the service's LLM client and Neo4j connection pool."""
+
+    def __init__(self, url, timeout=130.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path, question):
+        return urllib.request.Request(
+            f"{self.url}{path}",
+            data=json.dumps({"question": question}).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+
+    def invoke(self, input: dict) -> dict:
+        with urllib.request.urlopen(self._request("/query", input["question"]), timeout=self.timeout) as response:
+            return json.load(response)
+
+    def stream(self, question):
+        """Yield the ``StreamEvent``s of ``POST /query/stream`` as they arrive."""
+        with urllib.request.urlopen(self._request("/query/stream", question), timeout=self.timeout) as response:
+            for line in response:
+                if line.strip():
+                    yield StreamEvent(**json.loads(line))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the GraphRAG pipeline over HTTP.")
+    parser.add_argument("--host", default=os.environ.get("GRAPHRAG_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("GRAPHRAG_PORT", "8080")))
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("GRAPHRAG_CONCURRENCY", "8")),
+                        help="Questions answered at the same time.")
+    parser.add_argument("--max-queue", type=int, default=int(os.environ.get("GRAPHRAG_MAX_QUEUE", "32")),
+                        help="Questions waiting for a slot before new ones are rejected with 503.")
+    parser.add_argument("--timeout", type=float, default=float(os.environ.get("GRAPHRAG_TIMEOUT", "120")),
+                        help="Seconds before a question is abandoned with 504.")
+    args = parser.parse_args()
+    web.run_app(create_app(concurrency=args.concurrency, max_queue=args.max_queue, timeout=args.timeout),
+                host=args.host, port=args.port)
@@ -0,0 +1,209 @@
+import os
+import math
+import threading
+
+import numpy as np
+
+INDEX_FILE = "spatial.npz"
+# Target number of points per grid cell when no cell size is given.
+POINTS_PER_CELL = 4
+
+
+class GridIndex:
+    """Uniform grid over 2-D points, with optional axis-aligned boxes (xmin, ymin, xmax, ymax).
+
+    Points are sorted by flattened cell number, so a query only binary-searches the
+    cell ranges its window covers and tests the points found there.
+    """
+
+    def __init__(self, points, cell_size=None, boxes=None):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 2)
+        n = len(self.points)
+        if n:
+            self.origin, self.corner = self.points.min(axis=0), self.points.max(axis=0)
+        else:
+            self.origin, self.corner = np.zeros(2), np.zeros(2)
+        extent = self.corner - self.origin
+        if cell_size is None:
+            area = float(extent[0] * extent[1])
+            if n and area > 0:
+                cell_size = math.sqrt(area * POINTS_PER_CELL / n)
+            else:
+                cell_size = float(extent.max()) * POINTS_PER_CELL / n if n and extent.max() > 0 else 1.0
+        self.cell_size = float(cell_size)
+        self.shape = (np.floor(extent / self.cell_size).astype(np.int64) + 1)
+        cells = self._cells(self.points)
+        flat = cells[:, 0] * self.shape[1] + cells[:, 1]
+        self.order = np.argsort(flat, kind="stable")
+        self.sorted_cells = flat[self.order]
+
+        self.boxes = None
+        if boxes is not None:
+            self.boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+            centers = (self.boxes[:, :2] + self.boxes[:, 2:]) / 2
+            self._box_centers = GridIndex(centers, cell_size=self.cell_size)
+            self._box_pad = np.nanmax(self.boxes[:, 2:] - centers, axis=0) if n else np.zeros(2)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cells(self, xy):
+        cells = np.floor((np.asarray(xy, dtype=float).reshape(-1, 2) - self.origin) / self.cell_size)
+        return np.clip(cells, 0, self.shape - 1).astype(np.int64)
+
+    def _candidates(self, xmin, ymin, xmax, ymax):
+        if not len(self.points) or xmin > xmax or ymin > ymax:
+            return np.empty(0, dtype=np.int64)
+        lo = np.array([xmin, ymin], dtype=float)
+        hi = np.array([xmax, ymax], dtype=float)
+        upper = self.origin + self.shape * self.cell_size
+        if np.any(hi < self.origin) or np.any(lo > upper):
+            return np.empty(0, dtype=np.int64)
+        (cx0, cy0), (cx1, cy1) = self._cells(np.clip([lo, hi], self.origin, upper))
+        rows = np.arange(cx0, cx1 + 1) * self.shape[1]
+        starts = np.searchsorted(self.sorted_cells, rows + cy0, side="left")
+        stops = np.searchsorted(self.sorted_cells, rows + cy1, side="right")
+        if len(rows) == 1:
+            return self.order[starts[0]:stops[0]]
+        return np.concatenate([self.order[a:b] for a, b in zip(starts, stops)])
+
+    def window(self, xmin, ymin, xmax, ymax):
+        """Indices of points with ``xmin <= x < xmax`` and ``ymin <= y < ymax``."""
+        idx = self._candidates(xmin, ymin, xmax, ymax)
+        p = self.points[idx]
+        mask = (p[:, 0] >= xmin) & (p[:, 0] < xmax) & (p[:, 1] >= ymin) & (p[:, 1] < ymax)
+        return np.sort(idx[mask])
+
+    def radius(self, x, y, r):
+        """Indices of points within distance ``r`` of (x, y), nearest first, and their distances."""
+        idx = self._candidates(x - r, y - r, x + r, y + r)
+        d = np.hypot(self.points[idx, 0] - x, self.points[idx, 1] - y)
+        keep = d <= r
+        idx, d = idx[keep], d[keep]
+        order = np.argsort(d, kind="stable")
+        return idx[order], d[order]
+
+    def nearest(self, x, y, k=1):
+        """The ``k`` nearest points to (x, y) as (indices, distances)."""
+        k = min(k, len(self.points))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        q = np.array([x, y], dtype=float)
+        far = float(np.hypot(*np.maximum(np.abs(q - self.origin), np.abs(q - self.corner))))
+        r = self.cell_size
+        while True:
+            # Every point within r is found, so once k of them are, they are the k nearest.
+            idx, d = self.radius(x, y, r)
+            if len(idx) >= k or r >= far:
+                return idx[:k], d[:k]
+            r *= 2
+
+    def intersecting(self, xmin, ymin, xmax, ymax):
+        """Indices of boxes overlapping the closed window."""
+        if self.boxes is None:
+            raise ValueError("GridIndex was built without boxes")
+        px, py = self._box_pad
+        idx = self._box_centers._candidates(xmin - px, ymin - py, xmax + px, ymax + py)
+        b = self.boxes[idx]
+        mask = (b[:, 0] <= xmax) & (b[:, 2] >= xmin) & (b[:, 1] <= ymax) & (b[:, 3] >= ymin)
+        return np.sort(idx[mask])
+
+    def pairs_within(self, r):
+        """All pairs (i, j, distance) with i < j closer than or at ``r``."""
+        pairs = []
+        for i, (x, y) in enumerate(self.points):
+            idx, d = self.radius(x, y, r)
+            keep = idx > i
+            pairs.extend(zip([i] * int(keep.sum()), idx[keep].tolist(), d[keep].tolist()))
+        pairs.sort()
+        return pairs
+
+
+def window_mask(points, window):
+    """Boolean mask of the points inside the half-open ``window`` (xmin, ymin, xmax, ymax)."""
+    mask = np.zeros(len(points), dtype=bool)
+    if len(points):
+        mask[GridIndex(points).window(*window)] = True
+    return mask
+
+
+class SpatialIndexStore:
+    """Per-microstructure dislocation positions and spline boxes, persisted in one npz file.
+
+    Grids are built lazily the first time a microstructure is queried.
+    """
+
+    def __init__(self, root, cell_size=None):
+        self.root = root
+        self.cell_size = cell_size
+        self.lock = threading.Lock()
+        self.entries = {}
+        self._grids = {}
+        path = os.path.join(root, INDEX_FILE)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                ids, points, boxes = data["ids"].tolist(), data["points"], data["boxes"]
+                bounds = data["offsets"]
+                for i, ms_id in enumerate(data["ms_ids"].tolist()):
+                    a, b = bounds[i], bounds[i + 1]
+                    self.entries[ms_id] = (ids[a:b], points[a:b], boxes[a:b])
+
+    def __contains__(self, ms_id):
+        return ms_id in self.entries
+
+    def add(self, ms_id, ids, points, boxes=None):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        boxes = np.full((len(points), 4), np.nan) if boxes is None else np.asarray(boxes, dtype=float).reshape(-1, 4)
+        with self.lock:
+            self.entries[ms_id] = (list(ids), points, boxes)
+            self._grids.pop(ms_id, None)
+
+    def remove(self, ms_ids):
+        with self.lock:
+            for ms_id in ms_ids:
+                self.entries.pop(ms_id, None)
+                self._grids.pop(ms_id, None)
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        with self.lock:
+            ms_ids = list(self.entries)
+            sizes = [len(self.entries[m][0]) for m in ms_ids]
+            tmp = os.path.join(self.root, INDEX_FILE + ".tmp")
+            with open(tmp, "wb") as f:
+                np.savez(
+                    f,
+                    ms_ids=np.asarray(ms_ids, dtype=str),
+                    offsets=np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)]),
+                    ids=np.asarray([i for m in ms_ids for i in self.entries[m][0]], dtype=str),
+                    points=np.concatenate([self.entries[m][1] for m in ms_ids]) if ms_ids else np.empty((0, 2)),
+                    boxes=np.concatenate([self.entries[m][2] for m in ms_ids]) if ms_ids else np.empty((0, 4)),
+                )
+            os.replace(tmp, os.path.join(self.root, INDEX_FILE))
+
+    def grid(self, ms_id):
+        grid = self._grids.get(ms_id)
+        if grid is None:
+            _, points, boxes = self.entries[ms_id]
+            grid = GridIndex(points, cell_size=self.cell_size,
+                             boxes=boxes if not np.isnan(boxes).all() else None)
+            self._grids[ms_id] = grid
+        return grid
+
+    def _ids(self, ms_id, idx):
+        ids = self.entries[ms_id][0]
+        return [ids[i] for i in idx]
+
+    def window(self, ms_id, xmin, ymin, xmax, ymax):
+        return self._ids(ms_id, self.grid(ms_id).window(xmin, ymin, xmax, ymax))
+
+    def radius(self, ms_id, x, y, r):
+        idx, d = self.grid(ms_id).radius(x, y, r)
+        return list(zip(self._ids(ms_id, idx), d.tolist()))
+
+    def nearest(self, ms_id, x, y, k=1):
+        idx, d = self.grid(ms_id).nearest(x, y, k)
+        return list(zip(self._ids(ms_id, idx), d.tolist()))
+
+    def intersecting(self, ms_id, xmin, ymin, xmax, ymax):
+        return self._ids(ms_id, self.grid(ms_id).intersecting(xmin, ymin, xmax, ymax))
@@ -0,0 +1,154 @@
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from dataclasses import dataclass, asdict
+from concurrent.futures import ThreadPoolExecutor
+
+# off: guardrails, then generation. generate: generate Cypher while the guardrail runs.
+# validate: also validate the speculative Cypher before the guardrail result is known.
+SPECULATION_MODES = ("off", "generate", "validate")
+
+
+@dataclass
+class SpeculationStats:
+    runs: int = 0
+    used: int = 0
+    wasted: int = 0
+    stopped_early: int = 0
+    saved_seconds: float = 0.0
+
+    @property
+    def waste_rate(self):
+        return self.wasted / self.runs if self.runs else 0.0
+
+
+def _merge(state, update):
+    # Nodes return partial updates with their own step names; keep all of them.
+    merged = {**state, **update}
+    merged["steps"] = list(state.get("steps") or []) + list(update.get("steps") or [])
+    return merged
+
+
+class Speculator:
+    """Runs the guardrail and the Cypher branch (cache lookup, generation, optionally
+    validation) at the same time; the branch is discarded when the guardrail says ``end``.
+    """
+
+    def __init__(self, guardrails, generate, lookup=None, validate=None, store=None, max_workers=8):
+        self.guardrails = guardrails
+        self.generate = generate
+        self.lookup = lookup
+        self.validate = validate
+        self.store = store
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculation")
+        self.stats = SpeculationStats()
+        self.lock = threading.Lock()
+
+    def _branch(self, state, stop):
+        start = time.perf_counter()
+        result = {**state, "steps": []}
+        if self.lookup is not None:
+            result = _merge(result, self.lookup(dict(result)))
+            if result.get("next_action") == "execute_cypher":
+                return result, False, time.perf_counter() - start
+        if stop.is_set():
+            return result, True, time.perf_counter() - start
+        result = _merge(result, self.generate(dict(result, steps=[])))
+        result["next_action"] = "validate_cypher"
+        if self.validate is not None and not stop.is_set():
+            result = _merge(result, self.validate(dict(result, steps=[])))
+        return result, stop.is_set(), time.perf_counter() - start
+
+    def __call__(self, state: dict) -> dict:
+        stop = threading.Event()
+        started = time.perf_counter()
+        # The branch records its LLM calls and queries on this node's trace span.
+        branch = self.pool.submit(contextvars.copy_context().run, self._branch, dict(state), stop)
+        try:
+            guard = self.guardrails(state)
+        except BaseException:
+            stop.set()
+            branch.cancel()
+            raise
+        guard_seconds = time.perf_counter() - started
+        with self.lock:
+            self.stats.runs += 1
+        if guard.get("next_action") == "end":
+            stop.set()
+            with self.lock:
+                self.stats.wasted += 1
+            if branch.cancel():
+                self._stopped_early()
+            else:
+                # The LLM call in flight cannot be interrupted, but the branch stops after it.
+                branch.add_done_callback(self._discarded)
+            logging.info(f"Speculation discarded {asdict(self.stats)}")
+            return guard
+
+        result, _, branch_seconds = branch.result()
+        return self._use(guard, result, guard_seconds, branch_seconds)
+
+    def _use(self, guard, result, guard_seconds, branch_seconds):
+        if (self.store is not None and result.get("next_action") == "execute_cypher"
+                and "validate_cypher" in result["steps"]):
+            result = _merge(result, self.store(result))
+        with self.lock:
+            self.stats.used += 1
+            self.stats.saved_seconds += min(guard_seconds, branch_seconds)
+        logging.info(f"Speculation used {asdict(self.stats)}")
+        return {**guard, **result, "steps": list(guard.get("steps") or []) + result["steps"]}
+
+    async def _abranch(self, state):
+        start = time.perf_counter()
+        result = {**state, "steps": []}
+        if self.lookup is not None:
+            result = _merge(result, await asyncio.to_thread(self.lookup, dict(result)))
+            if result.get("next_action") == "execute_cypher":
+                return result, False, time.perf_counter() - start
+        result = _merge(result, await self.generate(dict(result, steps=[])))
+        result["next_action"] = "validate_cypher"
+        if self.validate is not None:
+            result = _merge(result, await self.validate(dict(result, steps=[])))
+        return result, False, time.perf_counter() - start
+
+    async def arun(self, state: dict) -> dict:
+        """Async variant: ``guardrails``, ``generate`` and ``validate`` are coroutine functions and
+        a discarded branch is cancelled, including the LLM call in flight."""
+        started = time.perf_counter()
+        branch = asyncio.ensure_future(self._abranch(dict(state)))
+        try:
+            guard = await self.guardrails(state)
+        except BaseException:
+            branch.cancel()
+            raise
+        guard_seconds = time.perf_counter() - started
+        with self.lock:
+            self.stats.runs += 1
+        if guard.get("next_action") == "end":
+            if branch.cancel():
+                self._stopped_early()
+            with self.lock:
+                self.stats.wasted += 1
+            logging.info(f"Speculation discarded {asdict(self.stats)}")
+            return guard
+
+        result, _, branch_seconds = await branch
+        if self.store is not None:
+            # Storing embeds the question, which blocks.
+            return await asyncio.to_thread(self._use, guard, result, guard_seconds, branch_seconds)
+        return self._use(guard, result, guard_seconds, branch_seconds)
+
+    def snapshot(self):
+        """The counts so far, with the waste rate, for the metrics endpoint."""
+        with self.lock:
+            return {**asdict(self.stats), "waste_rate": self.stats.waste_rate}
+
+    def _stopped_early(self):
+        with self.lock:
+            self.stats.stopped_early += 1
+
+    def _discarded(self, future):
+        if future.exception() is None and future.result()[1]:
+            self._stopped_early()
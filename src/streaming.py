@@ -0,0 +1,66 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from src.executor import no_results
+
+# Only the answer is shown token by token; the other LLM calls produce Cypher or decisions.
+ANSWER_NODE = "generate_final_answer"
+
+
+@dataclass
+class StreamEvent:
+    """``cypher``: a statement was generated, corrected or reused. ``rows``: it was executed.
+    ``token``: the next piece of the answer. ``answer``: the complete answer. ``error``: the service gave up."""
+
+    kind: str
+    node: Optional[str] = None
+    text: Optional[str] = None
+    cypher: Optional[str] = None
+    rows: Optional[int] = None
+
+
+def _events(mode, chunk):
+    if mode == "messages":
+        message, metadata = chunk
+        if metadata.get("langgraph_node") == ANSWER_NODE and message.content:
+            yield StreamEvent("token", node=ANSWER_NODE, text=message.content)
+        return
+    for node, update in chunk.items():
+        if not update:
+            continue
+        if update.get("cypher_statement"):
+            yield StreamEvent("cypher", node=node, cypher=update["cypher_statement"])
+        records = update.get("database_records")
+        # The guardrail puts its refusal here too; only executed statements report rows.
+        if isinstance(records, list) or records == no_results:
+            yield StreamEvent("rows", node=node, rows=len(records) if isinstance(records, list) else 0)
+        if update.get("answer"):
+            yield StreamEvent("answer", node=node, text=update["answer"])
+
+
+class _Changes:
+    # Validation passes the statement on unchanged unless it corrected it; report changes only.
+    def __init__(self):
+        self.cypher = None
+
+    def __call__(self, events):
+        for event in events:
+            if event.kind == "cypher":
+                if event.cypher == self.cypher:
+                    continue
+                self.cypher = event.cypher
+            yield event
+
+
+def stream_answer(pipeline, question):
+    """Run a compiled pipeline and yield ``StreamEvent``s as the nodes produce them."""
+    changes = _Changes()
+    for mode, chunk in pipeline.stream({"question": question}, stream_mode=["updates", "messages"]):
+        yield from changes(_events(mode, chunk))
+
+
+async def astream_answer(pipeline, question):
+    changes = _Changes()
+    async for mode, chunk in pipeline.astream({"question": question}, stream_mode=["updates", "messages"]):
+        for event in changes(_events(mode, chunk)):
+            yield event
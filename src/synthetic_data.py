@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import argparse
+from functools import partial
+from dataclasses import dataclass, asdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Constant parts of the generator parameters, as in the files under sample_data/.
+PILEUP_OFFSET = [20.0, 32.0, 7.0, 10.22]
+SOURCE = {"git_path": "synthetic", "commit": "", "branch": "main"}
+
+
+@dataclass
+class SyntheticConfig:
+    """Size and distributions of a synthetic dataset; counts are drawn uniformly from the inclusive ranges."""
+    pileups: tuple = (1, 6)
+    dislocations: tuple = (2, 8)
+    points: int = 400
+    pixel: int = 512
+    gb_fraction: float = 0.5
+    slip_trace_fraction: float = 0.5
+    slip_width: tuple = (100.0, 400.0)
+    seed: int = 0
+
+
+def file_name(index):
+    return f"param_img{index:06d}.json"
+
+
+def _spline(rng, start_pos, direction, length, points):
+    # A gently bowed line that ends at the start position, sampled like the recorded splines.
+    t = np.linspace(0.0, 1.0, points)
+    along = np.array([np.cos(direction), np.sin(direction)])
+    across = np.array([-along[1], along[0]])
+    bow = rng.uniform(-0.08, 0.08) * length * np.sin(np.pi * t)
+    xy = np.asarray(start_pos) - np.outer(1 - t, along) * length + np.outer(bow, across)
+    x0, y0 = rng.uniform(0.9, 0.97), rng.uniform(0.6, 1.8)
+    local_x = x0 * (1 - t)
+    local_y = y0 * (1 - t) - 0.05 * np.sin(np.pi * t)
+    return local_x, local_y, xy[:, 0], xy[:, 1]
+
+
+def _dislocations(rng, config, start_pos, direction, slip_width, count):
+    along = np.array([np.cos(direction), np.sin(direction)])
+    position = np.asarray(start_pos, dtype=float)
+    offset = 0.0
+    dislocations = {}
+    for i in range(count):
+        if i:
+            # Spacing grows away from the head of the pileup.
+            position = position + along * rng.exponential(slip_width / max(count, 1)) * (1 + 0.3 * i)
+            offset = -rng.uniform(6.0, 30.0)
+        length = slip_width * rng.uniform(1.1, 2.0)
+        x, y, xglobal, yglobal = _spline(rng, position, direction, length, config.points)
+        dislocation = {
+            "spline_id": f"id_{rng.integers(0, 4)}",
+            "x": x.tolist(),
+            "y": y.tolist(),
+            "offset": offset,
+            "min_point": [float(xglobal[-1]), float(yglobal[-1])],
+            "max_point": [float(xglobal[0]), float(yglobal[0])],
+        }
+        if i:
+            dislocation["gap"] = offset
+        dislocation.update({
+            "start_pos": position.tolist(),
+            "xglobal": xglobal.tolist(),
+            "yglobal": yglobal.tolist(),
+            "c_factor": float(rng.uniform(0.3, 0.9)),
+            "lw": float(rng.uniform(1.0, 3.5)),
+            "dislocation_at": 0,
+        })
+        dislocations[f"id_{i}"] = dislocation
+    return dislocations
+
+
+def generate_microstructure(index, config=SyntheticConfig()):
+    """One microstructure in the param_img*.json format; the same ``index`` and seed give the same data."""
+    rng = np.random.default_rng([config.seed, index])
+    pileups = {}
+    for p in range(int(rng.integers(config.pileups[0], config.pileups[1] + 1))):
+        count = int(rng.integers(config.dislocations[0], config.dislocations[1] + 1))
+        # Start positions run a little past the image, so the default ROI drops some of them.
+        start_pos = rng.uniform(0.0, config.pixel * 1.3, size=2).tolist()
+        slip_width = float(rng.uniform(*config.slip_width))
+        direction = float(rng.uniform(0.0, 2 * np.pi))
+        pileups[f"id_{p}"] = {
+            "n_dislocations": count,
+            "start_pos": start_pos,
+            "slip_width": slip_width,
+            "offset": PILEUP_OFFSET,
+            "direction": direction,
+            "pick": "random",
+            "dislocation": _dislocations(rng, config, start_pos, direction, slip_width, count),
+            "discontinous": 0.0,
+            "prob_discontinous": 0.0,
+        }
+    return {
+        "random_seed": index,
+        "pileup": pileups,
+        "dirt": {},
+        "grain_boundary": {
+            "gb_angle": float(rng.uniform(0.0, np.pi)),
+            "gb_center": rng.integers(0, config.pixel, size=2).tolist(),
+            "lw": 1.5,
+        },
+        "image": {"pixel": config.pixel, "alpha": 0.4, "sigma": float(rng.uniform(2.0, 3.5))},
+        "background": {"type": "none", "params": {}},
+        "path": "data/synthetic",
+        "debug": False,
+        "weight_map": True,
+        "source": SOURCE,
+        "mask_lw": 7.0,
+        "weight_wo": 10,
+        "weight_sigma": 5,
+        "include_gb": bool(rng.random() < config.gb_fraction),
+        "slip_trace": bool(rng.random() < config.slip_trace_fraction),
+    }
+
+
+def write_microstructure(index, out_dir, config=SyntheticConfig(), overwrite=False):
+    path = os.path.join(out_dir, file_name(index))
+    if overwrite or not os.path.exists(path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(generate_microstructure(index, config), f)
+        os.replace(tmp, path)
+    return path
+
+
+def write_dataset(out_dir, count, config=SyntheticConfig(), start=1, workers=0, overwrite=False):
+    """Write files ``start`` .. ``start + count - 1`` to ``out_dir`` and return their paths.
+
+    Existing files are kept unless ``overwrite``; since every file only depends on its index and
+    the seed, a larger dataset can be grown from a smaller one.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    indices = range(start, start + count)
+    write = partial(write_microstructure, out_dir=out_dir, config=config, overwrite=overwrite)
+    if workers > 0:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(write, indices, chunksize=64))
+    return [write(index) for index in indices]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic microstructure JSON files in the sample_data format.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--start", type=int, default=1, help="Index of the first file (param_img<index>.json)")
+    parser.add_argument("--pileups", type=int, nargs=2, default=SyntheticConfig.pileups, metavar=("MIN", "MAX"))
+    parser.add_argument("--dislocations", type=int, nargs=2, default=SyntheticConfig.dislocations,
+                        metavar=("MIN", "MAX"), help="Dislocations per pileup")
+    parser.add_argument("--points", type=int, default=SyntheticConfig.points, help="Points per spline")
+    parser.add_argument("--pixel", type=int, default=SyntheticConfig.pixel, help="Image size")
+    parser.add_argument("--gb-fraction", type=float, default=SyntheticConfig.gb_fraction,
+                        help="Fraction of microstructures with a grain boundary")
+    parser.add_argument("--slip-trace-fraction", type=float, default=SyntheticConfig.slip_trace_fraction,
+                        help="Fraction of microstructures with a slip trace")
+    parser.add_argument("--seed", type=int, default=SyntheticConfig.seed)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    config = SyntheticConfig(pileups=tuple(args.pileups), dislocations=tuple(args.dislocations), points=args.points,
+                             pixel=args.pixel, gb_fraction=args.gb_fraction,
+                             slip_trace_fraction=args.slip_trace_fraction, seed=args.seed)
+    start = time.perf_counter()
+    paths = write_dataset(args.out_dir, args.count, config, start=args.start, workers=args.workers,
+                          overwrite=args.overwrite)
+    print(f"Wrote {len(paths)} files to {args.out_dir} in {time.perf_counter() - start:.2f}s ({asdict(config)})")
@@ -0,0 +1,366 @@
+import os
+import json
+import time
+import uuid
+import inspect
+import logging
+import threading
+import contextvars
+from collections import deque, defaultdict
+from dataclasses import dataclass, field, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+
+# The span of the node running in this thread or task; LLM callbacks and queries add to it.
+_span = contextvars.ContextVar("graphrag_span", default=None)
+
+
+@dataclass
+class Span:
+    node: str
+    seconds: float = 0.0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    queries: int = 0
+    query_seconds: float = 0.0
+    rows: int = 0
+    cache_hits: List[str] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, **counts):
+        # A speculating guardrail node runs its branch in another thread on the same span.
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def to_dict(self):
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name != "lock"}
+
+
+@dataclass
+class Trace:
+    question: Optional[str]
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    started: float = field(default_factory=time.time)
+    seconds: float = 0.0
+    error: Optional[str] = None
+    spans: List[Span] = field(default_factory=list)
+
+    def total(self, name):
+        return sum(getattr(span, name) for span in self.spans)
+
+    def count(self, node):
+        return sum(span.node == node for span in self.spans)
+
+
+def record_query(seconds, rows=0):
+    span = _span.get()
+    if span is not None:
+        span.add(queries=1, query_seconds=seconds, rows=rows)
+
+
+def record_cache_hit(kind):
+    span = _span.get()
+    if span is not None:
+        span.add(cache_hits=[kind])
+
+
+def _usage(response):
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    # Streamed responses carry the usage on the message instead.
+    prompt = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt += metadata.get("input_tokens", 0)
+            completion += metadata.get("output_tokens", 0)
+    return prompt, completion
+
+
+class UsageCallback(BaseCallbackHandler):
+    """Adds the tokens of every LLM call to the span of the node that made it."""
+
+    run_inline = True
+
+    def on_llm_end(self, response, **kwargs):
+        span = _span.get()
+        if span is None:
+            return
+        prompt, completion = _usage(response)
+        span.add(llm_calls=1, prompt_tokens=prompt, completion_tokens=completion)
+
+
+def _cache_hits(update):
+    steps = update.get("steps") or [] if isinstance(update, dict) else []
+    return [step for step in steps if step == "cypher_cache_hit" or step.startswith("template:")]
+
+
+def traced(name, fn):
+    """Wrap a pipeline node so it records a span on the trace passed in the run config."""
+
+    def enter(config):
+        trace = (config or {}).get("configurable", {}).get("trace")
+        if trace is None:
+            return None, None
+        span = Span(name)
+        trace.spans.append(span)
+        return span, _span.set(span)
+
+    def leave(span, token, start, update):
+        if span is None:
+            return
+        _span.reset(token)
+        span.add(seconds=time.perf_counter() - start, cache_hits=_cache_hits(update))
+
+    if inspect.iscoroutinefunction(fn):
+        async def node(state, config):
+            span, token = enter(config)
+            start, update = time.perf_counter(), None
+            try:
+                update = await fn(state)
+                return update
+            finally:
+                leave(span, token, start, update)
+    else:
+        def node(state, config):
+            span, token = enter(config)
+            start, update = time.perf_counter(), None
+            try:
+                update = fn(state)
+                return update
+            finally:
+                leave(span, token, start, update)
+    return node
+
+
+class _Window:
+    def __init__(self, size):
+        self.values = deque(maxlen=size)
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, value):
+        self.values.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        return float(np.percentile(self.values, q * 100)) if self.values else 0.0
+
+
+_COUNTERS = {
+    "llm_calls": "graphrag_llm_calls_total",
+    "prompt_tokens": "graphrag_llm_prompt_tokens_total",
+    "completion_tokens": "graphrag_llm_completion_tokens_total",
+    "queries": "graphrag_neo4j_queries_total",
+    "query_seconds": "graphrag_neo4j_query_seconds_total",
+    "rows": "graphrag_neo4j_rows_total",
+    "cache_hits": "graphrag_cache_hits_total",
+}
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+
+
+class Tracer:
+    """Collects one ``Trace`` per question, writes it as a JSON line to ``log_path`` and keeps
+    Prometheus metrics, with p50/p95 over the last ``window`` runs of each node.
+
+    ``prompt_price`` and ``completion_price`` are USD per million tokens.
+    """
+
+    def __init__(self, log_path=None, window=1000, prompt_price=2.5, completion_price=10.0):
+        self.log_path = log_path
+        self.window = window
+        self.prompt_price = prompt_price
+        self.completion_price = completion_price
+        self.lock = threading.Lock()
+        self.requests = _Window(window)
+        self.errors = 0
+        self.cost = 0.0
+        self.corrections = 0
+        self.nodes = defaultdict(lambda: _Window(window))
+        self.counters = defaultdict(float)
+        self.sources = {}
+
+    def start(self, question):
+        return Trace(question)
+
+    def cost_of(self, prompt_tokens, completion_tokens):
+        return (prompt_tokens * self.prompt_price + completion_tokens * self.completion_price) / 1e6
+
+    def finish(self, trace, error=None):
+        trace.seconds = time.time() - trace.started
+        trace.error = repr(error) if error is not None else None
+        prompt, completion = trace.total("prompt_tokens"), trace.total("completion_tokens")
+        entry = {
+            "request_id": trace.request_id,
+            "question": trace.question,
+            "started": trace.started,
+            "seconds": trace.seconds,
+            "error": trace.error,
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "cost_usd": self.cost_of(prompt, completion),
+            "validations": trace.count("validate_cypher"),
+            "corrections": trace.count("correct_cypher"),
+            "cache_hits": [hit for span in trace.spans for hit in span.cache_hits],
+            "nodes": [span.to_dict() for span in trace.spans],
+        }
+        logging.info(f"Trace {trace.request_id}: {trace.seconds:.2f}s, "
+                     + ", ".join(f"{s.node} {s.seconds:.2f}s" for s in trace.spans))
+        with self.lock:
+            self.requests.add(trace.seconds)
+            self.errors += error is not None
+            self.cost += entry["cost_usd"]
+            self.corrections += entry["corrections"]
+            for span in trace.spans:
+                self.nodes[span.node].add(span.seconds)
+                for name in _COUNTERS:
+                    if name != "cache_hits":
+                        self.counters[(name, span.node)] += getattr(span, name)
+                for hit in span.cache_hits:
+                    self.counters[("cache_hits", hit.split(":")[0])] += 1
+            if self.log_path:
+                os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                with open(self.log_path, "a") as f:
+                    f.write(json.dumps(entry, default=str) + "\n")
+        return entry
+
+    def watch(self, name, snapshot):
+        """Export the counts ``snapshot()`` returns as ``graphrag_<name>_<key>`` on every scrape.
+
+        Keys ending in ``_rate`` are gauges; the others are counters.
+        """
+        with self.lock:
+            self.sources[name] = snapshot
+
+    def metrics(self):
+        """Prometheus text exposition of everything finished so far."""
+        lines = []
+
+        def summary(name, window, **labels):
+            for q in (0.5, 0.95):
+                lines.append(f"{name}{_labels(**labels, quantile=q)} {window.quantile(q):.6f}")
+            lines.append(f"{name}_sum{_labels(**labels)} {window.sum:.6f}")
+            lines.append(f"{name}_count{_labels(**labels)} {window.count}")
+
+        with self.lock:
+            lines.append("# TYPE graphrag_request_seconds summary")
+            summary("graphrag_request_seconds", self.requests)
+            lines.append("# TYPE graphrag_request_errors_total counter")
+            lines.append(f"graphrag_request_errors_total {self.errors}")
+            lines.append("# TYPE graphrag_llm_cost_usd_total counter")
+            lines.append(f"graphrag_llm_cost_usd_total {self.cost:.6f}")
+            lines.append("# TYPE graphrag_corrections_total counter")
+            lines.append(f"graphrag_corrections_total {self.corrections}")
+            lines.append("# TYPE graphrag_node_seconds summary")
+            for node, window in sorted(self.nodes.items()):
+                summary("graphrag_node_seconds", window, node=node)
+            for name, metric in _COUNTERS.items():
+                values = sorted((key, v) for (counter, key), v in self.counters.items() if counter == name)
+                if not values:
+                    continue
+                label = "kind" if name == "cache_hits" else "node"
+                lines.append(f"# TYPE {metric} counter")
+                lines.extend(f"{metric}{_labels(**{label: key})} {v:g}" for key, v in values)
+            sources = sorted(self.sources.items())
+        for name, snapshot in sources:
+            for key, value in snapshot().items():
+                kind = "gauge" if key.endswith("_rate") else "counter"
+                metric = f"graphrag_{name}_{key}" + ("" if kind == "gauge" else "_total")
+                lines.append(f"# TYPE {metric} {kind}")
+                lines.append(f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+class TracedPipeline:
+    """A compiled pipeline that traces every ``invoke``, ``ainvoke``, ``stream`` and ``astream``."""
+
+    def __init__(self, pipeline, tracer: Tracer):
+        self.pipeline = pipeline
+        self.tracer = tracer
+
+    def _config(self, input, config):
+        trace = self.tracer.start(input.get("question"))
+        config = dict(config or {})
+        config["configurable"] = {**config.get("configurable", {}), "trace": trace}
+        return trace, config
+
+    def invoke(self, input, config=None, **kwargs):
+        trace, config = self._config(input, config)
+        error = None
+        try:
+            return self.pipeline.invoke(input, config, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.tracer.finish(trace, error)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        trace, config = self._config(input, config)
+        error = None
+        try:
+            return await self.pipeline.ainvoke(input, config, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.tracer.finish(trace, error)
+
+    def stream(self, input, config=None, **kwargs):
+        trace, config = self._config(input, config)
+        error = None
+        try:
+            yield from self.pipeline.stream(input, config, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.tracer.finish(trace, error)
+
+    async def astream(self, input, config=None, **kwargs):
+        trace, config = self._config(input, config)
+        error = None
+        try:
+            async for chunk in self.pipeline.astream(input, config, **kwargs):
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.tracer.finish(trace, error)
+
+    def __getattr__(self, name):
+        return getattr(self.pipeline, name)
+
+
+def start_metrics_server(tracer: Tracer, port, host="0.0.0.0"):
+    """Serve ``GET /metrics`` from a daemon thread, for processes without the HTTP service."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = tracer.metrics().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,144 @@
+import os
+import csv
+import glob
+import json
+
+import pytest
+
+from src.bulk_export import ARRAY_DELIMITER, CONSTRAINTS_FILE, NODE_FILES, RELATIONSHIP_FILES, export_csv
+from src.inject import NODE_LABELS, DislocationGraph, load_rows
+
+NEAR_RADIUS = 20.0
+
+
+class RecordingTx:
+    def run(self, query, **params):
+        pass
+
+
+@pytest.fixture
+def json_files(tmp_path):
+    # The sample files have no grain boundaries or slip traces; the first one gets both.
+    files = []
+    for i, path in enumerate(sorted(glob.glob("sample_data/*.json"))):
+        with open(path) as f:
+            data = json.load(f)
+        if i == 0:
+            data.update(include_gb=True, slip_trace=True)
+        files.append(str(tmp_path / os.path.basename(path)))
+        with open(files[-1], "w") as f:
+            json.dump(data, f)
+    return files
+
+
+def online_rows(json_files):
+    """The rows every merge_* writer of the batched online path receives, by writer name."""
+    processor = DislocationGraph.__new__(DislocationGraph)
+    processor.batch_size = 10 ** 6
+    written = {}
+    for name in dir(DislocationGraph):
+        if name.startswith("merge_"):
+            setattr(processor, name, lambda tx, rows, name=name: written.setdefault(name, []).extend(rows))
+    for json_file in json_files:
+        processor.write_rows(RecordingTx(), load_rows(json_file, near_radius=NEAR_RADIUS))
+    return written
+
+
+def _parse(header, value):
+    if value == "":
+        return None
+    kind = header.split(":")[1] if ":" in header and not header.startswith(("id:", ":")) else None
+    if kind == "double":
+        return float(value)
+    if kind == "long":
+        return int(value)
+    if kind == "double[]":
+        return [float(v) for v in value.split(ARRAY_DELIMITER)]
+    return value
+
+
+def read_csv(out_dir, name):
+    with open(os.path.join(out_dir, name), newline="") as f:
+        reader = csv.reader(f)
+        headers = next(reader)
+        return headers, [{h: _parse(h, v) for h, v in zip(headers, row)} for row in reader]
+
+
+def nodes(out_dir, label):
+    headers, rows = read_csv(out_dir, NODE_FILES[label][0])
+    id_header = f"id:ID({label})"
+    assert headers[0] == id_header
+    return {row[id_header]: {h.split(":")[0]: v for h, v in row.items() if h != id_header} for row in rows}
+
+
+def relationships(out_dir, rel_type, name):
+    headers, rows = read_csv(out_dir, name)
+    assert headers[2] == ":TYPE"
+    assert {row[":TYPE"] for row in rows} <= {rel_type}
+    return [tuple(row.values()) for row in rows]
+
+
+@pytest.fixture
+def exported(tmp_path, json_files):
+    out_dir = str(tmp_path / "csv")
+    stats = export_csv(json_files, out_dir, near_radius=NEAR_RADIUS)
+    return out_dir, stats, online_rows(json_files)
+
+
+def test_node_ids_and_properties_match_online_rows(exported):
+    out_dir, stats, online = exported
+    assert nodes(out_dir, "Microstructure") == {r["ms_id"]: {"ms_id": r["ms_id"]}
+                                                for r in online["merge_microstructures"]}
+    assert nodes(out_dir, "GrainBoundary") == {
+        r["gb_id"]: {"gb_id": r["gb_id"], "gb_angle": r["gb_angle"], "gb_center": r["gb_center"], "lw": r["lw"]}
+        for r in online["merge_grain_boundaries"]
+    }
+    assert nodes(out_dir, "SlipTrace") == {r["st_id"]: {"slip_id": "<id> " + r["st_id"]}
+                                           for r in online["merge_slip_traces"]}
+    pileups = nodes(out_dir, "Pileup")
+    assert list(pileups) == [r["pileup_id"] for r in online["merge_pileups"]]
+    for r in online["merge_pileups"]:
+        expected = {k: v for k, v in r.items() if k != "features"}
+        expected.update(r["features"])
+        assert pileups[r["pileup_id"]] == expected
+    dislocations = nodes(out_dir, "Dislocation")
+    assert list(dislocations) == [r["composite_id"] for r in online["merge_dislocations"]]
+    for r in online["merge_dislocations"]:
+        expected = {"dis_id": r["composite_id"], "spline_id": r["spline_id"], "start_pos_x": r["start_pos_x"],
+                    "start_pos_y": r["start_pos_y"], "offset": r["offset"], **r["features"]}
+        assert dislocations[r["composite_id"]] == expected
+    assert stats.nodes == sum(len(online[f"merge_{n}"]) for n in
+                              ("microstructures", "grain_boundaries", "slip_traces", "pileups", "dislocations"))
+    assert online["merge_grain_boundaries"] and online["merge_slip_traces"]
+
+
+def test_relationships_match_online_rows(exported):
+    out_dir, _, online = exported
+    files = {name: rel_type for rel_type, name, *_ in RELATIONSHIP_FILES}
+
+    def pairs(name):
+        return [row[:2] for row in relationships(out_dir, files[name], name)]
+
+    assert pairs("has_pileup.csv") == [(r["ms_id"], r["pileup_id"]) for r in online["merge_has_pileup"]]
+    assert pairs("contains.csv") == [(r["pileup_id"], r["composite_id"]) for r in online["merge_dislocations"]]
+    assert pairs("has_grain_boundary.csv") == [(r["ms_id"], r["gb_id"]) for r in online["merge_grain_boundaries"]]
+    assert pairs("microstructure_slip_traces.csv") == [(r["ms_id"], r["st_id"]) for r in online["merge_slip_traces"]]
+    assert pairs("pileup_slip_traces.csv") == [(r["pileup_id"], r["st_id"])
+                                               for r in online["merge_pileup_slip_traces"]]
+    # The online writer merges NEIGHBOR both ways, so every row is exported in both directions.
+    neighbors = pairs("neighbors.csv")
+    assert len(neighbors) == 2 * len(online["merge_neighbors"])
+    assert set(neighbors) == {p for r in online["merge_neighbors"]
+                              for p in ((r["id1"], r["id2"]), (r["id2"], r["id1"]))}
+    near = relationships(out_dir, "NEAR", "near.csv")
+    assert near == [(r["id1"], r["id2"], "NEAR", r["distance"]) for r in online["merge_near"]]
+    assert near
+
+
+def test_graph_meta_and_constraints(exported):
+    out_dir, _, _ = exported
+    headers, rows = read_csv(out_dir, "graph_meta.csv")
+    assert headers[:2] == ["id:ID(_GraphMeta)", "version:long"]
+    assert [(row["id:ID(_GraphMeta)"], row["version:long"]) for row in rows] == [("graph", 1)]
+    with open(os.path.join(out_dir, CONSTRAINTS_FILE)) as f:
+        assert len(f.read().strip().splitlines()) == len(NODE_LABELS)
@@ -0,0 +1,22 @@
+import time
+from types import SimpleNamespace
+
+from src.agent_nodes.cypher_validator import _validation_result, gave_up
+
+
+def _validate(request_started, deadline=30):
+    state = {"question": "Which pileup is longest?", "cypher_statement": "MATCH (p:Pileup) RETURN p",
+             "steps": [], "request_started": request_started}
+    analysis = SimpleNamespace(errors=["Property length is not in the schema"], undecided=[])
+    return _validation_result(state, [], state["cypher_statement"], analysis, "local", deadline=deadline)
+
+
+def test_deadline_counts_from_request_start():
+    # No correction has run yet, but the request has already spent its time before validation.
+    result = _validate(time.monotonic() - 31)
+    assert result["next_action"] == "end"
+    assert result["database_records"].startswith(gave_up)
+
+
+def test_fresh_request_is_corrected():
+    assert _validate(time.monotonic())["next_action"] == "correct_cypher"
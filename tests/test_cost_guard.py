@@ -0,0 +1,23 @@
+from src.cost_guard import CostGuard
+
+
+def test_check_reads_estimates_from_bolt_plan():
+    plan = {"operatorType": "ProduceResults@neo4j", "args": {"EstimatedRows": 5e9}}
+    reasons = CostGuard(max_estimated_rows=1_000_000).check("MATCH (d:Dislocation) RETURN d", plan)
+    assert reasons == ["its plan estimates 5,000,000,000 rows, more than 1,000,000"]
+
+
+def test_check_walks_plan_children():
+    plan = {
+        "operatorType": "ProduceResults@neo4j",
+        "args": {"EstimatedRows": 10.0},
+        "children": [{"operatorType": "CartesianProduct@neo4j", "args": {"EstimatedRows": 2e6}, "children": []}],
+    }
+    reasons = CostGuard(max_estimated_rows=1_000_000).check("MATCH (a), (b) RETURN a, b", plan)
+    assert "its plan uses CartesianProduct" in reasons
+    assert "its plan estimates 2,000,000 rows, more than 1,000,000" in reasons
+
+
+def test_check_passes_cheap_plan():
+    plan = {"operatorType": "ProduceResults@neo4j", "args": {"EstimatedRows": 12.0}}
+    assert CostGuard().check("MATCH (p:Pileup) RETURN count(p)", plan) == []
@@ -0,0 +1,50 @@
+import os
+import glob
+
+import pytest
+
+from src.inject import DislocationGraph, load_rows
+
+# These run against a live database, e.g. the docker-compose one: NEO4J_TEST_URI=neo4j://localhost:7687
+URI = os.environ.get("NEO4J_TEST_URI")
+AUTH = (os.environ.get("NEO4J_USERNAME", "neo4j"), os.environ.get("NEO4J_PASSWORD", "password"))
+SAMPLE_FILE = sorted(glob.glob("sample_data/*.json"))[0]
+
+pytestmark = pytest.mark.skipif(not URI, reason="NEO4J_TEST_URI is not set")
+
+
+class RecordingTx:
+    def __init__(self):
+        self.calls = []
+
+    def run(self, query, **params):
+        self.calls.append((query, params))
+
+
+@pytest.fixture
+def processor():
+    processor = DislocationGraph(URI, *AUTH)
+    yield processor
+    processor.close()
+
+
+def test_delete_microstructures_plans(processor):
+    tx = RecordingTx()
+    processor.delete_microstructures(tx, ["ms_1"])
+    (query, params), = tx.calls
+    with processor.driver.session() as session:
+        session.run(f"EXPLAIN {query}", **params).consume()
+
+
+def test_remove_microstructures_deletes_owned_nodes(processor):
+    rows = load_rows(SAMPLE_FILE)
+    ms_id = rows.microstructures[0]["ms_id"]
+    processor.create_constraints()
+    processor.flush(rows, replace=True)
+    processor.remove_microstructures([ms_id])
+    with processor.driver.session() as session:
+        left = session.run(
+            "MATCH (n) WHERE n.id = $ms_id OR n.id STARTS WITH $prefix RETURN count(n) AS n",
+            ms_id=ms_id, prefix=f"{ms_id}_",
+        ).single()["n"]
+    assert left == 0
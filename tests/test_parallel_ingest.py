@@ -0,0 +1,46 @@
+import glob
+import threading
+import contextlib
+
+import pytest
+
+from src.parallel_ingest import ingest_parallel
+
+SAMPLE_FILES = sorted(glob.glob("sample_data/*.json"))[:2]
+
+
+class FailingProcessor:
+    """Stands in for DislocationGraph; every flush fails."""
+
+    batch_size = 10 ** 9
+    load_options = {"features": False}
+
+    class driver:
+        @staticmethod
+        @contextlib.contextmanager
+        def session():
+            yield None
+
+    def flush(self, rows, session=None, replace=False):
+        raise RuntimeError("flush failed")
+
+    def bump_graph_version(self):
+        raise AssertionError("must not be reached")
+
+
+def test_error_in_last_flush_is_raised():
+    # With a batch size above the row count, the only flush is the one after _DONE.
+    outcome = {}
+
+    def run():
+        try:
+            ingest_parallel(FailingProcessor(), SAMPLE_FILES, workers=1, writers=2)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+    assert not thread.is_alive(), "ingest_parallel hung after a failed flush"
+    with pytest.raises(RuntimeError, match="flush failed"):
+        raise outcome["error"]
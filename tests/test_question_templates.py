@@ -0,0 +1,61 @@
+import pytest
+
+from src.question_templates import TemplateEngine
+
+ENGINE = TemplateEngine()
+
+# (question, template, Cypher variant, params, records, answer); the first six are the app.py examples.
+CASES = [
+    ("Find highest Number of Dislocations in a Pileup.", "extreme_per_parent", "dislocation/pileup/desc", {},
+     [{"id": "ms_5_id_0", "count": 8}, {"id": "ms_3_id_0", "count": 7}],
+     "The highest number of dislocations in a pileup is 8, found in pileup ms_5_id_0."),
+    ("How many dislocation microstructure we have in the dataset.", "count_all", "microstructure", {},
+     [{"count": 5}], "There are 5 microstructures in the dataset."),
+    ("Find the microstructure with the largest number of pileup. Provide all the details", None, None, None,
+     None, None),
+    ("Find average number of pileups in a microstructure. ", "average_per_parent", "pileup/microstructure", {},
+     [{"value": 2.0}], "On average a microstructure has 2.00 pileups."),
+    ("Find distribution of number of pileups in a microstructure .", "distribution_per_parent",
+     "pileup/microstructure", {}, [{"count": 1, "frequency": 2}, {"count": 3, "frequency": 1}],
+     "Number of pileups per microstructure:\n- 1 pileup: 2 microstructures\n- 3 pileups: 1 microstructure"),
+    ("Which microstructure has the highest number of dislocations and how many dislocations does it contain. ",
+     "extreme_per_parent", "dislocation/microstructure/desc", {},
+     [{"id": "ms_1", "count": 7}, {"id": "ms_3", "count": 7}],
+     "The highest number of dislocations in a microstructure is 7, found in microstructure ms_1, ms_3."),
+    ("Which pileup has the most dislocations?", "extreme_per_parent", "dislocation/pileup/desc", {},
+     [{"id": "ms_5_id_0", "count": 8}],
+     "The highest number of dislocations in a pileup is 8, found in pileup ms_5_id_0."),
+    ("Which microstructure has the fewest pileups?", "extreme_per_parent", "pileup/microstructure/asc", {},
+     [{"id": "ms_2", "count": 1}, {"id": "ms_4", "count": 1}, {"id": "ms_1", "count": 3}],
+     "The lowest number of pileups in a microstructure is 1, found in microstructure ms_2, ms_4."),
+    ("Which pileup contains the least dislocations", "extreme_per_parent", "dislocation/pileup/asc", {},
+     [], "I couldn't find any relevant information in the database"),
+    ("What is the lowest number of pileups per microstructure?", "extreme_per_parent",
+     "pileup/microstructure/asc", {}, [{"id": "ms_2", "count": 1}],
+     "The lowest number of pileups in a microstructure is 1, found in microstructure ms_2."),
+    ("How many pileups are there?", "count_all", "pileup", {}, [{"count": 1}],
+     "There is 1 pileup in the dataset."),
+    ("How many dislocations are in ms_3?", "count_in_microstructure", "dislocation", {"ms_id": "ms_3"},
+     [{"count": 7}], "Microstructure ms_3 has 7 dislocations."),
+    ("Show pileups with direction greater than 2.5 in ms_2", "pileup_direction", ">",
+     {"threshold": 2.5, "ms_id": "ms_2"},
+     [{"microstructure": "ms_2", "pileup": "ms_2_id_1", "direction": 2.9710396609081657}],
+     "1 pileup in microstructure ms_2 has a direction greater than 2.5:\n- ms_2_id_1 (ms_2): 2.9710"),
+    ("Describe ms_4", "microstructure_lookup", "lookup", {"ms_id": "ms_4"},
+     [{"id": "ms_4", "pileups": 1, "dislocations": 2}],
+     "Microstructure ms_4 has 1 pileup with 2 dislocations in total."),
+    ("Which two dislocations in ms_3 are closest to each other?", None, None, None, None, None),
+]
+
+
+@pytest.mark.parametrize("question, template, variant, params, records, answer", CASES)
+def test_match(question, template, variant, params, records, answer):
+    match = ENGINE.match(question)
+    if template is None:
+        assert match is None
+        return
+    assert match is not None
+    assert match.template.name == template
+    assert match.cypher == match.template.cypher[variant]
+    assert match.params == params
+    assert match.answer(records) == answer
@@ -0,0 +1,40 @@
+import os
+
+from src.result_cache import ResultCache
+
+ROWS_A = [{"value": "a" * 100}] * 20
+ROWS_B = [{"value": "b" * 100}] * 20
+
+
+def spilling_cache(tmp_path):
+    return ResultCache(spill_dir=str(tmp_path), spill_bytes=10)
+
+
+def test_caches_sharing_a_spill_dir_keep_their_own_files(tmp_path):
+    first, second = spilling_cache(tmp_path), spilling_cache(tmp_path)
+    first.put("MATCH (n) RETURN n", 1, ROWS_A)
+    second.put("MATCH (n) RETURN n", 2, ROWS_B)
+    assert first.get("MATCH (n) RETURN n", 1) == ROWS_A
+    assert second.get("MATCH (n) RETURN n", 2) == ROWS_B
+    # A version change in one cache must not delete the other's files.
+    second.put("MATCH (m) RETURN m", 3, ROWS_B)
+    assert first.get("MATCH (n) RETURN n", 1) == ROWS_A
+
+
+def test_unreadable_spill_file_is_a_miss(tmp_path):
+    cache = spilling_cache(tmp_path)
+    cache.put("MATCH (n) RETURN n", 1, ROWS_A)
+    path = cache.entries[cache.key("MATCH (n) RETURN n")][0]
+    with open(path, "wb") as f:
+        f.write(b"\x80")
+    assert cache.get("MATCH (n) RETURN n", 1) is None
+    assert cache.stats.misses == 1 and cache.stats.hits == 0
+
+
+def test_spill_dirs_of_exited_processes_are_removed(tmp_path):
+    stale = tmp_path / "999999999-dead"
+    stale.mkdir()
+    (stale / "1-key.pkl").write_bytes(b"x")
+    (tmp_path / "old.pkl").write_bytes(b"x")
+    spilling_cache(tmp_path)
+    assert not stale.exists() and not (tmp_path / "old.pkl").exists()
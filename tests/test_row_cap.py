@@ -0,0 +1,54 @@
+from src.cost_guard import CostGuard
+from src.executor import _answer_inputs, execute_cypher
+from src.result_compaction import ResultCompactor
+
+
+class RecordingGraph:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def query(self, cypher, params=None):
+        self.queries.append(cypher)
+        return self.rows
+
+
+class Schema:
+    def text_for(self, question, cypher):
+        return ""
+
+
+def _execute(rows, cypher="MATCH (d:Dislocation) RETURN d.arc_length AS arc_length"):
+    state = {"question": "How long are the dislocations?", "cypher_statement": cypher, "steps": []}
+    graph = RecordingGraph(rows)
+    execute_cypher(state, graph, guard=CostGuard(max_rows=3))
+    return state, graph
+
+
+def test_result_at_the_cap_is_marked_truncated():
+    state, graph = _execute([{"arc_length": float(i)} for i in range(3)])
+    assert graph.queries[0].endswith("LIMIT 3")
+    assert state["results_truncated_at"] == 3
+    for compactor in (None, ResultCompactor()):
+        results = _answer_inputs(state, Schema(), compactor)["results"]
+        assert "cut off at 3 rows" in results
+
+
+def test_result_below_the_cap_is_not_marked():
+    state, _ = _execute([{"arc_length": 1.0}])
+    assert state["results_truncated_at"] is None
+    assert _answer_inputs(state, Schema(), ResultCompactor())["results"] == [{"arc_length": 1.0}]
+
+
+def test_own_limit_is_not_a_cap():
+    state, graph = _execute([{"arc_length": float(i)} for i in range(2)],
+                            "MATCH (d:Dislocation) RETURN d.arc_length AS arc_length LIMIT 2")
+    assert graph.queries[0].endswith("LIMIT 2")
+    assert state["results_truncated_at"] is None
+
+
+def test_summary_of_capped_result_does_not_claim_all_rows():
+    records = [{"arc_length": float(i)} for i in range(5)]
+    text = ResultCompactor(max_rows=2)(records, capped_at=5)
+    assert "SUMMARY covers all" not in text
+    assert "cut off at 5 rows" in text
@@ -0,0 +1,71 @@
+import numpy as np
+
+from src.semantic_cache import SemanticCypherCache, question_literals
+
+
+def test_opposite_aggregates_differ():
+    assert (question_literals("Highest number of dislocations in a pileup")
+            != question_literals("Lowest number of dislocations in a pileup"))
+
+
+def test_comparisons_differ():
+    assert (question_literals("Pileups with more than 5 dislocations")
+            != question_literals("Pileups with at least 5 dislocations"))
+    assert (question_literals("Pileups with more than 5 dislocations")
+            != question_literals("Pileups with fewer than 5 dislocations"))
+
+
+def test_synonyms_agree():
+    assert (question_literals("Maximum number of dislocations in ms_3")
+            == question_literals("What is the highest number of dislocations in ms_3?"))
+
+
+class Embeddings:
+    model = "test"
+    seen = []
+
+    def embed_query_vector(self, question):
+        # One direction per distinct question, so only identical questions are near-duplicates.
+        if question not in self.seen:
+            self.seen.append(question)
+        vector = np.zeros(64, dtype=np.float32)
+        vector[self.seen.index(question)] = 1.0
+        return vector
+
+
+def _cache(tmp_path, **kwargs):
+    return SemanticCypherCache(str(tmp_path / "cache.sqlite"), Embeddings(), **kwargs)
+
+
+def test_invalidations_count_deleted_entries(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set_schema_version("v1")
+    cache.store("How many pileups are there?", "MATCH (p:Pileup) RETURN count(p)")
+    cache.set_schema_version("v1")
+    assert cache.stats.invalidations == 0
+    cache.set_schema_version("v2")
+    assert cache.stats.invalidations == 1
+    assert cache.lookup("How many pileups are there?") is None
+
+
+def test_entries_at_the_new_version_are_not_counted(tmp_path):
+    _cache(tmp_path, schema_version="v1").store("How many pileups are there?", "MATCH (p:Pileup) RETURN count(p)")
+    _cache(tmp_path).store("Describe ms_3", "MATCH (m:Microstructure {id: 'ms_3'}) RETURN m")
+    cache = _cache(tmp_path)
+    assert len(cache.ids) == 2
+    cache.set_schema_version("v1")
+    assert cache.stats.invalidations == 1
+    assert cache.lookup("How many pileups are there?") == "MATCH (p:Pileup) RETURN count(p)"
+
+
+def test_store_keeps_memory_and_database_in_step(tmp_path):
+    cache = _cache(tmp_path, max_entries=2, schema_version="v1")
+    questions = ["How many pileups are there?", "How many dislocations are there?", "Describe ms_3"]
+    for i, question in enumerate(questions):
+        cache.store(question, f"RETURN {i}")
+    assert cache.stats.evictions == 1
+    assert cache.lookup(questions[0]) is None
+    assert cache.lookup(questions[2]) == "RETURN 2"
+    reopened = _cache(tmp_path, max_entries=2, schema_version="v1")
+    assert reopened.ids == cache.ids
+    assert np.array_equal(reopened.matrix, cache.matrix)
@@ -0,0 +1,38 @@
+import threading
+
+import pytest
+
+from src.speculation import Speculator
+from src.tracing import Tracer
+
+
+def test_failed_guardrail_stops_the_branch():
+    gate = threading.Event()
+    generated = []
+
+    def lookup(state):
+        gate.wait(10)
+        return {"next_action": "generate_cypher", "steps": ["lookup_cypher_cache"]}
+
+    def guardrails(state):
+        raise RuntimeError("guardrail failed")
+
+    speculator = Speculator(guardrails, lambda state: generated.append(state) or {}, lookup=lookup)
+    with pytest.raises(RuntimeError, match="guardrail failed"):
+        speculator({"question": "How many pileups are there?", "steps": []})
+    gate.set()
+    speculator.pool.shutdown(wait=True)
+    assert generated == []
+
+
+def test_speculation_counts_are_exported():
+    speculator = Speculator(lambda state: {"next_action": "end", "steps": ["guardrail"]},
+                            lambda state: {"cypher_statement": "RETURN 1", "steps": ["generate_cypher"]})
+    tracer = Tracer()
+    tracer.watch("speculation", speculator.snapshot)
+    speculator({"question": "What's the weather in Paris today?", "steps": []})
+    speculator.pool.shutdown(wait=True)
+    metrics = tracer.metrics()
+    assert "graphrag_speculation_runs_total 1" in metrics
+    assert "graphrag_speculation_wasted_total 1" in metrics
+    assert "graphrag_speculation_waste_rate 1" in metrics